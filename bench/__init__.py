@@ -0,0 +1,7 @@
+import click
+@click.group()
+def bench():
+    '''
+        benchmarks of the tester itself against a local mock NOJ
+    '''
+    pass
@@ -0,0 +1,204 @@
+import asyncio
+import click
+import json
+import logging
+import multiprocessing
+import resource
+import time
+from . import bench
+from cores import login
+from cores.metrics import METRICS
+from cores.session_pool import SessionPool
+from mock.server import MockConfig, start_server
+from submission.pipeline import pressure_pipeline
+from submission.poller import PollPolicy, get_result
+from submission.pressure_tester import full_filter
+
+BENCHMARKS = ("submit", "poll", "filter")
+# compared against the baseline , a drop of the first ones is a regression
+# and a rise of the others is
+HIGHER_IS_BETTER = ("submissionsPerSec", "pollsPerSec", "recordsPerSec")
+LOWER_IS_BETTER = ("cpuPerRequestMs", "cpuPerRecordUs", "peakRssKb")
+# the mock answers right away so the client is the bottleneck
+FAST_POLL = PollPolicy(delay=0.0, backoff=1.0, max_delay=0.01, jitter=0.0)
+
+
+class Probe:
+    '''
+    the wall time , cpu time of this process and its peak rss around a block
+    '''
+
+    def __enter__(self):
+        self.wall = time.monotonic()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = time.monotonic() - self.wall
+        self.cpu = time.process_time() - self.cpu
+        self.peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _serve(port: int, judges: int, ready):
+    async def main():
+        await start_server(MockConfig(judges=judges, latency="const:0"), port=port)
+        ready.set()
+        await asyncio.Event().wait()
+
+    logging.getLogger().setLevel("WARNING")
+    asyncio.run(main())
+
+
+def _requests() -> int:
+    '''
+    the HTTP requests timed in `METRICS` , `verdict` is a latency and not a request
+    '''
+    return sum(h.count for phase, h in METRICS.phases.items() if phase != "verdict")
+
+
+def bench_submit(count: int, users: int, workers: int) -> (dict, list):
+    '''
+    drive `pressure_pipeline` with a burst of `count` submissions
+
+    Returns:
+        the measurements and the created submission ids
+    '''
+    pool = SessionPool([(f"bench{i}", "bench") for i in range(users)], users)
+    with Probe() as p:
+        _, sent, _ = asyncio.run(pressure_pipeline(pool, [(0, 1, "")] * count, [0.0] * count, {}, 600, workers, FAST_POLL))
+    requests = _requests()
+    last = max(r["uploadedAt"] for r in sent.values())
+    return {
+        "submissions": len(sent),
+        "submissionsPerSec": len(sent) / last,
+        "requests": requests,
+        "requestsPerSec": requests / p.wall,
+        "cpuPerRequestMs": p.cpu / requests * 1e3,
+        "peakRssKb": p.peak_rss_kb,
+    }, list(sent.keys())
+
+
+def bench_poll(sids: list, rounds: int, workers: int) -> dict:
+    '''
+    poll the already judged `sids` through `get_result` `rounds` times
+    '''
+    async def main():
+        pool = SessionPool([("bench0", "bench")], 1)
+        await pool.open()
+        try:
+            for _ in range(rounds):
+                await get_result(pool.session(0), sids, workers=workers, policy=FAST_POLL)
+        finally:
+            await pool.close()
+
+    METRICS.reset()
+    with Probe() as p:
+        asyncio.run(main())
+    polls = METRICS.phases["status"].count
+    return {
+        "polls": polls,
+        "pollsPerSec": polls / p.wall,
+        "cpuPerRequestMs": p.cpu / _requests() * 1e3,
+        "status": METRICS.phases["status"].summary(),
+        "peakRssKb": p.peak_rss_kb,
+    }
+
+
+def bench_filter(count: int) -> dict:
+    '''
+    check `count` synthetic verdicts with `full_filter`
+    '''
+    filters = {"bench.zip": {"status": 0, "score": 100, "MaxRunTime": 1000, "MinRunTime": 0,
+                             "MaxMemoryUsage": 65536, "MinMemoryUsage": 0,
+                             "tasks": {"0:0": {"status": 0, "stdout": "Hello, 2\n"}}}}
+    raw = {}
+    for i in range(count):
+        raw[f"{i:024x}"] = {"src": "bench.zip", "status": 0, "score": 100, "runTime": i % 1200, "memoryUsage": 1024,
+                            "tasks": [{"cases": [{"status": 0, "stdout": "Hello, 2\n"}]}]}
+    with Probe() as p:
+        full_filter(raw, filters)
+    return {
+        "records": count,
+        "recordsPerSec": count / p.wall,
+        "cpuPerRecordUs": p.cpu / count * 1e6,
+        "peakRssKb": p.peak_rss_kb,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    '''
+    the tracked measurements of `current` worse than `baseline` by more than `tolerance` (a ratio)
+    '''
+    regressions = []
+    for name, old_res in baseline.items():
+        new_res = current.get(name, {})
+        for k in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            if k not in old_res or k not in new_res or old_res[k] == 0:
+                continue
+            change = (new_res[k] - old_res[k]) / old_res[k]
+            worse = -change if k in HIGHER_IS_BETTER else change
+            if worse > tolerance:
+                regressions.append(f"{name}.{k}: {old_res[k]:.4g} -> {new_res[k]:.4g} ({change:+.1%})")
+    return regressions
+
+
+@bench.command()
+@click.option("--port", "port", type=int, default=8181, help="the port of the mock NOJ(default is 8181)")
+@click.option("-c", "--count", "count", type=int, default=2000, help="the submissions to send(default is 2000)")
+@click.option("--users", "users", type=int, default=8, help="the users submitting(default is 8)")
+@click.option("-w", "--workers", "workers", type=int, default=64, help="the status polling workers(default is 64)")
+@click.option("-j", "--judges", "judges", type=int, default=64, help="the judges of the mock(default is 64)")
+@click.option("--rounds", "rounds", type=int, default=5, help="how many times the poll benchmark polls every submission(default is 5)")
+@click.option("--records", "records", type=int, default=100000, help="the verdicts the filter benchmark checks(default is 100000)")
+@click.option("--only", "only", type=click.Choice(BENCHMARKS), multiple=True, help="run only these benchmarks(default is all)")
+@click.option("--baseline", "baseline", type=str, default="", help="a saved result to compare with")
+@click.option("--save", "save", type=bool, default=False, help="write this run to --baseline instead of comparing with it")
+@click.option("--tolerance", "tolerance", type=float, default=0.2, help="the allowed ratio a measurement may get worse than the baseline(default is 0.2)")
+@click.option("--fname", "fname", type=str, default="bench.json", help="the filename of the result(default is bench.json)")
+@click.option("--logLevel", "log_level", type=click.Choice(["DEBUG", "INFO", "WARNING"]), default="WARNING", help="the log level while benchmarking , DEBUG shows the cost of debug logging(default is WARNING)")
+def run(port: int, count: int, users: int, workers: int, judges: int, rounds: int, records: int, only: tuple,
+        baseline: str, save: bool, tolerance: float, fname: str, log_level: str):
+    '''
+    measure the max submissions/sec and polls/sec this tool drives , its cpu per request and peak rss
+    '''
+    only = only or BENCHMARKS
+    ready = multiprocessing.Event()
+    # the mock runs in its own process so its cpu time is not billed to the client
+    server = multiprocessing.Process(target=_serve, args=(port, judges, ready), daemon=True)
+    server.start()
+    if not ready.wait(10):
+        server.terminate()
+        raise click.ClickException("the mock NOJ did not start")
+    login.cfg = {"API_BASE": f"http://127.0.0.1:{port}/api", "users": []}
+    level = logging.getLogger().level
+    logging.getLogger().setLevel(log_level)
+    results = {}
+    try:
+        if "submit" in only or "poll" in only:
+            res, sids = bench_submit(count, users, workers)
+            if "submit" in only:
+                results["submit"] = res
+        if "poll" in only:
+            results["poll"] = bench_poll(sids, rounds, workers)
+        if "filter" in only:
+            results["filter"] = bench_filter(records)
+    finally:
+        logging.getLogger().setLevel(level)
+        server.terminate()
+        server.join()
+    for name, res in results.items():
+        logging.info(f"{name}:{res}")
+    with open(fname, "w") as f:
+        f.write(json.dumps(results, indent=4))
+    if baseline == "":
+        return
+    if save:
+        with open(baseline, "w") as f:
+            f.write(json.dumps(results, indent=4))
+        logging.info(f"baseline saved to {baseline}")
+        return
+    with open(baseline, "r") as f:
+        regressions = compare(results, json.loads(f.read()), tolerance)
+    if len(regressions) != 0:
+        raise click.ClickException("regressed against the baseline:\n" + "\n".join(regressions))
+    logging.info("no regression against the baseline")
@@ -2,13 +2,18 @@ import aiohttp
 import requests
 import json
 import logging
+import os
 import asyncio
+from .metrics import METRICS
+from .trace import TRACER
+from .resilience import request_json
+CFG_FILE = "cores/config.json"
 cfg = {}
 ASYNC_SESS = None
 SEQ_SESS = None
 
 def read_cfg():
-    with open("cores/config.json", "r") as f:
+    with open(CFG_FILE, "r") as f:
         global cfg
         cfg = json.loads(f.read())
         logging.debug(cfg)
@@ -28,20 +33,27 @@ def get_api_base() -> str:
     return cfg["API_BASE"]
 
 
-async def _get_async_session(username , passwd = "") -> aiohttp.ClientSession:
+async def _get_async_session(username , passwd = "" , **session_kwargs) -> aiohttp.ClientSession:
+    '''
+    login as `username` , extra keyword arguments go to `aiohttp.ClientSession`
+    (e.g. a shared `connector`)
+    '''
     if passwd == "":
         passwd = get_user_passwd(username)
-    ses = aiohttp.ClientSession()
-    async with ses.post(f"{get_api_base()}/auth/session",
-                        json={
-                            'username': username,
-                            'password': passwd
-                        }) as resp:
-        txt = await resp.text()
-        logging.debug(f"[login raw]{txt}")
-        assert resp.status == 200
-        return ses
-    return None
+    session_kwargs.setdefault("trace_configs", TRACER.trace_configs())
+    ses = aiohttp.ClientSession(**session_kwargs)
+    try:
+        # logging in again is harmless , it is retried like a read
+        txt = await request_json(ses, "POST", f"{get_api_base()}/auth/session", "login", safe=True, parse=False,
+                                 json={
+                                     'username': username,
+                                     'password': passwd
+                                 })
+    except BaseException:
+        await ses.close()
+        raise
+    logging.debug(f"[login raw]{txt}")
+    return ses
 
 
 def get_async_session(username="first_admin") -> aiohttp.ClientSession:
@@ -63,13 +75,14 @@ def get_session(username="first_admin") -> requests.Session:
     if SEQ_SESS is not None:
         return SEQ_SESS
     sess = requests.Session()
-    resp = sess.post(
-        f'{get_api_base()}/auth/session',
-        json={
-            'username': username,
-            'password': get_user_passwd(username)
-        },
-    )
+    with METRICS.timed("login"):
+        resp = sess.post(
+            f'{get_api_base()}/auth/session',
+            json={
+                'username': username,
+                'password': get_user_passwd(username)
+            },
+        )
 
     if resp.status_code != 200:
         sess.close()
@@ -0,0 +1,162 @@
+import time
+from contextlib import contextmanager
+from .trace import TRACER
+
+# every power of two range of microseconds is split into 2^(SUB_BITS-1)
+# linear buckets , so a recorded value is off by less than 1/128 of itself
+SUB_BITS = 8
+SUB_COUNT = 1 << SUB_BITS
+HALF_COUNT = SUB_COUNT >> 1
+PERCENTILES = [("p50", 50.0), ("p90", 90.0), ("p99", 99.0), ("p99.9", 99.9)]
+
+
+def _bucket(v: int) -> int:
+    if v < SUB_COUNT:
+        return v
+    shift = v.bit_length() - SUB_BITS
+    return SUB_COUNT + (shift - 1) * HALF_COUNT + ((v >> shift) - HALF_COUNT)
+
+
+def _bucket_top(idx: int) -> int:
+    '''
+    the highest value that falls in bucket `idx`
+    '''
+    if idx < SUB_COUNT:
+        return idx
+    shift = (idx - SUB_COUNT) // HALF_COUNT + 1
+    top = (idx - SUB_COUNT) % HALF_COUNT + HALF_COUNT
+    return ((top + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    '''
+    a log-linear (HdrHistogram style) histogram of durations in sec ,
+    histograms merge by adding their bucket counts
+    '''
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, sec: float):
+        us = max(0, int(sec * 1e6))
+        idx = _bucket(us)
+        self.counts[idx] = self.counts.get(idx, 0) + 1
+        self.count += 1
+        self.total += us
+        self.min = us if self.min is None else min(self.min, us)
+        self.max = max(self.max, us)
+
+    def merge(self, other: "LatencyHistogram"):
+        for idx, c in other.counts.items():
+            self.counts[idx] = self.counts.get(idx, 0) + c
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = max(1, int(q / 100 * self.count + 0.999999))
+        seen = 0
+        for idx in sorted(self.counts.keys()):
+            seen += self.counts[idx]
+            if seen >= rank:
+                return min(_bucket_top(idx), self.max) / 1e6
+        return self.max / 1e6
+
+    def summary(self) -> dict:
+        res = {"count": self.count}
+        if self.count == 0:
+            return res
+        for name, q in PERCENTILES:
+            res[name] = self.percentile(q)
+        res["max"] = self.max / 1e6
+        res["mean"] = self.total / self.count / 1e6
+        return res
+
+    def dump(self) -> dict:
+        return {"counts": {str(k): v for k, v in self.counts.items()}, "count": self.count,
+                "total": self.total, "min": self.min, "max": self.max}
+
+    @classmethod
+    def load(cls, data: dict) -> "LatencyHistogram":
+        h = cls()
+        h.counts = {int(k): v for k, v in data["counts"].items()}
+        h.count = data["count"]
+        h.total = data["total"]
+        h.min = data["min"]
+        h.max = data["max"]
+        return h
+
+
+class PhaseMetrics:
+    '''
+    one histogram per request phase (create , upload , status , ...) and
+    per phase of each source file
+    '''
+
+    def __init__(self):
+        self.phases = {}
+        self.sources = {}
+
+    def reset(self):
+        self.phases = {}
+        self.sources = {}
+
+    def record(self, phase: str, sec: float, src: str = None):
+        self.phases.setdefault(phase, LatencyHistogram()).record(sec)
+        if src is not None:
+            self.sources.setdefault(src, {}).setdefault(phase, LatencyHistogram()).record(sec)
+
+    @contextmanager
+    def timed(self, phase: str, src: str = None):
+        '''
+        record the time of the block , also as a span of `TRACER` while it is enabled
+        '''
+        lane = TRACER.phase_lane() if TRACER.enabled else None
+        begin = time.monotonic()
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            self.record(phase, end - begin, src)
+            if lane is not None:
+                TRACER.span(phase, "phase", begin, end, lane, {"src": src} if src is not None else None)
+                TRACER.release_phase_lane(lane)
+
+    def merge(self, other: "PhaseMetrics"):
+        for phase, h in other.phases.items():
+            self.phases.setdefault(phase, LatencyHistogram()).merge(h)
+        for src, phases in other.sources.items():
+            for phase, h in phases.items():
+                self.sources.setdefault(src, {}).setdefault(phase, LatencyHistogram()).merge(h)
+        return self
+
+    def summary(self) -> dict:
+        return {
+            "phases": {p: h.summary() for p, h in self.phases.items()},
+            "sources": {s: {p: h.summary() for p, h in phases.items()} for s, phases in self.sources.items()},
+        }
+
+    def dump(self) -> dict:
+        return {
+            "phases": {p: h.dump() for p, h in self.phases.items()},
+            "sources": {s: {p: h.dump() for p, h in phases.items()} for s, phases in self.sources.items()},
+        }
+
+    @classmethod
+    def load(cls, data: dict) -> "PhaseMetrics":
+        m = cls()
+        m.phases = {p: LatencyHistogram.load(h) for p, h in data["phases"].items()}
+        m.sources = {s: {p: LatencyHistogram.load(h) for p, h in phases.items()} for s, phases in data["sources"].items()}
+        return m
+
+
+METRICS = PhaseMetrics()
@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    '''
+    an asyncio token bucket , `acquire` blocks until a token is available
+
+    Args:
+        rate: tokens refilled per sec , 0 means unlimited
+        burst: the bucket size , default is max(1 , rate)
+    '''
+
+    def __init__(self, rate: float, burst: float = 0):
+        self.rate = rate
+        self.burst = burst if burst > 0 else max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> bool:
+        '''
+        take a token without waiting , False if the bucket is empty
+        '''
+        if self.rate <= 0:
+            return True
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
@@ -0,0 +1,329 @@
+import aiohttp
+import asyncio
+import json
+import logging
+import random
+import time
+from .metrics import METRICS
+
+# the kinds of a failed request , the transient ones may pass on a retry
+TRANSIENT_KINDS = ("timeout", "connection", "server", "throttled")
+FAILURE_KINDS = TRANSIENT_KINDS + ("client", "auth", "protocol", "circuit")
+
+
+class ApiError(Exception):
+    '''
+    a failed NOJ request , `kind` is one of `FAILURE_KINDS`:
+
+        timeout , connection   no reply at all
+        server                 a 5xx reply
+        throttled              a 429 reply
+        auth                   a 401 or 403 reply
+        client                 any other non 200 reply
+        protocol               a 200 reply that is not the expected json
+        circuit                not sent , the circuit breaker gave up waiting
+    '''
+
+    def __init__(self, endpoint: str, kind: str, status: int = None, message: str = ""):
+        self.endpoint = endpoint
+        self.kind = kind
+        self.status = status
+        self.message = message
+        super().__init__(f"{endpoint} failed ({kind}{'' if status is None else f' {status}'}) {message}".rstrip())
+
+    @property
+    def transient(self) -> bool:
+        return self.kind in TRANSIENT_KINDS
+
+
+def classify(status: int) -> str:
+    '''
+    the failure kind of a non 200 status code
+    '''
+    if status == 429:
+        return "throttled"
+    if status >= 500:
+        return "server"
+    if status in (401, 403):
+        return "auth"
+    return "client"
+
+
+def _message(text: str) -> str:
+    try:
+        return str(json.loads(text).get("message", ""))
+    except (ValueError, AttributeError):
+        return text[:200]
+
+
+def check_reply(endpoint: str, status: int, text: str, parse: bool = True):
+    '''
+    raise the `ApiError` of a non 200 reply , otherwise return the parsed
+    json (or `text` itself when `parse` is False)
+    '''
+    if status != 200:
+        raise ApiError(endpoint, classify(status), status, _message(text))
+    if not parse:
+        return text
+    try:
+        return json.loads(text)
+    except ValueError:
+        raise ApiError(endpoint, "protocol", status, text[:200])
+
+
+class RetryPolicy:
+    '''
+    retry a transient failure of a safe request up to `retries` times , the
+    n-th retry waits about `backoff * 2^n` sec (at most `max_backoff`) spread by `jitter`
+    '''
+
+    def __init__(self, retries: int = 3, backoff: float = 0.5, max_backoff: float = 10.0, jitter: float = 0.5):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+    def delay(self, attempt: int) -> float:
+        d = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return d * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class CircuitBreaker:
+    '''
+    open after `threshold` transient failures in a row (0 never opens) , while
+    open every request waits instead of being sent , after `cooldown` sec a
+    single probe goes out , it closes the circuit on success or opens it again
+
+    a breaker is used by one event loop at a time
+    '''
+
+    def __init__(self, threshold: int = 20, cooldown: float = 5.0, max_wait: float = 600.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self.reset()
+
+    def reset(self):
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_at = 0.0
+        self.opens = 0
+        self.open_time = 0.0
+        self._probe = None
+
+    async def admit(self, endpoint: str = "") -> bool:
+        '''
+        wait until a request may be sent , True when it is the probe of a half-open
+        circuit , which must end in `success` , `failure` or `release`
+        '''
+        begin = time.monotonic()
+        while self.state != "closed":
+            if time.monotonic() - begin > self.max_wait:
+                raise ApiError(endpoint, "circuit", message=f"the circuit stayed open for {self.max_wait} sec")
+            if self.state == "open":
+                wait = self.probe_at - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                self.state = "half-open"
+                self._probe = asyncio.Event()
+                return True
+            await self._probe.wait()
+        return False
+
+    def _wake(self):
+        if self._probe is not None:
+            self._probe.set()
+            self._probe = None
+
+    def success(self):
+        self.failures = 0
+        if self.state != "closed":
+            self.open_time += time.monotonic() - self.opened_at
+            self.state = "closed"
+            self._wake()
+            logging.info("circuit closed , the api is back")
+
+    def failure(self):
+        self.failures += 1
+        if self.state == "half-open":
+            # the probe failed , wait another cooldown
+            self.state = "open"
+            self.probe_at = time.monotonic() + self.cooldown
+            self._wake()
+        elif self.state == "closed" and 0 < self.threshold <= self.failures:
+            self.state = "open"
+            self.opens += 1
+            self.opened_at = time.monotonic()
+            self.probe_at = self.opened_at + self.cooldown
+            logging.warning(f"circuit opened after {self.failures} failures in a row , pausing the load")
+
+    def release(self):
+        '''
+        the probe ended without telling whether the api is up (cancelled or an
+        unexpected error) , let the next waiting request probe right away
+        '''
+        if self.state == "half-open":
+            self.state = "open"
+            self.probe_at = time.monotonic()
+            self._wake()
+
+    def summary(self) -> dict:
+        open_time = self.open_time
+        if self.state != "closed":
+            open_time += time.monotonic() - self.opened_at
+        return {"state": self.state, "opens": self.opens, "openTime": open_time}
+
+
+class ErrorCounters:
+    '''
+    the requests , retries and failures by kind of every endpoint ,
+    counters merge by adding them
+    '''
+
+    def __init__(self):
+        self.endpoints = {}
+
+    def reset(self):
+        self.endpoints = {}
+
+    def _get(self, endpoint: str) -> dict:
+        c = self.endpoints.get(endpoint)
+        if c is None:
+            c = self.endpoints[endpoint] = {"requests": 0, "errors": 0, "retries": 0, "kinds": {}}
+        return c
+
+    def request(self, endpoint: str):
+        self._get(endpoint)["requests"] += 1
+
+    def error(self, endpoint: str, kind: str):
+        c = self._get(endpoint)
+        c["errors"] += 1
+        c["kinds"][kind] = c["kinds"].get(kind, 0) + 1
+
+    def retry(self, endpoint: str):
+        self._get(endpoint)["retries"] += 1
+
+    def merge(self, other: "ErrorCounters"):
+        for endpoint, o in other.endpoints.items():
+            c = self._get(endpoint)
+            for k in ("requests", "errors", "retries"):
+                c[k] += o[k]
+            for kind, n in o["kinds"].items():
+                c["kinds"][kind] = c["kinds"].get(kind, 0) + n
+        return self
+
+    def summary(self) -> dict:
+        '''
+        the counters with the error rate of every endpoint and of all of them under "total"
+        '''
+        res = {}
+        total = {"requests": 0, "errors": 0, "retries": 0, "kinds": {}}
+        for endpoint, c in sorted(self.endpoints.items()):
+            res[endpoint] = dict(c, kinds=dict(c["kinds"]), errorRate=c["errors"] / c["requests"] if c["requests"] else 0.0)
+            for k in ("requests", "errors", "retries"):
+                total[k] += c[k]
+            for kind, n in c["kinds"].items():
+                total["kinds"][kind] = total["kinds"].get(kind, 0) + n
+        total["errorRate"] = total["errors"] / total["requests"] if total["requests"] else 0.0
+        res["total"] = total
+        return res
+
+    def dump(self) -> dict:
+        return {endpoint: dict(c, kinds=dict(c["kinds"])) for endpoint, c in self.endpoints.items()}
+
+    @classmethod
+    def load(cls, data: dict) -> "ErrorCounters":
+        e = cls()
+        e.endpoints = {endpoint: dict(c, kinds=dict(c["kinds"])) for endpoint, c in data.items()}
+        return e
+
+
+class Resilience:
+    '''
+    the shared request layer: every call is admitted by the circuit breaker ,
+    counted per endpoint , and a safe (idempotent) call is retried by the policy
+    '''
+
+    def __init__(self):
+        self.policy = RetryPolicy()
+        self.breaker = CircuitBreaker()
+        self.counters = ErrorCounters()
+
+    def configure(self, retry: dict = None, breaker: dict = None):
+        '''
+        `retry` holds the arguments of `RetryPolicy` and `breaker` those of `CircuitBreaker`
+        '''
+        if retry is not None:
+            self.policy = RetryPolicy(**retry)
+        if breaker is not None:
+            self.breaker = CircuitBreaker(**breaker)
+
+    def reset(self):
+        self.breaker.reset()
+        self.counters.reset()
+
+    async def call(self, endpoint: str, attempt, safe: bool = False):
+        '''
+        await `attempt()` , a fresh request every time , failures are raised as `ApiError`
+        '''
+        tries = self.policy.retries + 1 if safe else 1
+        for n in range(tries):
+            probe = await self.breaker.admit(endpoint)
+            self.counters.request(endpoint)
+            try:
+                try:
+                    res = await attempt()
+                except ApiError as e:
+                    err = e
+                except asyncio.TimeoutError:
+                    err = ApiError(endpoint, "timeout")
+                except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError) as e:
+                    err = ApiError(endpoint, "connection", message=repr(e))
+                else:
+                    self.breaker.success()
+                    return res
+                self.counters.error(endpoint, err.kind)
+                if err.transient:
+                    self.breaker.failure()
+                else:
+                    # the api answered , it is up
+                    self.breaker.success()
+            finally:
+                # whatever ended the probe , the waiters must not hang on it
+                if probe:
+                    self.breaker.release()
+            if not err.transient or n + 1 == tries:
+                raise err
+            self.counters.retry(endpoint)
+            await asyncio.sleep(self.policy.delay(n))
+
+    def check(self, endpoint: str, status: int, text: str, parse: bool = True):
+        '''
+        count a reply of a blocking (requests) call and check it like `check_reply`
+        '''
+        self.counters.request(endpoint)
+        try:
+            return check_reply(endpoint, status, text, parse)
+        except ApiError as e:
+            self.counters.error(endpoint, e.kind)
+            raise
+
+
+RESILIENCE = Resilience()
+
+
+async def request_json(sess: aiohttp.ClientSession, method: str, url: str, endpoint: str, src: str = None,
+                       safe: bool = False, parse: bool = True, **kwargs):
+    '''
+    send one request through `RESILIENCE` timed as `endpoint` of `src` , return the
+    parsed json reply (or its text when `parse` is False) , extra keyword arguments go
+    to `sess.request` and must be reusable when `safe`
+    '''
+    async def attempt():
+        with METRICS.timed(endpoint, src):
+            async with sess.request(method, url, **kwargs) as resp:
+                text = await resp.text()
+        return check_reply(endpoint, resp.status, text, parse)
+    return await RESILIENCE.call(endpoint, attempt, safe)
@@ -0,0 +1,19 @@
+import random
+
+
+def make_sampler(spec: str, rng: random.Random = None):
+    '''
+    a sampler of sec from `const:S` , `uniform:LO:HI` , `exp:MEAN` or `lognormal:MU:SIGMA`
+    '''
+    rng = rng or random.Random()
+    els = spec.split(":")
+    kind, args = els[0], [float(x) for x in els[1:]]
+    if kind == "const":
+        return lambda: args[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(args[0], args[1])
+    if kind == "exp":
+        return lambda: rng.expovariate(1 / args[0]) if args[0] > 0 else 0.0
+    if kind == "lognormal":
+        return lambda: rng.lognormvariate(args[0], args[1])
+    raise Exception(f"Undefined distribution {spec}")
@@ -0,0 +1,189 @@
+import aiohttp
+import asyncio
+import json
+import logging
+import os
+import time
+from email.utils import parsedate_to_datetime
+from yarl import URL
+from . import login
+from .trace import TRACER
+
+
+def make_connector(limit: int = 256, limit_per_host: int = 0, keepalive_timeout: float = 30, ttl_dns_cache: int = 300) -> aiohttp.TCPConnector:
+    '''
+    a connector meant to be shared by many sessions
+    '''
+    return aiohttp.TCPConnector(limit=limit,
+                                limit_per_host=limit_per_host,
+                                keepalive_timeout=keepalive_timeout,
+                                use_dns_cache=True,
+                                ttl_dns_cache=ttl_dns_cache)
+
+
+def pool_users(count: int, pattern: str = "", passwd_pattern: str = "") -> list:
+    '''
+    the `(username, passwd)` pairs of a pool
+
+    if `pattern` is "" , take the first `count` users of `cores/config.json` ,
+    otherwise format `pattern` (and `passwd_pattern` , default is `pattern`) with 0 ~ count-1
+    '''
+    if pattern == "":
+        if login.cfg == {}:
+            login.read_cfg()
+        users = [(u["username"], u["passwd"]) for u in login.cfg["users"]]
+        assert len(users) >= count, f"only {len(users)} users in config"
+        return users[:count]
+    if passwd_pattern == "":
+        passwd_pattern = pattern
+    return [(pattern.format(i), passwd_pattern.format(i)) for i in range(count)]
+
+
+def _cookie_expire(morsel, saved: float, max_age: float) -> float:
+    if morsel["max-age"] != "":
+        return saved + int(morsel["max-age"])
+    if morsel["expires"] != "":
+        try:
+            return parsedate_to_datetime(morsel["expires"]).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return saved + max_age
+
+
+def save_cookies(ses: aiohttp.ClientSession, fname: str, max_age: float = 3600):
+    '''
+    dump the cookies of `ses` with the time they expire
+    '''
+    now = time.time()
+    cookies = []
+    for m in ses.cookie_jar:
+        cookies.append({"name": m.key, "value": m.value, "expire": _cookie_expire(m, now, max_age)})
+    with open(fname, "w") as f:
+        f.write(json.dumps({"saved": now, "cookies": cookies}))
+
+
+def load_cookies(ses: aiohttp.ClientSession, fname: str, margin: float = 60) -> bool:
+    '''
+    put the cookies saved in `fname` into `ses` if none of them expires within `margin` sec
+    '''
+    if not os.path.isfile(fname):
+        return False
+    try:
+        with open(fname, "r") as f:
+            saved = json.loads(f.read())
+    except ValueError:
+        logging.warning(f"broken cookie file {fname}")
+        return False
+    cookies = saved.get("cookies", [])
+    if len(cookies) == 0 or any(c["expire"] <= time.time() + margin for c in cookies):
+        return False
+    ses.cookie_jar.update_cookies({c["name"]: c["value"] for c in cookies}, response_url=URL(login.get_api_base()))
+    return True
+
+
+class SessionPool:
+    '''
+    many logged in users sharing one connector
+
+    Args:
+        users: `(username, passwd)` pairs , see `pool_users`
+        parallel: the max concurrent logins
+        cookie_dir: reuse and keep the cookies of every user in this directory , "" disables it
+        cookie_max_age: assumed lifetime in sec of cookies without expiry
+        connector: the shared connector , default is `make_connector()`
+    '''
+
+    def __init__(self, users: list, parallel: int = 16, cookie_dir: str = "", cookie_max_age: float = 3600, connector: aiohttp.TCPConnector = None):
+        assert len(users) > 0, "a pool needs at least one user"
+        self.users = users
+        self.parallel = max(1, parallel)
+        self.cookie_dir = cookie_dir
+        self.cookie_max_age = cookie_max_age
+        self.connector = connector
+        self.sessions = []
+        self.reused = 0
+        self._next = 0
+
+    def _cookie_file(self, username: str) -> str:
+        return os.path.join(self.cookie_dir, f"{username}.json")
+
+    async def _open_one(self, sem: asyncio.Semaphore, username: str, passwd: str) -> aiohttp.ClientSession:
+        async with sem:
+            if self.cookie_dir != "":
+                ses = aiohttp.ClientSession(connector=self.connector, connector_owner=False,
+                                            cookie_jar=aiohttp.CookieJar(unsafe=True),
+                                            trace_configs=TRACER.trace_configs())
+                if load_cookies(ses, self._cookie_file(username)):
+                    logging.debug(f"reuse cookies of {username}")
+                    self.reused += 1
+                    return ses
+                await ses.close()
+            ses = await login._get_async_session(username, passwd,
+                                                 connector=self.connector, connector_owner=False,
+                                                 cookie_jar=aiohttp.CookieJar(unsafe=True))
+            if self.cookie_dir != "":
+                try:
+                    save_cookies(ses, self._cookie_file(username), self.cookie_max_age)
+                except BaseException:
+                    await ses.close()
+                    raise
+            return ses
+
+    async def open(self):
+        '''
+        login every user , skipping the ones with valid saved cookies , when
+        one login fails the others are stopped and the pool is closed
+        '''
+        # users with explicit passwords need no config , but its api base is used when there is one
+        if login.cfg == {} and (any(p == "" for _, p in self.users) or os.path.isfile(login.CFG_FILE)):
+            login.read_cfg()
+        if self.connector is None:
+            self.connector = make_connector()
+        if self.cookie_dir != "":
+            os.makedirs(self.cookie_dir, exist_ok=True)
+        sem = asyncio.Semaphore(self.parallel)
+        begin = time.monotonic()
+        logins = [asyncio.ensure_future(self._open_one(sem, u, p)) for u, p in self.users]
+        try:
+            self.sessions = list(await asyncio.gather(*logins))
+        except BaseException:
+            for t in logins:
+                t.cancel()
+            opened = await asyncio.gather(*logins, return_exceptions=True)
+            self.sessions = [ses for ses in opened if isinstance(ses, aiohttp.ClientSession)]
+            await self.close()
+            raise
+        logging.info(f"{len(self.sessions)} users ready in {time.monotonic() - begin:.3f} sec , {self.reused} reused cookies")
+        return self
+
+    async def close(self):
+        for ses in self.sessions:
+            await ses.close()
+        self.sessions = []
+        if self.connector is not None:
+            await self.connector.close()
+            self.connector = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def username(self, i: int) -> str:
+        return self.users[i % len(self.users)][0]
+
+    def session(self, i: int) -> aiohttp.ClientSession:
+        return self.sessions[i % len(self.sessions)]
+
+    def next(self) -> (str, aiohttp.ClientSession):
+        '''
+        hand out the users round robin
+        '''
+        assert len(self.sessions) > 0, "the pool is not open"
+        i = self._next
+        self._next = (self._next + 1) % len(self.sessions)
+        return self.username(i), self.sessions[i]
@@ -0,0 +1,179 @@
+import aiohttp
+import heapq
+import json
+import os
+import re
+import time
+from collections import deque
+
+# the tids of http requests start here , lower ones are request phases
+HTTP_TID_BASE = 1000
+# submission ids in a path are folded so the same endpoint shares one name
+ID_SEGMENT = re.compile(r"/[0-9a-f]{24}(?=/|$)")
+
+
+class _Lanes:
+    '''
+    hand out the smallest free row so overlapping spans never share one
+    '''
+
+    def __init__(self, base: int):
+        self.base = base
+        self.free = []
+        self.used = 0
+
+    def take(self) -> int:
+        if len(self.free) != 0:
+            return heapq.heappop(self.free)
+        self.used += 1
+        return self.base + self.used - 1
+
+    def give(self, lane: int):
+        heapq.heappush(self.free, lane)
+
+
+class SendStamp:
+    '''
+    the `trace_request_ctx` of a request that should know when it was really
+    sent , `sent` is the monotonic time its headers went out , after waiting
+    for a connection , None until then
+    '''
+
+    def __init__(self):
+        self.sent = None
+
+
+async def _on_headers_sent(session, ctx, params):
+    stamp = ctx.trace_request_ctx
+    if isinstance(stamp, SendStamp) and stamp.sent is None:
+        stamp.sent = time.monotonic()
+
+
+def _send_stamp_config() -> aiohttp.TraceConfig:
+    tc = aiohttp.TraceConfig()
+    tc.on_request_headers_sent.append(_on_headers_sent)
+    return tc
+
+
+class Tracer:
+    '''
+    keep the latest `capacity` request events in memory and dump them in
+    the chrome trace-event format (chrome://tracing , ui.perfetto.dev) ,
+    recording costs nothing until `enable` is called
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self.events = deque()
+        self.recorded = 0
+        self.pid = os.getpid()
+        self._mono0 = time.monotonic()
+        self._wall0 = time.time()
+        self._phases = _Lanes(0)
+        self._http = _Lanes(HTTP_TID_BASE)
+
+    def enable(self, capacity: int = 100000):
+        self.enabled = True
+        self.events = deque(maxlen=max(1, capacity))
+        self.recorded = 0
+        self.pid = os.getpid()
+        self._mono0 = time.monotonic()
+        self._wall0 = time.time()
+        self._phases = _Lanes(0)
+        self._http = _Lanes(HTTP_TID_BASE)
+
+    def disable(self):
+        self.enabled = False
+
+    def ts(self, mono: float) -> float:
+        '''
+        a monotonic time as wall clock us , so the dumps of many processes line up
+        '''
+        return (mono - self._mono0 + self._wall0) * 1e6
+
+    def _add(self, event: dict):
+        event["pid"] = self.pid
+        self.events.append(event)
+        self.recorded += 1
+
+    def span(self, name: str, cat: str, begin: float, end: float, tid: int, args: dict = None):
+        self._add({"name": name, "cat": cat, "ph": "X", "ts": self.ts(begin), "dur": (end - begin) * 1e6,
+                   "tid": tid, "args": args or {}})
+
+    def instant(self, name: str, cat: str, at: float, tid: int, args: dict = None):
+        self._add({"name": name, "cat": cat, "ph": "i", "s": "t", "ts": self.ts(at), "tid": tid, "args": args or {}})
+
+    def phase_lane(self) -> int:
+        return self._phases.take()
+
+    def release_phase_lane(self, lane: int):
+        self._phases.give(lane)
+
+    def trace_configs(self) -> list:
+        '''
+        the `trace_configs` of a `ClientSession` , only the one filling `SendStamp`s while disabled
+        '''
+        if not self.enabled:
+            return [_send_stamp_config()]
+        tc = aiohttp.TraceConfig()
+        tc.on_request_start.append(self._on_request_start)
+        tc.on_request_end.append(self._on_request_end)
+        tc.on_request_exception.append(self._on_request_exception)
+        tc.on_connection_queued_start.append(self._on_queued_start)
+        tc.on_connection_queued_end.append(self._on_queued_end)
+        tc.on_connection_create_start.append(self._on_create_start)
+        tc.on_connection_create_end.append(self._on_create_end)
+        tc.on_connection_reuseconn.append(self._on_reuseconn)
+        return [_send_stamp_config(), tc]
+
+    async def _on_request_start(self, session, ctx, params):
+        ctx.begin = time.monotonic()
+        ctx.lane = self._http.take()
+        ctx.name = f"{params.method} {ID_SEGMENT.sub('/{id}', params.url.path)}"
+        ctx.path = params.url.path
+
+    def _end_request(self, ctx, args: dict):
+        if not hasattr(ctx, "lane"):
+            return
+        self.span(ctx.name, "http", ctx.begin, time.monotonic(), ctx.lane, dict(args, path=ctx.path))
+        self._http.give(ctx.lane)
+
+    async def _on_request_end(self, session, ctx, params):
+        self._end_request(ctx, {"status": params.response.status})
+
+    async def _on_request_exception(self, session, ctx, params):
+        self._end_request(ctx, {"exception": repr(params.exception)})
+
+    async def _on_queued_start(self, session, ctx, params):
+        ctx.queued = time.monotonic()
+
+    async def _on_queued_end(self, session, ctx, params):
+        self.span("queue-wait", "connection", ctx.queued, time.monotonic(), ctx.lane)
+
+    async def _on_create_start(self, session, ctx, params):
+        ctx.connecting = time.monotonic()
+
+    async def _on_create_end(self, session, ctx, params):
+        self.span("connect", "connection", ctx.connecting, time.monotonic(), ctx.lane)
+
+    async def _on_reuseconn(self, session, ctx, params):
+        self.instant("reuse-connection", "connection", time.monotonic(), ctx.lane)
+
+    def dump(self, fname: str):
+        '''
+        write the buffered events as a chrome trace , the rows are named after what they carry
+        '''
+        tids = sorted({e["tid"] for e in self.events})
+        meta = [{"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": f"noj tester {self.pid}"}}]
+        for tid in tids:
+            label = f"http {tid - HTTP_TID_BASE}" if tid >= HTTP_TID_BASE else f"phase {tid}"
+            meta.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": label}})
+        with open(fname, "w") as f:
+            f.write(json.dumps({
+                "traceEvents": meta + list(self.events),
+                "displayTimeUnit": "ms",
+                "otherData": {"recorded": self.recorded, "dropped": self.recorded - len(self.events)},
+            }))
+
+
+TRACER = Tracer()
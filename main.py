@@ -1,6 +1,10 @@
 import click
 import logging
-from submission import pressure_tester, rejudge , handwriteen
+from submission import pressure_tester, rejudge , handwriteen , distributed , summarize , report , closed_loop , replay , generator , compare
+from mock import mock , server
+from bench import bench , suite
+from scenario import scenario , engine
+from problem import problem , provision
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -14,4 +18,8 @@ def command_entry():
 
 if __name__ == "__main__":
     command_entry.add_command(pressure_tester.submission)
+    command_entry.add_command(mock)
+    command_entry.add_command(bench)
+    command_entry.add_command(scenario)
+    command_entry.add_command(problem)
     command_entry()
@@ -0,0 +1,7 @@
+import click
+@click.group()
+def mock():
+    '''
+        a local stand-in of the NOJ api for offline load testing
+    '''
+    pass
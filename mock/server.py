@@ -0,0 +1,408 @@
+import asyncio
+import click
+import hashlib
+import json
+import logging
+import random
+import time
+import uuid
+from aiohttp import web
+from aiohttp.helpers import parse_mimetype
+from . import mock
+from cores.rate_limit import TokenBucket
+from cores.sampling import make_sampler
+
+STATUS_CODES = {"AC": 0, "WA": 1, "CE": 2, "TLE": 3, "MLE": 4, "RE": 5, "JE": 6, "OLE": 7}
+COOKIE_NAME = "piann"
+
+
+def parse_mix(spec: str) -> dict:
+    '''
+    `AC=0.8,WA=0.1,TLE=0.1` to `{"AC": 0.8, ...}`
+    '''
+    mix = {}
+    for it in spec.split(","):
+        k, v = it.split("=")
+        assert k in STATUS_CODES, f"unknown verdict {k}"
+        mix[k] = float(v)
+    return mix
+
+
+class MockConfig:
+    '''
+    the behaviour of the mock judge
+
+    Args:
+        judges: concurrent judge workers , submissions queue up behind them
+        latency: the judge time distribution of a submission , see `cores.sampling.make_sampler`
+        verdicts: the weights of each verdict , see `parse_mix`
+        cases: the test cases of every submission
+        request_delay: the extra web tier time of every request , see `cores.sampling.make_sampler`
+        error_rate: the chance of a request failing with `error_status`
+        rate_limit: requests/sec allowed per user (per address before login) , 0 is unlimited
+        pdf_size: the size in bytes of the handwritten pdfs
+    '''
+
+    def __init__(self, judges: int = 4, latency: str = "exp:1.0", verdicts: str = "AC=1", cases: int = 1,
+                 request_delay: str = "const:0", error_rate: float = 0.0, error_status: int = 502,
+                 rate_limit: float = 0, pdf_size: int = 100 * 1024, seed: int = None):
+        self.judges = judges
+        self.latency = latency
+        self.verdicts = verdicts
+        self.cases = cases
+        self.request_delay = request_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate_limit = rate_limit
+        self.pdf_size = pdf_size
+        self.seed = seed
+
+    @classmethod
+    def load(cls, fname: str, **overrides) -> "MockConfig":
+        with open(fname, "r") as f:
+            data = dict(json.loads(f.read()))
+        data.update(overrides)
+        return cls(**data)
+
+
+def _reply(data=None, message: str = "ok", status: int = 200) -> web.Response:
+    return web.json_response({"status": "ok" if status == 200 else "err", "message": message, "data": data}, status=status)
+
+
+def _form_field(body: bytes, content_type: str, name: str) -> bytes:
+    '''
+    the raw bytes of a multipart field , the uploaded part is labelled
+    `multipart/form-data` itself so aiohttp's form parser can not read it
+    '''
+    boundary = parse_mimetype(content_type).parameters.get("boundary")
+    if boundary is None:
+        return None
+    for part in body.split(b"--" + boundary.encode()):
+        head, sep, content = part.partition(b"\r\n\r\n")
+        if sep and f'name="{name}"'.encode() in head:
+            return content[:-2] if content.endswith(b"\r\n") else content
+    return None
+
+
+class MockNOJ:
+    '''
+    the submission flow of NOJ kept in memory , judged by `config.judges` fake workers
+    '''
+
+    def __init__(self, config: MockConfig = None):
+        self.config = config or MockConfig()
+        self.rng = random.Random(self.config.seed)
+        self.judge_time = make_sampler(self.config.latency, self.rng)
+        self.request_delay = make_sampler(self.config.request_delay, self.rng)
+        mix = parse_mix(self.config.verdicts)
+        self.verdict_names = list(mix.keys())
+        self.verdict_weights = list(mix.values())
+        self.subs = {}
+        self.order = []
+        self.problems = {}
+        self.sessions = {}
+        self.buckets = {}
+        self.requests = 0
+        self.queue = None
+        self._judges = []
+
+    def make_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware], client_max_size=1024 ** 3)
+        app.add_routes([
+            web.post("/api/auth/session", self.login),
+            web.get("/api/course/{name}", self.course),
+            web.post("/api/submission", self.create),
+            web.get("/api/submission", self.list),
+            web.put("/api/submission/{sid}", self.upload),
+            web.get("/api/submission/{sid}", self.status),
+            web.get("/api/submission/{sid}/rejudge", self.rejudge),
+            web.put("/api/submission/{sid}/grade", self.grade),
+            web.get("/api/submission/{sid}/pdf/{item}", self.pdf),
+            web.get("/api/problem", self.problem_list),
+            web.post("/api/problem/manage", self.problem_create),
+            web.get("/api/problem/manage/{pid}", self.problem_detail),
+            web.put("/api/problem/manage/{pid}", self.problem_edit),
+        ])
+        app.on_startup.append(self._start_judges)
+        app.on_cleanup.append(self._stop_judges)
+        return app
+
+    async def _start_judges(self, app):
+        self.queue = asyncio.Queue()
+        self._judges = [asyncio.ensure_future(self._judge()) for _ in range(max(1, self.config.judges))]
+
+    async def _stop_judges(self, app):
+        for j in self._judges:
+            j.cancel()
+        await asyncio.gather(*self._judges, return_exceptions=True)
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.requests += 1
+        delay = self.request_delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.config.error_rate > 0 and self.rng.random() < self.config.error_rate:
+            return _reply(message="injected error", status=self.config.error_status)
+        if self.config.rate_limit > 0:
+            key = self._username(request) or request.remote
+            bucket = self.buckets.setdefault(key, TokenBucket(self.config.rate_limit))
+            if not bucket.try_acquire():
+                return _reply(message="too many requests", status=429)
+        return await handler(request)
+
+    def _username(self, request: web.Request) -> str:
+        return self.sessions.get(request.cookies.get(COOKIE_NAME))
+
+    def _auth(self, request: web.Request) -> str:
+        username = self._username(request)
+        if username is None:
+            raise web.HTTPForbidden(text=json.dumps({"status": "err", "message": "not logged in", "data": None}),
+                                    content_type="application/json")
+        return username
+
+    def _get(self, request: web.Request) -> dict:
+        sub = self.subs.get(request.match_info["sid"])
+        if sub is None:
+            raise web.HTTPNotFound(text=json.dumps({"status": "err", "message": "can not find the submission", "data": None}),
+                                   content_type="application/json")
+        return sub
+
+    def _view(self, sub: dict, with_tasks: bool = True) -> dict:
+        view = {
+            "submissionId": sub["submissionId"],
+            "problemId": sub["problemId"],
+            "user": {"username": sub["username"]},
+            "languageType": sub["languageType"],
+            "timestamp": sub["timestamp"],
+            "status": sub["status"],
+            "score": sub["score"],
+            "runTime": sub["runTime"],
+            "memoryUsage": sub["memoryUsage"],
+        }
+        if with_tasks:
+            view["tasks"] = sub["tasks"]
+        return view
+
+    async def login(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        token = uuid.uuid4().hex
+        self.sessions[token] = body["username"]
+        resp = _reply(message="Login Success")
+        resp.set_cookie(COOKIE_NAME, token, max_age=7 * 24 * 3600)
+        return resp
+
+    async def course(self, request: web.Request) -> web.Response:
+        self._auth(request)
+        return _reply({"course": request.match_info["name"], "students": [], "TAs": []})
+
+    async def create(self, request: web.Request) -> web.Response:
+        username = self._auth(request)
+        body = await request.json()
+        sid = uuid.uuid4().hex[:24]
+        self.subs[sid] = {
+            "submissionId": sid,
+            "problemId": body["problemId"],
+            "languageType": body["languageType"],
+            "username": username,
+            "timestamp": time.time(),
+            "status": -1,
+            "score": 0,
+            "runTime": 0,
+            "memoryUsage": 0,
+            "tasks": [],
+            "code": None,
+            "generation": 0,
+        }
+        self.order.append(sid)
+        return _reply({"submissionId": sid}, "submission recieved.")
+
+    async def upload(self, request: web.Request) -> web.Response:
+        self._auth(request)
+        sub = self._get(request)
+        if sub["code"] is not None:
+            return _reply(message=f"{sub['submissionId']} has finished judgement.", status=403)
+        code = _form_field(await request.read(), request.headers.get("Content-Type", ""), "code")
+        if code is None:
+            return _reply(message="can not find the source file", status=400)
+        sub["code"] = code
+        self.queue.put_nowait((sub["submissionId"], sub["generation"]))
+        return _reply(message=f"{sub['submissionId']} send to judgement.")
+
+    async def status(self, request: web.Request) -> web.Response:
+        self._auth(request)
+        return _reply(self._view(self._get(request)))
+
+    async def list(self, request: web.Request) -> web.Response:
+        self._auth(request)
+        q = request.query
+        offset = int(q.get("offset", 0))
+        count = int(q.get("count", 10))
+        subs = (self.subs[sid] for sid in reversed(self.order))
+        if "problemId" in q:
+            subs = (s for s in subs if str(s["problemId"]) == q["problemId"])
+        if "username" in q:
+            subs = (s for s in subs if s["username"] == q["username"])
+        if "status" in q:
+            subs = (s for s in subs if str(s["status"]) == q["status"])
+        subs = list(subs)
+        page = [self._view(s, False) for s in subs[offset:offset + count]]
+        return _reply({"submissions": page, "submissionCount": len(subs)})
+
+    async def rejudge(self, request: web.Request) -> web.Response:
+        self._auth(request)
+        sub = self._get(request)
+        if sub["code"] is None:
+            return _reply(message="the submission has not been uploaded", status=403)
+        sub["generation"] += 1
+        sub.update({"status": -1, "score": 0, "runTime": 0, "memoryUsage": 0, "tasks": []})
+        self.queue.put_nowait((sub["submissionId"], sub["generation"]))
+        return _reply(message=f"{sub['submissionId']} is sent to judgement.")
+
+    async def grade(self, request: web.Request) -> web.Response:
+        self._auth(request)
+        sub = self._get(request)
+        body = await request.json()
+        sub["score"] = body["score"]
+        return _reply(message=f"{sub['submissionId']} score recieved.")
+
+    def pdf_body(self, sid: str, item: str) -> bytes:
+        seed = hashlib.sha256(f"{sid}/{item}".encode()).digest()
+        body = b"%PDF-1.4\n" + seed * (self.config.pdf_size // len(seed) + 1)
+        return body[:max(self.config.pdf_size, 9)]
+
+    async def pdf(self, request: web.Request) -> web.Response:
+        self._auth(request)
+        sub = self._get(request)
+        item = request.match_info["item"]
+        if item not in ("upload", "comment"):
+            return _reply(message="unknown pdf item", status=404)
+        body = self.pdf_body(sub["submissionId"], item)
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        rng = request.headers.get("Range", "")
+        if rng.startswith("bytes=") and request.headers.get("If-Range", etag) == etag:
+            begin = int(rng[6:].split("-")[0])
+            if begin >= len(body):
+                return web.Response(status=416, headers={"Content-Range": f"bytes */{len(body)}"})
+            return web.Response(status=206, body=body[begin:], content_type="application/pdf",
+                                headers={"ETag": etag, "Content-Range": f"bytes {begin}-{len(body) - 1}/{len(body)}"})
+        return web.Response(body=body, content_type="application/pdf", headers={"ETag": etag})
+
+    def _problem(self, request: web.Request) -> dict:
+        prob = self.problems.get(request.match_info["pid"])
+        if prob is None:
+            raise web.HTTPNotFound(text=json.dumps({"status": "err", "message": "Problem not exist.", "data": None}),
+                                   content_type="application/json")
+        return prob
+
+    async def problem_list(self, request: web.Request) -> web.Response:
+        self._auth(request)
+        offset = int(request.query.get("offset", 0))
+        count = int(request.query.get("count", -1))
+        probs = [{"problemId": p["problemId"], "problemName": p["problemName"], "status": p["status"],
+                  "type": p["type"], "tags": p["tags"], "quota": p["quota"]} for p in self.problems.values()]
+        return _reply(probs[offset:] if count < 0 else probs[offset:offset + count])
+
+    async def problem_create(self, request: web.Request) -> web.Response:
+        self._auth(request)
+        body = await request.json()
+        pid = len(self.problems) + 1
+        self.problems[str(pid)] = dict(body, problemId=pid, testCase=None)
+        return _reply({"problemId": pid}, "Success.")
+
+    async def problem_detail(self, request: web.Request) -> web.Response:
+        self._auth(request)
+        return _reply({k: v for k, v in self._problem(request).items() if k != "testCase"})
+
+    async def problem_edit(self, request: web.Request) -> web.Response:
+        '''
+        a json body edits the problem , a multipart one uploads its test data
+        zip , which is hashed while it streams in and not kept
+        '''
+        self._auth(request)
+        prob = self._problem(request)
+        if request.content_type == "application/json":
+            prob.update(await request.json(), problemId=prob["problemId"])
+            return _reply(message="Success.")
+        reader = await request.multipart()
+        async for part in reader:
+            if part.name != "case":
+                continue
+            digest = hashlib.sha256()
+            size = 0
+            while True:
+                chunk = await part.read_chunk(256 * 1024)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+            prob["testCase"] = {"sha256": digest.hexdigest(), "size": size}
+            return _reply(message="Success.")
+        return _reply(message="can not find the test case", status=400)
+
+    def _judge_result(self, sub: dict):
+        name = self.rng.choices(self.verdict_names, self.verdict_weights)[0]
+        status = STATUS_CODES[name]
+        cases = []
+        for _ in range(max(1, self.config.cases)):
+            cases.append({
+                "status": status,
+                "execTime": 1500 if name == "TLE" else self.rng.randint(1, 100),
+                "memoryUsage": 300000 if name == "MLE" else self.rng.randint(1000, 5000),
+                "stdout": "Hello, 2\n" if name == "AC" else "",
+                "stderr": "Segmentation fault" if name == "RE" else "",
+                "exitCode": 139 if name == "RE" else 0,
+            })
+        sub.update({
+            "status": status,
+            "score": 100 if name == "AC" else 0,
+            "runTime": max(c["execTime"] for c in cases),
+            "memoryUsage": max(c["memoryUsage"] for c in cases),
+            "tasks": [{"status": status, "score": 100 if name == "AC" else 0, "cases": cases}],
+        })
+
+    async def _judge(self):
+        while True:
+            sid, generation = await self.queue.get()
+            await asyncio.sleep(max(0.0, self.judge_time()))
+            sub = self.subs.get(sid)
+            if sub is None or sub["generation"] != generation:
+                continue
+            self._judge_result(sub)
+
+
+async def start_server(config: MockConfig = None, host: str = "127.0.0.1", port: int = 8080) -> (web.AppRunner, MockNOJ):
+    '''
+    serve a `MockNOJ` on the running loop , stop it with `await runner.cleanup()`
+    '''
+    noj = MockNOJ(config)
+    runner = web.AppRunner(noj.make_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, noj
+
+
+@mock.command()
+@click.option("--host", "host", type=str, default="127.0.0.1", help="the address to listen on(default is 127.0.0.1)")
+@click.option("--port", "port", type=int, default=8080, help="the port to listen on(default is 8080) , point API_BASE of cores/config.json to http://host:port/api")
+@click.option("--cfg", "config", type=click.Path(file_okay=True), default="", help="a json file of MockConfig arguments , the options below overwrite it")
+@click.option("-j", "--judges", "judges", type=int, default=None, help="the concurrent judge workers(default is 4)")
+@click.option("--latency", "latency", type=str, default=None, help="the judge time distribution: const:S , uniform:LO:HI , exp:MEAN or lognormal:MU:SIGMA(default is exp:1.0)")
+@click.option("--verdicts", "verdicts", type=str, default=None, help="the verdict mix like AC=0.8,WA=0.1,TLE=0.1(default is AC=1)")
+@click.option("--cases", "cases", type=int, default=None, help="the test cases of every submission(default is 1)")
+@click.option("--requestDelay", "request_delay", type=str, default=None, help="the extra time of every request , same format as --latency(default is const:0)")
+@click.option("--errorRate", "error_rate", type=float, default=None, help="the chance of a request failing(default is 0)")
+@click.option("--errorStatus", "error_status", type=int, default=None, help="the status code of injected errors(default is 502)")
+@click.option("--rateLimit", "rate_limit", type=float, default=None, help="the requests/sec allowed per user , 0 is unlimited(default is 0)")
+@click.option("--seed", "seed", type=int, default=None, help="the random seed")
+def serve(host: str, port: int, config: str, **options):
+    '''
+    serve a mock NOJ api on localhost
+    '''
+    overrides = {k: v for k, v in options.items() if v is not None}
+    cfg = MockConfig.load(config, **overrides) if config != "" else MockConfig(**overrides)
+    logging.info(f"mock NOJ on http://{host}:{port}/api with {vars(cfg)}")
+    noj = MockNOJ(cfg)
+    web.run_app(noj.make_app(), host=host, port=port, access_log=None)
@@ -1 +1,66 @@
-from . import problem
\ No newline at end of file
+import aiohttp
+import hashlib
+import logging
+import os
+from cores.login import get_api_base
+from cores.metrics import METRICS
+from cores.resilience import RESILIENCE, check_reply, request_json
+
+
+def file_sha256(fname: str, chunk_size: int = 1024 * 1024) -> str:
+    '''
+    the sha256 of the file `fname` read chunk by chunk
+    '''
+    digest = hashlib.sha256()
+    with open(fname, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def async_list_problems(sess: aiohttp.ClientSession) -> list:
+    '''
+    every problem the user can see , each with its `problemId` and `problemName`
+    '''
+    rj = await request_json(sess, "GET", f"{get_api_base()}/problem", "problem-list", safe=True,
+                            params={"offset": 0, "count": -1})
+    return rj["data"]
+
+
+async def async_create_problem(sess: aiohttp.ClientSession, payload: dict) -> int:
+    '''
+    create a problem from the json `payload` of `/problem/manage` and return its id ,
+    never retried , a lost reply may still have created it
+    '''
+    rj = await request_json(sess, "POST", f"{get_api_base()}/problem/manage", "problem-create", json=payload)
+    logging.debug(rj)
+    return rj["data"]["problemId"]
+
+
+async def async_edit_problem(sess: aiohttp.ClientSession, problem_id: int, payload: dict):
+    '''
+    replace the settings of `problem_id` with the json `payload` of `/problem/manage`
+    '''
+    await request_json(sess, "PUT", f"{get_api_base()}/problem/manage/{problem_id}", "problem-edit", safe=True,
+                       parse=False, json=payload)
+
+
+async def async_upload_testcase(sess: aiohttp.ClientSession, problem_id: int, fname: str) -> int:
+    '''
+    stream the test data zip `fname` to `problem_id` straight from the disk and
+    return its size , the upload replaces the old test data so it is retried like a read
+    '''
+    url = f"{get_api_base()}/problem/manage/{problem_id}"
+    size = os.path.getsize(fname)
+
+    async def attempt() -> int:
+        with open(fname, "rb") as fp:
+            # a file object is sent in chunks by aiohttp , a fresh one for every attempt
+            form = aiohttp.FormData(quote_fields=False)
+            form.add_field("case", fp, filename=os.path.basename(fname), content_type="application/zip")
+            with METRICS.timed("testcase"):
+                async with sess.put(url, data=form) as resp:
+                    text = await resp.text()
+        check_reply("testcase", resp.status, text, parse=False)
+        return size
+    return await RESILIENCE.call("testcase", attempt, safe=True)
@@ -0,0 +1,225 @@
+import aiohttp
+import asyncio
+import click
+import hashlib
+import json
+import logging
+import os
+import time
+from . import problem
+from .core_utils import async_create_problem, async_edit_problem, async_list_problems, async_upload_testcase, file_sha256
+from cores.login import get_api_base
+from cores.session_pool import SessionPool
+
+MANIFEST = ".fixtures.json"
+DEFAULT_TASKS = [{"caseCount": 1, "taskScore": 100, "memoryLimit": 65536, "timeLimit": 1000}]
+
+
+def load_fixtures(fname: str) -> list:
+    '''
+    read a fixture spec , a json list of problems or `{"course": .., "problems": [..]}`:
+
+        {"name": "load-{}", "count": 50, "testcase": "fixtures/a.zip",
+         "tasks": [{"caseCount": 1, "taskScore": 100, "memoryLimit": 65536, "timeLimit": 1000}]}
+
+    a `count` expands the entry to that many problems named by `name.format(i)` ,
+    the other keys are the fields of `problem_payload`
+
+    Returns:
+        one fixture per problem , the name and test data path resolved
+    '''
+    with open(fname, "r") as f:
+        spec = json.loads(f.read())
+    course = "Public"
+    if isinstance(spec, dict):
+        course = spec.get("course", course)
+        spec = spec["problems"]
+    base = os.path.dirname(os.path.abspath(fname))
+    fixtures = []
+    for entry in spec:
+        entry = dict(entry)
+        entry.setdefault("course", course)
+        if entry.get("testcase"):
+            entry["testcase"] = os.path.join(base, entry["testcase"])
+        names = [entry["name"]]
+        if "count" in entry:
+            names = [entry["name"].format(i) for i in range(entry.pop("count"))]
+        for name in names:
+            fixtures.append(dict(entry, name=name))
+    return fixtures
+
+
+def problem_payload(fixture: dict) -> dict:
+    '''
+    the json body of `/problem/manage` for a fixture
+    '''
+    return {
+        "courses": [fixture.get("course", "Public")],
+        "status": fixture.get("status", 0),
+        "type": fixture.get("type", 0),
+        "problemName": fixture["name"],
+        "description": {
+            "description": fixture.get("description", ""),
+            "input": "",
+            "output": "",
+            "hint": "",
+            "sampleInput": [],
+            "sampleOutput": [],
+        },
+        "tags": fixture.get("tags", []),
+        "quota": fixture.get("quota", -1),
+        "testCaseInfo": {"language": 0, "fillInTemplate": "", "tasks": fixture.get("tasks", DEFAULT_TASKS)},
+        "canViewStdout": fixture.get("canViewStdout", True),
+        "allowedLanguage": fixture.get("allowedLanguage", 7),
+        "defaultCode": "",
+    }
+
+
+def payload_hash(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class FixtureManifest:
+    '''
+    the problem id , settings hash and test data hash of every provisioned
+    fixture per api base , kept in a json file rewritten atomically
+    '''
+
+    def __init__(self, fname: str, api_base: str):
+        self.fname = fname
+        self.api_base = api_base
+        self.data = {}
+        if os.path.exists(fname):
+            with open(fname, "r") as f:
+                self.data = dict(json.loads(f.read()))
+        self.entries = self.data.setdefault(api_base, {})
+
+    def get(self, name: str) -> dict:
+        return self.entries.get(name, {})
+
+    def put(self, name: str, entry: dict):
+        self.entries[name] = entry
+
+    def save(self):
+        tmp = self.fname + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(json.dumps(self.data, indent=4))
+        os.replace(tmp, self.fname)
+
+
+async def provision(sess: aiohttp.ClientSession, fixtures: list, manifest: FixtureManifest, parallel: int = 8,
+                    force: bool = False) -> dict:
+    '''
+    make the problems of `fixtures` exist with their settings and test data ,
+    at most `parallel` fixtures are worked on at once
+
+    a problem is found by its name , created when missing and edited when its
+    settings changed since the last run , the test data is uploaded only when
+    its sha256 differs from the one `manifest` recorded for that problem ,
+    `force` ignores `manifest`
+
+    Returns:
+        the outcome of every fixture keyed by its name
+    '''
+    loop = asyncio.get_event_loop()
+    existing = {}
+    for p in await async_list_problems(sess):
+        existing.setdefault(p["problemName"], p["problemId"])
+    # every distinct zip is hashed once , off the event loop
+    hashes = {}
+    for fx in fixtures:
+        if fx.get("testcase") and fx["testcase"] not in hashes:
+            hashes[fx["testcase"]] = loop.run_in_executor(None, file_sha256, fx["testcase"])
+    sem = asyncio.Semaphore(max(1, parallel))
+    report = {}
+
+    async def one(fx: dict):
+        name = fx["name"]
+        payload = problem_payload(fx)
+        known = {} if force else manifest.get(name)
+        rep = {"problem": "kept", "testcase": "none", "bytes": 0}
+        async with sem:
+            begin = time.monotonic()
+            try:
+                problem_id = existing.get(name)
+                if problem_id is None:
+                    problem_id = await async_create_problem(sess, payload)
+                    rep["problem"] = "created"
+                    known = {}
+                elif known.get("problemId") != problem_id or known.get("settings") != payload_hash(payload):
+                    await async_edit_problem(sess, problem_id, payload)
+                    rep["problem"] = "updated"
+                rep["problemId"] = problem_id
+                entry = {"problemId": problem_id, "settings": payload_hash(payload)}
+                if known.get("problemId") == problem_id:
+                    entry["testcase"] = known.get("testcase")
+                if fx.get("testcase"):
+                    digest = await hashes[fx["testcase"]]
+                    if entry.get("testcase") == digest:
+                        rep["testcase"] = "skipped"
+                    else:
+                        entry["testcase"] = None
+                        manifest.put(name, entry)
+                        rep["bytes"] = await async_upload_testcase(sess, problem_id, fx["testcase"])
+                        rep["testcase"] = "uploaded"
+                        entry["testcase"] = digest
+                manifest.put(name, entry)
+                manifest.save()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"provisioning {name} failed : {e}")
+                rep["error"] = str(e)
+            rep["time"] = time.monotonic() - begin
+        report[name] = rep
+
+    try:
+        await asyncio.gather(*[one(fx) for fx in fixtures])
+    finally:
+        manifest.save()
+    return report
+
+
+@problem.command("provision")
+@click.argument("spec", type=click.Path(exists=True, dir_okay=False), required=False)
+@click.option("-u", "--user", "user", type=str, default="first_admin", help="the user to login as , who should be able to manage problems")
+@click.option("-n", "--count", "count", type=int, default=1, help="without SPEC , the problems to provision(default is 1)")
+@click.option("--name", "name", type=str, default="load-{}", help="without SPEC , the problem name pattern(default is load-{})")
+@click.option("-t", "--testcase", "testcase", type=click.Path(exists=True, dir_okay=False), default=None, help="without SPEC , the test data zip of every problem")
+@click.option("--course", "course", type=str, default="Public", help="without SPEC , the course of the problems(default is Public)")
+@click.option("--parallel", "parallel", type=int, default=8, help="the problems worked on at once(default is 8)")
+@click.option("--manifest", "manifest", type=str, default=MANIFEST, help=f"the file recording what was provisioned(default is {MANIFEST})")
+@click.option("--force", "force", type=bool, default=False, help="upload every test data and check every setting again(default False)")
+@click.option("--fname", "fname", type=str, default="provision.json", help="the filename of the report(default is provision.json)")
+def provision_command(spec: str, user: str, count: int, name: str, testcase: str, course: str, parallel: int,
+                      manifest: str, force: bool, fname: str):
+    '''
+    create problems and upload their test data in bulk , unchanged fixtures are skipped
+    '''
+    if spec is not None:
+        fixtures = load_fixtures(spec)
+    else:
+        fixtures = [{"name": name.format(i), "course": course, "testcase": testcase} for i in range(count)]
+    if len(fixtures) == 0:
+        raise click.UsageError("nothing to provision")
+    names = [fx["name"] for fx in fixtures]
+    if len(set(names)) != len(names):
+        raise click.UsageError("the problem names should be distinct , put {} in the name of a counted fixture")
+
+    async def main():
+        async with SessionPool([(user, "")], 1) as pool:
+            return await provision(pool.session(0), fixtures, FixtureManifest(manifest, get_api_base()), parallel, force)
+
+    begin = time.monotonic()
+    report = asyncio.run(main())
+    elapsed = time.monotonic() - begin
+    counts = {}
+    for r in report.values():
+        key = "failed" if "error" in r else f"{r['problem']}/{r['testcase']}"
+        counts[key] = counts.get(key, 0) + 1
+    total = sum(r["bytes"] for r in report.values())
+    logging.info(f"{counts} , {total / 1024 / 1024:.2f} MB uploaded in {elapsed:.2f} sec")
+    with open(fname, "w") as f:
+        f.write(json.dumps({"problems": report, "counts": counts, "bytes": total, "elapsed": elapsed}, indent=4))
+    if "failed" in counts:
+        raise click.ClickException(f"{counts['failed']} problems failed , rerun to retry them")
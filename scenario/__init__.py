@@ -0,0 +1,7 @@
+import click
+@click.group()
+def scenario():
+    '''
+        mixed workloads of many virtual users on one event loop
+    '''
+    pass
@@ -0,0 +1,242 @@
+import asyncio
+import click
+import json
+import logging
+import random
+import time
+from . import scenario
+from cores.metrics import METRICS, PhaseMetrics
+from cores.sampling import make_sampler
+from cores.session_pool import SessionPool, make_connector, pool_users
+from submission.core_utils import async_submit, async_get_status, async_list_submissions, async_get_course, async_download_pdf
+
+# action name -> coroutine(vu, step) , an action returning False had nothing to do
+ACTIONS = {}
+# the pause after a skipped or failed action , a behaviour made only of them
+# would otherwise never yield to the other users
+IDLE_SEC = 0.1
+
+
+def action(name: str):
+    def register(fn):
+        ACTIONS[name] = fn
+        return fn
+    return register
+
+
+class VirtualUser:
+    '''
+    one simulated user walking through the steps of its behaviour again and
+    again , it remembers its own submissions for the later steps
+    '''
+
+    def __init__(self, index: int, behaviour: str, username: str, sess, rng: random.Random):
+        self.index = index
+        self.behaviour = behaviour
+        self.username = username
+        self.sess = sess
+        self.rng = rng
+        self.submissions = []
+
+
+@action("browse")
+async def browse(vu: VirtualUser, step: dict):
+    await async_get_course(vu.sess, step.get("course", "Public"))
+
+
+@action("submit")
+async def submit(vu: VirtualUser, step: dict):
+    sid = await async_submit(vu.sess, step.get("lang", 0), step.get("problemId", 1), step.get("source", ""))
+    vu.submissions.append(sid)
+
+
+@action("poll")
+async def poll(vu: VirtualUser, step: dict):
+    '''
+    wait for the verdict of the latest own submission
+    '''
+    if len(vu.submissions) == 0:
+        return False
+    begin = time.monotonic()
+    while True:
+        res = await async_get_status(vu.sess, vu.submissions[-1], delay=step.get("interval", 1.0))
+        if res["status"] != -1:
+            return True
+        if time.monotonic() - begin >= step.get("maxTime", 600):
+            raise TimeoutError(f"no verdict of {vu.submissions[-1]} in {step.get('maxTime', 600)} sec")
+
+
+@action("list")
+async def list_own(vu: VirtualUser, step: dict):
+    await async_list_submissions(vu.sess, 0, step.get("count", 10), step.get("problemId"), vu.username)
+
+
+@action("download_pdf")
+async def download_pdf(vu: VirtualUser, step: dict):
+    '''
+    download the handwritten pdf of one of `submissions` , default is the own ones
+    '''
+    sids = step.get("submissions") or vu.submissions
+    if len(sids) == 0:
+        return False
+    await async_download_pdf(vu.sess, vu.rng.choice(sids), 0 if step.get("item", "upload") == "upload" else 1)
+
+
+def load_scenario(fname: str) -> dict:
+    '''
+    read and check a scenario , e.g.
+
+        {
+            "virtualUsers": 2000, "duration": 300, "rampUp": 60, "grace": 30,
+            "pool": {"size": 200, "userPattern": "student{}", "loginParallel": 32, "connections": 256},
+            "behaviours": [
+                {"name": "browser", "weight": 6, "steps": [{"action": "browse"}, {"think": "exp:5"}]},
+                {"name": "contestant", "weight": 3, "steps": [
+                    {"action": "submit", "lang": 0, "problemId": 1, "source": ""},
+                    {"action": "poll", "interval": 1.0}, {"think": "uniform:10:30"}]},
+                {"name": "grader", "weight": 1, "steps": [
+                    {"action": "download_pdf", "submissions": ["..."]}, {"think": "const:2"}]}
+            ]
+        }
+
+    a behaviour is picked per virtual user by weight , `think` takes a
+    distribution of `cores.sampling.make_sampler` and the actions are the keys of `ACTIONS`
+    '''
+    with open(fname, "r") as f:
+        spec = dict(json.loads(f.read()))
+    assert len(spec.get("behaviours", [])) != 0, "a scenario needs behaviours"
+    for b in spec["behaviours"]:
+        assert b.get("weight", 1) > 0, f"the weight of {b.get('name')} should be positive"
+        assert len(b.get("steps", [])) != 0, f"{b.get('name')} has no steps"
+        for step in b["steps"]:
+            if "think" in step:
+                make_sampler(step["think"])
+            elif step.get("action") not in ACTIONS:
+                raise Exception(f"Undefined action {step.get('action')} , choose from {list(ACTIONS.keys())}")
+    spec.setdefault("virtualUsers", 100)
+    spec.setdefault("duration", 60)
+    return spec
+
+
+async def run_scenario(spec: dict, pool: SessionPool, seed: int = None) -> dict:
+    '''
+    run `spec["virtualUsers"]` users over the sessions of `pool` on this loop
+    until `duration` sec passed , users start evenly over `rampUp` sec and the
+    actions still running at the deadline get `grace` sec to finish
+
+    Returns:
+        the report of the run , the latency and throughput of every action and the http phases
+    '''
+    rng = random.Random(seed)
+    behaviours = spec["behaviours"]
+    weights = [b.get("weight", 1) for b in behaviours]
+    thinks = {}
+    for b in behaviours:
+        for k, step in enumerate(b["steps"]):
+            if "think" in step:
+                thinks[(b["name"], k)] = make_sampler(step["think"], rng)
+    n = spec["virtualUsers"]
+    duration = spec["duration"]
+    ramp_up = spec.get("rampUp", 0)
+    stats = PhaseMetrics()
+    errors = {}
+    skipped = {}
+    assigned = {b["name"]: 0 for b in behaviours}
+    METRICS.reset()
+    await pool.open()
+    start = time.monotonic()
+    deadline = start + duration
+
+    async def run_user(i: int):
+        b = rng.choices(behaviours, weights)[0]
+        assigned[b["name"]] += 1
+        vu = VirtualUser(i, b["name"], pool.username(i), pool.session(i), random.Random(rng.random()))
+        await asyncio.sleep(ramp_up * i / n)
+        while time.monotonic() < deadline:
+            for k, step in enumerate(b["steps"]):
+                now = time.monotonic()
+                if now >= deadline:
+                    return
+                if "think" in step:
+                    await asyncio.sleep(min(thinks[(b["name"], k)](), deadline - now))
+                    continue
+                name = step["action"]
+                try:
+                    done = await ACTIONS[name](vu, step)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    errors[name] = errors.get(name, 0) + 1
+                    logging.debug(f"{name} of user {i} failed : {e!r}")
+                    await asyncio.sleep(min(IDLE_SEC, max(0, deadline - time.monotonic())))
+                    continue
+                if done is False:
+                    skipped[name] = skipped.get(name, 0) + 1
+                    await asyncio.sleep(min(IDLE_SEC, max(0, deadline - time.monotonic())))
+                    continue
+                stats.record(name, time.monotonic() - now, b["name"])
+
+    users = [asyncio.ensure_future(run_user(i)) for i in range(n)]
+    try:
+        _, late = await asyncio.wait(users, timeout=duration + spec.get("grace", 30))
+        if len(late) != 0:
+            logging.info(f"cancel {len(late)} users still busy after the grace time")
+    finally:
+        for u in users:
+            u.cancel()
+        await asyncio.gather(*users, return_exceptions=True)
+        await pool.close()
+    elapsed = time.monotonic() - start
+    actions = {}
+    for name in sorted(set(stats.phases) | set(errors) | set(skipped)):
+        h = stats.phases.get(name)
+        count = h.count if h is not None else 0
+        actions[name] = {
+            "count": count,
+            "perSec": count / elapsed,
+            "errors": errors.get(name, 0),
+            "errorRate": errors.get(name, 0) / max(1, count + errors.get(name, 0)),
+            "skipped": skipped.get(name, 0),
+            "latency": h.summary() if h is not None else {"count": 0},
+        }
+    return {
+        "elapsed": elapsed,
+        "virtualUsers": n,
+        "behaviours": assigned,
+        "actions": actions,
+        "perBehaviour": stats.summary()["sources"],
+        "requests": METRICS.summary()["phases"],
+    }
+
+
+@scenario.command()
+@click.argument("scenario_file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--users", "users", type=int, default=None, help="overwrite virtualUsers of the scenario")
+@click.option("-t", "--duration", "duration", type=float, default=None, help="overwrite duration(sec) of the scenario")
+@click.option("--seed", "seed", type=int, default=None, help="the random seed of behaviours and think times")
+@click.option("--fname", "fname", type=str, default="scenario.json", help="the filename of the report(default is scenario.json)")
+@click.option("--logLevel", "log_level", type=click.Choice(["DEBUG", "INFO", "WARNING"]), default="INFO", help="the logging level while the load runs(default is INFO)")
+def run(scenario_file: str, users: int, duration: float, seed: int, fname: str, log_level: str):
+    '''
+    run the weighted user behaviours of a scenario file and report every action
+    '''
+    logging.getLogger().setLevel(log_level)
+    spec = load_scenario(scenario_file)
+    if users is not None:
+        spec["virtualUsers"] = users
+    if duration is not None:
+        spec["duration"] = duration
+    p = spec.get("pool", {})
+    users = pool_users(p.get("size", 1), p.get("userPattern", ""), p.get("passwdPattern", ""))
+
+    async def main():
+        # the connector belongs to the loop of the run
+        pool = SessionPool(users, p.get("loginParallel", 16), p.get("cookieDir", ""),
+                           connector=make_connector(limit=p.get("connections", 256)))
+        return await run_scenario(spec, pool, seed)
+
+    rep = asyncio.run(main())
+    for name, res in rep["actions"].items():
+        logging.info(f"{name}: {res['perSec']:.2f}/sec , {res['errors']} errors , latency {res['latency']}")
+    with open(fname, "w") as f:
+        f.write(json.dumps(rep, indent=4))
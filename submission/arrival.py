@@ -0,0 +1,107 @@
+import math
+import random
+
+ARRIVAL_MODES = ["burst", "constant", "ramp", "step", "poisson"]
+
+
+def burst_offsets(count: int) -> list:
+    '''
+    every submission is due at once (the legacy behaviour)
+    '''
+    return [0.0] * count
+
+
+def constant_offsets(count: int, rate: float) -> list:
+    '''
+    `rate` submissions per second , evenly spaced
+    '''
+    assert rate > 0, "rate must be positive"
+    return [i / rate for i in range(count)]
+
+
+def ramp_offsets(count: int, rate: float, rate_end: float) -> list:
+    '''
+    the arrival rate grows linearly from `rate` to `rate_end` over the run,
+    the k-th arrival is due when the integrated rate reaches k
+    '''
+    assert rate > 0 and rate_end > 0, "rate must be positive"
+    if count == 0:
+        return []
+    duration = 2 * count / (rate + rate_end)
+    a = (rate_end - rate) / (2 * duration)
+    if a == 0:
+        return constant_offsets(count, rate)
+    return [(-rate + math.sqrt(rate * rate + 4 * a * k)) / (2 * a) for k in range(count)]
+
+
+def step_offsets(count: int, rate: float, rate_end: float, steps: int) -> list:
+    '''
+    split the run into `steps` equally sized stages , each one sending at a
+    constant rate , with rates spaced evenly from `rate` to `rate_end`
+    '''
+    assert rate > 0 and rate_end > 0, "rate must be positive"
+    steps = max(1, min(steps, count)) if count > 0 else 1
+    offsets = []
+    begin = 0.0
+    for s in range(steps):
+        lo = count * s // steps
+        hi = count * (s + 1) // steps
+        r = rate if steps == 1 else rate + (rate_end - rate) * s / (steps - 1)
+        for i in range(hi - lo):
+            offsets.append(begin + i / r)
+        begin += (hi - lo) / r
+    return offsets
+
+
+def poisson_offsets(count: int, rate: float, rng: random.Random = None) -> list:
+    '''
+    exponentially distributed gaps with mean 1/`rate`
+    '''
+    assert rate > 0, "rate must be positive"
+    rng = rng or random.Random()
+    offsets = []
+    t = 0.0
+    for _ in range(count):
+        offsets.append(t)
+        t += rng.expovariate(rate)
+    return offsets
+
+
+def build_schedule(mode: str, count: int, rate: float = 0, rate_end: float = 0, steps: int = 1, seed: int = None) -> list:
+    '''
+    return the planned send offsets (sec from the start of the run) of `count` submissions
+
+    Args:
+        mode: one of `ARRIVAL_MODES`
+        rate: the (initial) arrival rate in submissions/sec
+        rate_end: the final rate of `ramp` and `step` , defaults to `rate`
+    '''
+    if rate_end <= 0:
+        rate_end = rate
+    if mode == "burst":
+        return burst_offsets(count)
+    if mode == "constant":
+        return constant_offsets(count, rate)
+    if mode == "ramp":
+        return ramp_offsets(count, rate, rate_end)
+    if mode == "step":
+        return step_offsets(count, rate, rate_end, steps)
+    if mode == "poisson":
+        return poisson_offsets(count, rate, random.Random(seed))
+    raise Exception(f"Undefined arrival mode {mode}")
+
+
+def summarize_lag(lags: list) -> dict:
+    '''
+    how far behind the schedule the submissions went out
+    '''
+    if len(lags) == 0:
+        return {"count": 0}
+    ordered = sorted(lags)
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": ordered[(len(ordered) - 1) // 2],
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        "max": ordered[-1],
+    }
@@ -0,0 +1,60 @@
+import json
+import os
+from .result_sink import ResultSink
+
+
+class Checkpoint(ResultSink):
+    '''
+    an append-only log of a pressure run that `--resume` picks up: the planned
+    work list , every created submission and every collected verdict ,
+    created submissions are flushed right away so no id is ever lost
+
+    Args:
+        resume: keep appending to an existing checkpoint instead of starting over
+    '''
+
+    def __init__(self, fname: str, resume: bool = False, flush_interval: float = 1.0):
+        super().__init__(fname, 100, flush_interval, resume)
+
+    def plan(self, codes: list, offsets: list, filters: dict):
+        self.write({"plan": {"codes": codes, "offsets": offsets, "filters": filters}})
+        self.flush()
+
+    def sent(self, index: int, submissionId: str, info: dict):
+        self.write(dict(info, sent=index, id=submissionId))
+        self.flush()
+
+    def done(self, submissionId: str, res: dict):
+        self.write({"done": submissionId, "res": res})
+
+
+def load_checkpoint(fname: str) -> dict:
+    '''
+    the state a checkpoint recorded , a broken last line is skipped
+
+    Returns:
+        `plan` (codes , offsets and filters) , `sent` (the sending record of
+        each created submission keyed by its index in the plan) , `done`
+        (the verdicts keyed by submission id) and whether the run had `ended`
+    '''
+    if not os.path.exists(fname):
+        raise FileNotFoundError(f"no checkpoint {fname} to resume")
+    state = {"plan": None, "sent": {}, "done": {}, "ended": False}
+    with open(fname, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "plan" in record:
+                state["plan"] = record["plan"]
+            elif "sent" in record:
+                index = record.pop("sent")
+                state["sent"][index] = record
+            elif "done" in record:
+                state["done"][record["done"]] = record["res"]
+            elif record.get("end"):
+                state["ended"] = True
+    if state["plan"] is None:
+        raise ValueError(f"checkpoint {fname} has no plan")
+    return state
@@ -0,0 +1,147 @@
+import asyncio
+import click
+import json
+import logging
+import random
+import time
+from . import submission
+from .core_utils import async_submit, async_get_status
+from .payload import PAYLOADS, default_source
+from cores.metrics import METRICS, LatencyHistogram
+from cores.sampling import make_sampler
+from cores.session_pool import SessionPool, pool_users
+
+
+async def contest_step(pool: SessionPool, users: int, duration: float, warmup: float, think, cap: int,
+                       lang: int, problem_id: int, code: str, interval: float, max_wait: float) -> dict:
+    '''
+    let `users` virtual users submit , wait for the verdict , think and submit
+    again for `duration` sec , at most `cap` submissions (0 is unlimited) wait
+    for a verdict at once , the throughput counts the verdicts judged between
+    `warmup` sec and the end , the latency only the ones also sent after `warmup`
+    '''
+    slots = asyncio.Semaphore(cap) if cap > 0 else None
+    latency = LatencyHistogram()
+    cap_wait = LatencyHistogram()
+    counts = {"verdicts": 0, "submissions": 0, "errors": 0}
+    start = time.monotonic()
+    deadline = start + duration
+    steady_from = start + warmup
+
+    async def judge_one(ses) -> float:
+        begin = time.monotonic()
+        sid = await async_submit(ses, lang, problem_id, code)
+        counts["submissions"] += 1
+        while True:
+            res = await async_get_status(ses, sid, delay=interval)
+            if res["status"] != -1:
+                return begin
+            if time.monotonic() - begin >= max_wait:
+                raise TimeoutError(f"no verdict of {sid} in {max_wait} sec")
+
+    async def vuser(i: int):
+        ses = pool.session(i)
+        # spread the first submissions like the later ones
+        await asyncio.sleep(think())
+        while time.monotonic() < deadline:
+            queued = time.monotonic()
+            try:
+                if slots is not None:
+                    async with slots:
+                        waited = time.monotonic() - queued
+                        begin = await judge_one(ses)
+                else:
+                    waited = 0
+                    begin = await judge_one(ses)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                counts["errors"] += 1
+                logging.debug(f"user {i} failed : {e!r}")
+                await asyncio.sleep(think())
+                continue
+            end = time.monotonic()
+            if steady_from <= end <= deadline:
+                counts["verdicts"] += 1
+                if begin >= steady_from:
+                    latency.record(end - begin)
+                    cap_wait.record(waited)
+            await asyncio.sleep(think())
+
+    tasks = [asyncio.ensure_future(vuser(i)) for i in range(users)]
+    await asyncio.wait(tasks, timeout=duration)
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    steady = max(1e-9, duration - warmup)
+    lat = latency.summary()
+    return {
+        "users": users,
+        "submissions": counts["submissions"],
+        "errors": counts["errors"],
+        "verdicts": counts["verdicts"],
+        "throughput": counts["verdicts"] / steady,
+        "latency": lat,
+        "capWait": cap_wait.summary(),
+        # kleinrock's power , the knee of the curve maximises it
+        "power": counts["verdicts"] / steady / lat["mean"] if lat["count"] != 0 and lat["mean"] > 0 else 0,
+    }
+
+
+@submission.command()
+@click.option("-u", "--user", "user", type=str, default="first_admin", help="the user to login as")
+@click.option("--users", "user_counts", type=str, default="10,20,50,100", help="comma separated virtual user counts , one step each(default is 10,20,50,100)")
+@click.option("-t", "--duration", "duration", type=float, default=60, help="the length of every step in sec(default is 60)")
+@click.option("--warmup", "warmup", type=float, default=10, help="the sec at the start of every step left out of the steady state(default is 10)")
+@click.option("--think", "think", type=str, default="exp:5", help="the think time between a verdict and the next submission: const:S , uniform:LO:HI , exp:MEAN or lognormal:MU:SIGMA(default is exp:5)")
+@click.option("--maxInFlight", "max_in_flight", type=int, default=0, help="the submissions allowed to wait for a verdict at once over all users , 0 is unlimited(default is 0)")
+@click.option("-l", "--lang", "lang", type=int, default=0, help="the language of submission(non-checked)")
+@click.option("-f", "--file", "code", type=click.Path(file_okay=True), default="", help="the submission source file")
+@click.option("-p", "--problemId", "problem_id", type=int, default=1, help="the problem to submit")
+@click.option("-d", "--delay", "delay", type=float, default=1.0, help="the interval of status polling(default is 1 sec)")
+@click.option("--maxWait", "max_wait", type=float, default=600, help="give up a submission without a verdict after so many sec(default is 600)")
+@click.option("--poolSize", "pool_size", type=int, default=0, help="spread the virtual users over so many logged in users(default is 0 , only --user)")
+@click.option("--userPattern", "user_pattern", type=str, default="", help="the username pattern of the pool , e.g. student{} , default is the users of cores/config.json")
+@click.option("--passwdPattern", "passwd_pattern", type=str, default="", help="the password pattern of the pool(default is --userPattern)")
+@click.option("--seed", "seed", type=int, default=None, help="the random seed of think times")
+@click.option("--fname", "fname", type=str, default="closed_loop.json", help="the filename of result(default is closed_loop.json)")
+def closed_loop(user: str, user_counts: str, duration: float, warmup: float, think: str, max_in_flight: int, lang: int, code: str,
+                problem_id: int, delay: float, max_wait: float, pool_size: int, user_pattern: str, passwd_pattern: str, seed: int, fname: str):
+    '''
+    simulate a contest: every virtual user submits , waits for the verdict and thinks ,
+    report the steady throughput and verdict latency of every user count
+    '''
+    counts = [int(c) for c in user_counts.split(",")]
+    assert warmup < duration, "--warmup should be shorter than --duration"
+    sampler = make_sampler(think, random.Random(seed))
+    users = [(user, "")]
+    if pool_size > 0:
+        users = pool_users(pool_size, user_pattern, passwd_pattern)
+    PAYLOADS.preload({code if code != "" else default_source(lang)})
+
+    async def main():
+        pool = SessionPool(users)
+        await pool.open()
+        steps = []
+        try:
+            for n in counts:
+                step = await contest_step(pool, n, duration, warmup, sampler, max_in_flight,
+                                          lang, problem_id, code, delay, max_wait)
+                logging.info(f"{n} users: {step['throughput']:.2f} verdicts/sec , latency {step['latency']}")
+                steps.append(step)
+        finally:
+            await pool.close()
+        return steps
+
+    METRICS.reset()
+    steps = asyncio.run(main())
+    knee = max(steps, key=lambda s: s["power"])
+    logging.info(f"knee at {knee['users']} users: {knee['throughput']:.2f} verdicts/sec")
+    with open(fname, "w") as f:
+        f.write(json.dumps({
+            "think": think,
+            "maxInFlight": max_in_flight,
+            "steps": steps,
+            "knee": {"users": knee["users"], "throughput": knee["throughput"], "latency": knee["latency"]},
+            "latency": METRICS.summary(),
+        }, indent=4))
@@ -0,0 +1,218 @@
+import click
+import json
+import logging
+import math
+from . import submission
+from .report import distribution, load_records
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the compared measurement and its key in a verdict record
+COMPARED = {"latency": "time", "runTime": "runTime", "memoryUsage": "memoryUsage"}
+STATS = ["p50", "p90", "p99", "mean"]
+METHODS = ["bootstrap", "mannwhitney", "both"]
+# the bootstrap resamples held in memory at once
+BOOTSTRAP_CELLS = 1 << 22
+
+
+def _stat(arr, stat: str, axis=None):
+    if stat == "mean":
+        return np.mean(arr, axis=axis)
+    return np.percentile(arr, float(stat[1:]), axis=axis)
+
+
+def _ranks(values) -> tuple:
+    '''
+    the 1-based ranks of `values` (ties get their average rank) and the size of every tie group
+    '''
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    top = np.cumsum(counts)
+    return (top - (counts - 1) / 2.0)[inverse], counts
+
+
+def mann_whitney(base, cand) -> dict:
+    '''
+    the one-sided Mann-Whitney U test of `cand` tending to be larger than `base` ,
+    normal approximation with tie and continuity correction
+
+    Returns:
+        `u` of `cand` , `superiority` the chance a candidate value beats a baseline
+        one (0.5 is no shift) and the `pValue`
+    '''
+    n1, n2 = base.size, cand.size
+    ranks, ties = _ranks(np.concatenate([base, cand]))
+    u = float(ranks[n1:].sum() - n2 * (n2 + 1) / 2.0)
+    n = n1 + n2
+    var = n1 * n2 / 12.0 * ((n + 1) - float((ties ** 3 - ties).sum()) / (n * (n - 1)))
+    if var <= 0:
+        p = 1.0
+    else:
+        z = (u - n1 * n2 / 2.0 - 0.5) / math.sqrt(var)
+        p = 0.5 * math.erfc(z / math.sqrt(2))
+    return {"u": u, "superiority": u / (n1 * n2), "pValue": p}
+
+
+def bootstrap_change(base, cand, stat: str, resamples: int, alpha: float, rng) -> dict:
+    '''
+    the relative change of `stat` from `base` to `cand` with its percentile
+    bootstrap confidence interval at level `1 - alpha`
+    '''
+    changes = []
+    rows = max(1, BOOTSTRAP_CELLS // max(base.size, cand.size))
+    for begin in range(0, resamples, rows):
+        k = min(rows, resamples - begin)
+        b = _stat(base[rng.integers(0, base.size, (k, base.size))], stat, axis=1)
+        c = _stat(cand[rng.integers(0, cand.size, (k, cand.size))], stat, axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            changes.append(np.where(b > 0, c / b - 1, np.nan))
+    changes = np.concatenate(changes)
+    old = float(_stat(base, stat))
+    res = {"baseline": old, "candidate": float(_stat(cand, stat)), "change": None, "low": None, "high": None}
+    if old > 0:
+        res["change"] = res["candidate"] / old - 1
+    if np.isfinite(changes).any():
+        res["low"] = float(np.nanpercentile(changes, 100 * alpha / 2))
+        res["high"] = float(np.nanpercentile(changes, 100 * (1 - alpha / 2)))
+    return res
+
+
+def compare_metric(base: list, cand: list, threshold: float, stat: str, method: str, alpha: float, resamples: int, rng) -> dict:
+    '''
+    compare one measurement of two runs , it regressed when `stat` got worse by
+    more than `threshold` (a ratio , negative never regresses) judged by `method`:
+
+        bootstrap     the whole confidence interval of the change is above `threshold`
+        mannwhitney   the candidate is significantly larger at `alpha` and the change is above `threshold`
+        both          both of them
+    '''
+    base = np.asarray(base, dtype=float)
+    cand = np.asarray(cand, dtype=float)
+    res = {"baseline": distribution(base), "candidate": distribution(cand)}
+    res["bootstrap"] = boot = bootstrap_change(base, cand, stat, resamples, alpha, rng)
+    res["mannWhitney"] = mw = mann_whitney(base, cand)
+    by_boot = boot["low"] is not None and boot["low"] > threshold
+    by_mw = mw["pValue"] < alpha and boot["change"] is not None and boot["change"] > threshold
+    regressed = {"bootstrap": by_boot, "mannwhitney": by_mw, "both": by_boot and by_mw}[method]
+    res["regressed"] = threshold >= 0 and regressed
+    return res
+
+
+def _pct(v) -> str:
+    return "n/a" if v is None else f"{v:+.1%}"
+
+
+def _done(records: dict) -> dict:
+    '''
+    the judged records grouped by source file
+    '''
+    sources = {}
+    for r in records.values():
+        if "status" in r:
+            sources.setdefault(r.get("src", ""), []).append(r)
+    return sources
+
+
+def _samples(rs: list, key: str) -> list:
+    return [r[key] for r in rs if r.get(key) is not None]
+
+
+def _status_count(rs: list) -> dict:
+    count = {}
+    for r in rs:
+        count[str(r["status"])] = count.get(str(r["status"]), 0) + 1
+    return count
+
+
+def compare_runs(baseline: dict, candidate: dict, thresholds: dict, stat: str = "p50", method: str = "bootstrap",
+                 alpha: float = 0.05, resamples: int = 2000, min_samples: int = 10, per_source: bool = False,
+                 seed: int = 0) -> dict:
+    '''
+    compare the verdict records of two runs , the submissions are matched by
+    source file , the measurements of all matched sources together are always
+    gated , every source with `min_samples` on both sides too when `per_source`
+    (at `alpha` divided by the gated sources)
+
+    Args:
+        thresholds: the allowed ratio of getting worse of every name in `COMPARED`
+
+    Returns:
+        the comparison of the pooled and of every matched source , the
+        unmatched sources and the list of regressions
+    '''
+    rng = np.random.default_rng(seed)
+    base_src, cand_src = _done(baseline), _done(candidate)
+    matched = sorted(set(base_src) & set(cand_src))
+    regressions = []
+
+    def compare_group(name: str, b: list, c: list, level: float, gate: bool) -> dict:
+        res = {"baseline": len(b), "candidate": len(c),
+               "statusCount": {"baseline": _status_count(b), "candidate": _status_count(c)}, "metrics": {}}
+        for metric, key in COMPARED.items():
+            bs, cs = _samples(b, key), _samples(c, key)
+            if min(len(bs), len(cs)) < min_samples:
+                continue
+            m = compare_metric(bs, cs, thresholds[metric] if gate else -1, stat, method, level, resamples, rng)
+            res["metrics"][metric] = m
+            if m["regressed"]:
+                boot = m["bootstrap"]
+                regressions.append(f"{name}.{metric}: {stat} {boot['baseline']:.4g} -> {boot['candidate']:.4g} "
+                                   f"({_pct(boot['change'])} , ci {_pct(boot['low'])} .. {_pct(boot['high'])} , "
+                                   f"p {m['mannWhitney']['pValue']:.3g})")
+        return res
+
+    pooled_b = [r for s in matched for r in base_src[s]]
+    pooled_c = [r for s in matched for r in cand_src[s]]
+    overall = compare_group("overall", pooled_b, pooled_c, alpha, True)
+    gated = [s for s in matched if min(len(base_src[s]), len(cand_src[s])) >= min_samples]
+    level = alpha / max(1, len(gated))
+    sources = {s: compare_group(s or "(default source)", base_src[s], cand_src[s], level if per_source else alpha,
+                                per_source and s in gated) for s in matched}
+    return {
+        "stat": stat,
+        "method": method,
+        "alpha": alpha,
+        "thresholds": thresholds,
+        "overall": overall,
+        "sources": sources,
+        "unmatched": {"baseline": sorted(set(base_src) - set(cand_src)), "candidate": sorted(set(cand_src) - set(base_src))},
+        "regressions": regressions,
+    }
+
+
+@submission.command()
+@click.argument("baseline", type=click.Path(exists=True, dir_okay=False))
+@click.argument("candidate", type=click.Path(exists=True, dir_okay=False))
+@click.option("--latency", "latency", type=float, default=0.1, help="the allowed ratio the verdict latency may get worse(default is 0.1 , a negative value only reports)")
+@click.option("--runTime", "run_time", type=float, default=0.1, help="the allowed ratio the judged runTime may get worse(default is 0.1 , a negative value only reports)")
+@click.option("--memory", "memory", type=float, default=0.1, help="the allowed ratio the judged memoryUsage may get worse(default is 0.1 , a negative value only reports)")
+@click.option("--stat", "stat", type=click.Choice(STATS), default="p50", help="the statistic compared(default is p50)")
+@click.option("--method", "method", type=click.Choice(METHODS), default="bootstrap", help="how a regression is decided(default is bootstrap)")
+@click.option("--alpha", "alpha", type=float, default=0.05, help="the significance level , the bootstrap interval is 1 - alpha(default is 0.05)")
+@click.option("--resamples", "resamples", type=int, default=2000, help="the bootstrap resamples(default is 2000)")
+@click.option("--minSamples", "min_samples", type=int, default=10, help="compare a measurement only with so many values on both sides(default is 10)")
+@click.option("--perSource", "per_source", type=bool, default=False, help="also gate every source file on its own(default False , only all matched sources together)")
+@click.option("--seed", "seed", type=int, default=0, help="the random seed of the bootstrap(default is 0)")
+@click.option("--fname", "fname", type=str, default="compare.json", help="the filename of the comparison(default is compare.json)")
+def compare(baseline: str, candidate: str, latency: float, run_time: float, memory: float, stat: str, method: str,
+            alpha: float, resamples: int, min_samples: int, per_source: bool, seed: int, fname: str):
+    '''
+    compare two pressure-tester results (or streams) submission by source file , fail when the candidate regressed
+    '''
+    if np is None:
+        raise click.ClickException("compare needs numpy")
+    thresholds = {"latency": latency, "runTime": run_time, "memoryUsage": memory}
+    res = compare_runs(load_records([baseline]), load_records([candidate]), thresholds, stat, method, alpha,
+                       resamples, min_samples, per_source, seed)
+    for metric, m in res["overall"]["metrics"].items():
+        boot = m["bootstrap"]
+        logging.info(f"{metric} {stat}: {boot['baseline']:.4g} -> {boot['candidate']:.4g} ({_pct(boot['change'])}) , "
+                     f"p {m['mannWhitney']['pValue']:.3g}")
+    if len(res["unmatched"]["baseline"]) + len(res["unmatched"]["candidate"]) != 0:
+        logging.warning(f"unmatched sources:{res['unmatched']}")
+    with open(fname, "w") as f:
+        f.write(json.dumps(res, indent=4))
+    if len(res["regressions"]) != 0:
+        raise click.ClickException("the candidate regressed:\n" + "\n".join(res["regressions"]))
+    logging.info("no regression")
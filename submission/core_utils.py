@@ -1,92 +1,131 @@
-from zipfile import is_zipfile
 import aiohttp
 import asyncio
 import json
+import os
 import requests
 import logging
 from time import sleep
 from cores.login import get_api_base
+from cores.metrics import METRICS
+from cores.resilience import RESILIENCE, ApiError, check_reply, request_json
+from cores.trace import SendStamp
+from .payload import PAYLOADS, default_source
 DELAY_SEC = 1.0
 
+
+def load_code(lang: int, code) -> tuple:
+    '''
+    the upload body and file name of `code` , which may be a path , a file
+    object or "" for the default source of `lang` , paths are read through `PAYLOADS`
+    '''
+    if code is None or code == "":
+        code = default_source(lang)
+    if hasattr(code, 'read'):
+        return code, os.path.basename(getattr(code, 'name', 'code.zip'))
+    return PAYLOADS.get(code), os.path.basename(code)
+
+
 async def async_submit(sess: aiohttp.ClientSession,
                        lang,
                        problem_id,
-                       code=None) -> str:
+                       code=None,
+                       stamp: SendStamp = None) -> str:
     '''
     submit asynchronously `problem_id` with language `lang`
     if `code` is "", use default source decided by `lang`
 
     Args:
         code: the code path
+        stamp: learns when the create request was really sent
     '''
     logging.debug(
         f"sending async submission with lang id: {lang} , problem id :{problem_id}")
     API_BASE = get_api_base()
     logging.debug('===submission===')
-    langs = ['c', 'cpp', 'py' , 'hw']
 
-    # create submission
-    async with sess.post(f'{API_BASE}/submission',
-                         json={
-                             'languageType': lang,
-                             'problemId': problem_id
-                         }) as resp:
-        rj = await resp.json()
-        rc = resp.status
-        logging.debug(f"create submission return code:{rc}")
-        logging.debug(rj)
-        rj = rj['data']
-        assert rc == 200
-
-        # open code file
-        if code is "":
-            # use default
-            code = open(f'{langs[lang]}-code.zip', 'rb')
-        else:
-            # check zip
-            if not is_zipfile(code):
-                logging.warning('you are submitting a non-zip file.')
-            # if it is the path string
-            if 'read' not in code:
-                code = open(code, 'rb')
-
-        form = aiohttp.FormData(quote_fields=False)
-        form.add_field("code", code, content_type="multipart/form-data")
-        # upload source
-        async with sess.put(f'{API_BASE}/submission/{rj["submissionId"]}',
-                            data=form) as resp2:
-            status_code = resp2.status
-            status_text = await resp2.text()
-            logging.debug(status_code)
-            logging.debug(status_text)
-            assert resp2.status == 200, resp2.status
-            logging.debug('===end===')
-            return rj["submissionId"]
-
-
-async def async_get_status(sess: aiohttp.ClientSession, submissionId: str) -> dict:
+    src = code if isinstance(code, str) and code != "" else None
+
+    # create submission , never retried , a lost reply may still have created it
+    rj = await request_json(sess, "POST", f'{API_BASE}/submission', "create", src,
+                            trace_request_ctx=stamp,
+                            json={
+                                'languageType': lang,
+                                'problemId': problem_id
+                            })
+    logging.debug(rj)
+    rj = rj['data']
+
+    data, filename = load_code(lang, code)
+    form = aiohttp.FormData(quote_fields=False)
+    form.add_field("code", data, filename=filename, content_type="multipart/form-data")
+    # upload source
+    status_text = await request_json(sess, "PUT", f'{API_BASE}/submission/{rj["submissionId"]}', "upload", src,
+                                     parse=False, data=form)
+    logging.debug(status_text)
+    logging.debug('===end===')
+    return rj["submissionId"]
+
+
+def status_view(context: dict) -> dict:
+    '''
+    keep the fields of a submission we care about ,
+    entries from the submission list come without `tasks`
+    '''
+    view = {
+        "id": context["submissionId"],
+        "score": context["score"],
+        "status": context["status"],
+        "time": context["timestamp"],
+        "memoryUsage": context["memoryUsage"],
+        "runTime": context["runTime"],
+    }
+    if "tasks" in context:
+        view["tasks"] = context["tasks"]
+    return view
+
+
+async def async_get_status(sess: aiohttp.ClientSession, submissionId: str, delay: float = None, src: str = None) -> dict:
+    '''
+    sleep `delay` sec (default is `DELAY_SEC`) and fetch the status of `submissionId` ,
+    the request is timed under the source file `src`
+    '''
     API_BASE = get_api_base()
-    if DELAY_SEC != 0:
-        await asyncio.sleep(DELAY_SEC)
-    async with sess.get(f"{API_BASE}/submission/{submissionId}") as resp:
+    if delay is None:
+        delay = DELAY_SEC
+    if delay != 0:
+        await asyncio.sleep(delay)
+    context = await request_json(sess, "GET", f"{API_BASE}/submission/{submissionId}", "status", src, safe=True)
+    # the f-strings of whole bodies are costly on the polling hot path
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
         logging.debug("===get_status===")
-        context = await resp.text()
-        logging.debug(f"raw text:{context}")
-        logging.debug(f"content-type:{resp.content_type}")
-        context = json.loads(context)
-        assert resp.status == 200
-        context = context["data"]
+        logging.debug(f"raw json:{context}")
+    context = context["data"]
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
         logging.debug(f"status:{context}")
         logging.debug("======end ======")
-        return {
-            "id": context["submissionId"],
-            "score": context["score"],
-            "status": context["status"],
-            "time": context["timestamp"],
-            "memoryUsage": context["memoryUsage"],
-            "runTime": context["runTime"],
-            "tasks": context["tasks"]
-        }
+    return status_view(context)
+
+
+async def async_list_submissions(sess: aiohttp.ClientSession, offset: int = 0, count: int = 100, problem_id: int = None, username: str = None) -> (list, int):
+    '''
+    fetch one page of the submission list (newest first) filtered by `problem_id` and `username`
+
+    Returns:
+        the `status_view` of each submission in the page and the total submission count
+    '''
+    API_BASE = get_api_base()
+    params = {"offset": offset, "count": count}
+    if problem_id is not None:
+        params["problemId"] = problem_id
+    if username is not None:
+        params["username"] = username
+    context = await request_json(sess, "GET", f"{API_BASE}/submission", "list", safe=True, params=params)
+    logging.debug("===list submissions===")
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f"raw json:{context}")
+    context = context["data"]
+    logging.debug("======end ======")
+    return [status_view(s) for s in context["submissions"]], context["submissionCount"]
 
 
 def seq_submit(sess: requests.Session, lang: int, problem_id: int , code: "") -> str:
@@ -99,7 +138,6 @@ def seq_submit(sess: requests.Session, lang: int, problem_id: int , code: "") ->
         code: the code path
     '''
     logging.info('===submission===')
-    langs = ['c', 'cpp', 'py']
 
     # create submission
     resp = sess.post(
@@ -111,79 +149,105 @@ def seq_submit(sess: requests.Session, lang: int, problem_id: int , code: "") ->
     )
 
     logging.debug(f'raw resp: {resp.text}')
-    rj = json.loads(resp.text)
+    rj = RESILIENCE.check("create", resp.status_code, resp.text)
     logging.info(rj)
     rj = rj['data']
-    assert resp.status_code == 200
-
-    # open code file
-    if code == "":
-        # use default
-        code = open(f'{langs[lang]}-code.zip', 'rb')
-    else:
-        # check zip
-        if not is_zipfile(code):
-            logging.warning('you are submitting a non-zip file.')
-        # if it is the path string
-        if 'read' not in code:
-            code = open(code, 'rb')
+
+    data, _ = load_code(lang, code)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
 
     # upload source
     resp = sess.put(
         f'{API_BASE}/submission/{rj["submissionId"]}',
-        files={'code': ('scnuoqd414fwq', code)},
+        files={'code': ('scnuoqd414fwq', data)},
     )
     logging.info(resp.status_code)
     logging.info(resp.text)
-    assert resp.status_code == 200
+    RESILIENCE.check("upload", resp.status_code, resp.text, parse=False)
     logging.info('===end===')
 
 def seq_get_status(sess: requests.Session, submissionId: str)->dict:
     API_BASE = get_api_base()
     with sess.get(f"{API_BASE}/submission/{submissionId}") as resp:
         logging.debug("===get_status===")
-        context = resp.content
-        logging.debug(f"raw text:{context}")
-        context = dict(json.loads(context))
-        assert resp.status_code == 200
+        logging.debug(f"raw text:{resp.text}")
+        context = RESILIENCE.check("status", resp.status_code, resp.text)
         context = context["data"]
         logging.debug(f"status:{context}")
         logging.debug("======end ======")
-        return {
-            "id": context["submissionId"],
-            "score": context["score"],
-            "status": context["status"],
-            "time": context["timestamp"],
-            "memoryUsage": context["memoryUsage"],
-            "runTime": context["runTime"],
-            "tasks": context["tasks"]
-        }
-
-async def async_rejudge(sess:aiohttp.ClientSession , submission_id:str):
+        return status_view(context)
+
+async def async_rejudge(sess:aiohttp.ClientSession , submission_id:str , delay: float = None):
+    '''
+    sleep `delay` sec (default is `DELAY_SEC`) and ask NOJ to rejudge `submission_id`
+    '''
     API_BASE = get_api_base()
-    if DELAY_SEC != 0:
-        await asyncio.sleep(DELAY_SEC)
+    if delay is None:
+        delay = DELAY_SEC
+    if delay != 0:
+        await asyncio.sleep(delay)
     
-    async with sess.get(f"{API_BASE}/submission/{submission_id}/rejudge") as resp:
-        logging.debug("===async rejudge===")
-        context = await resp.text()
-        logging.debug(f"raw text:{context}")
-        logging.debug(f"content-type:{resp.content_type}")
-        context = dict(json.loads(context))
-        assert resp.status == 200
-        logging.debug("======end ======")
+    # a rejudge restarts the judging , it is not retried
+    context = await request_json(sess, "GET", f"{API_BASE}/submission/{submission_id}/rejudge", "rejudge")
+    logging.debug("===async rejudge===")
+    logging.debug(f"raw json:{context}")
+    logging.debug("======end ======")
 
-def seq_rejudge(sess:requests.Session , submission_id:str):
+async def async_get_course(sess: aiohttp.ClientSession, course: str = "Public") -> dict:
+    '''
+    the detail of `course`
+    '''
     API_BASE = get_api_base()
-    if DELAY_SEC != 0:
-        sleep(DELAY_SEC)
+    context = await request_json(sess, "GET", f"{API_BASE}/course/{course}", "course", safe=True)
+    return context["data"]
+
+
+async def async_download_pdf(sess: aiohttp.ClientSession, submission_id: str, item_type: int = 0, fp=None, chunk_size: int = 64 * 1024) -> int:
+    '''
+    stream the handwritten pdf (0 is the upload , 1 is the comment) of `submission_id`
+    into the file object `fp` (or drop it) and return its size
+    '''
+    items = ["upload", "comment"]
+    API_BASE = get_api_base()
+
+    async def attempt() -> int:
+        size = 0
+        with METRICS.timed("pdf"):
+            async with sess.get(f"{API_BASE}/submission/{submission_id}/pdf/{items[item_type]}") as resp:
+                if resp.status != 200:
+                    check_reply("pdf", resp.status, await resp.text())
+                async for chunk in resp.content.iter_chunked(chunk_size):
+                    size += len(chunk)
+                    if fp is not None:
+                        fp.write(chunk)
+        return size
+    # a half written `fp` can not be started over
+    return await RESILIENCE.call("pdf", attempt, safe=fp is None)
+
+
+async def async_grade(sess: aiohttp.ClientSession, submission_id: str, score: int) -> str:
+    '''
+    set the handwritten score of `submission_id` and return the message of the reply ,
+    not retried here , `grading.bulk_grade` has its own retries
+    '''
+    API_BASE = get_api_base()
+    rj = await request_json(sess, "PUT", f"{API_BASE}/submission/{submission_id}/grade", "grade",
+                            json={"score": score})
+    return rj.get("message", "")
+
+
+def seq_rejudge(sess:requests.Session , submission_id:str , delay: float = None):
+    API_BASE = get_api_base()
+    if delay is None:
+        delay = DELAY_SEC
+    if delay != 0:
+        sleep(delay)
     
     with sess.get(f"{API_BASE}/submission/{submission_id}/rejudge") as resp:
         logging.debug("===seq rejudge===")
-        context = resp.content
-        logging.debug(f"raw text:{context}")
-        context = dict(resp.json())
-        assert resp.status == 200
+        logging.debug(f"raw text:{resp.text}")
+        RESILIENCE.check("rejudge", resp.status_code, resp.text)
         logging.debug("======end ======")
 
 def seq_handwritten_grade(sess:requests.Session , sid:str , score:int)->bool:
@@ -191,9 +255,10 @@ def seq_handwritten_grade(sess:requests.Session , sid:str , score:int)->bool:
     logging.debug(f"base: {base}")
     headers = {'Content-Type': 'application/json'}
     with sess.put(base , headers=headers , data=json.dumps({"score":score})) as resp:
-        if resp.status_code != 200:
-            logging.warn(f"handwritten update score got status code :{resp.status_code}")
-            logging.warn(f"raw resp:{resp.text}")
+        try:
+            RESILIENCE.check("grade" , resp.status_code , resp.text , parse=False)
+        except ApiError as e:
+            logging.warning(f"handwritten update score failed : {e}")
             return False
         logging.info(f"raw resp:{resp.text}")
         return True
@@ -202,14 +267,15 @@ def seq_handwritten_download(sess:requests.Session , sid:str , fname:str = "some
     items = ["upload" , "comment"]
     base = get_api_base() + f"/submission/{sid}/pdf/{items[item_type]}"
     logging.debug(f"base: {base}")
-    with sess.get(base) as resp:
-        if resp.status_code != 200:
-            logging.warn(f"handwritten download {items[item_type]} got status code :{resp.status_code}")
-            logging.warn(f"raw resp:{resp.text}")
-            return False
-        if resp.content==None:
-            logging.warn(f"raw resp:{resp.text}")
+    with sess.get(base , stream=True) as resp:
+        try:
+            # the body of a good reply is streamed below , not read here
+            RESILIENCE.check("pdf" , resp.status_code , resp.text if resp.status_code != 200 else "" , parse=False)
+        except ApiError as e:
+            logging.warning(f"handwritten download {items[item_type]} failed : {e}")
             return False
+        # write chunk by chunk instead of holding the whole pdf
         with open(fname , "wb") as fp:
-            fp.write(resp.content)
+            for chunk in resp.iter_content(64 * 1024):
+                fp.write(chunk)
     return True
@@ -0,0 +1,148 @@
+import click
+import json
+import logging
+import socket
+import socketserver
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from . import submission
+from .pipeline import run_shard
+from cores.metrics import PhaseMetrics
+from cores.resilience import ErrorCounters
+
+# leave every shard some time to login before the shared schedule begins
+START_MARGIN_SEC = 3.0
+
+
+def split_job(job: dict, n: int) -> list:
+    '''
+    deal the work list of `job` round robin into `n` shards ,
+    every shard keeps the planned offsets of its submissions
+    '''
+    n = max(1, min(n, len(job["codes"]))) if len(job["codes"]) > 0 else 1
+    shards = []
+    for k in range(n):
+        shard = dict(job)
+        shard["codes"] = job["codes"][k::n]
+        shard["offsets"] = job["offsets"][k::n]
+        if job.get("stream", "") != "" and n > 1:
+            shard["stream"] = f"{job['stream']}.{k}"
+        if job.get("checkpoint", "") != "" and n > 1:
+            shard["checkpoint"] = f"{job['checkpoint']}.{k}"
+        if job.get("trace", "") != "" and n > 1:
+            shard["trace"] = f"{job['trace']}.{k}"
+        shards.append(shard)
+    return shards
+
+
+def merge_parts(parts: list) -> (dict, dict, dict):
+    '''
+    merge the `(result, sent, stats)` of every shard
+    '''
+    result = {}
+    sent = {}
+    polling = {"requests": 0, "listRequests": 0, "verdicts": 0, "meanPolls": 0, "maxPolls": 0, "shards": len(parts)}
+    latency = PhaseMetrics()
+    errors = ErrorCounters()
+    breaker = {"opens": 0, "openTime": 0.0}
+    failed = []
+    elapsed = 0.0
+    timeout = False
+    for part_result, part_sent, part_stats in parts:
+        part_polling = part_stats["polling"]
+        latency.merge(PhaseMetrics.load(part_stats["latency"]))
+        errors.merge(ErrorCounters.load(part_stats.get("errors", {})))
+        part_breaker = part_stats.get("breaker", {"opens": 0, "openTime": 0.0})
+        breaker["opens"] += part_breaker["opens"]
+        breaker["openTime"] = max(breaker["openTime"], part_breaker["openTime"])
+        failed.extend(part_stats.get("failed", []))
+        elapsed = max(elapsed, part_stats.get("elapsed", 0.0))
+        for k, v in part_result.items():
+            if k == "wait_status":
+                timeout = True
+                continue
+            result[k] = v
+        sent.update(part_sent)
+        polling["requests"] += part_polling["requests"]
+        polling["listRequests"] += part_polling["listRequests"]
+        polling["meanPolls"] += part_polling["meanPolls"] * part_polling["verdicts"]
+        polling["verdicts"] += part_polling["verdicts"]
+        polling["maxPolls"] = max(polling["maxPolls"], part_polling["maxPolls"])
+    if polling["verdicts"] != 0:
+        polling["meanPolls"] /= polling["verdicts"]
+    if timeout:
+        result.update({"wait_status": "timeout expire max waiting time"})
+    return result, sent, {"polling": polling, "latency": latency.dump(), "errors": errors.dump(),
+                          "breaker": breaker, "failed": failed, "elapsed": elapsed}
+
+
+def run_local(job: dict, procs: int) -> (dict, dict, dict):
+    '''
+    run `job` on `procs` processes of this machine
+    '''
+    if procs <= 1:
+        return run_shard(job)
+    job = dict(job)
+    job.setdefault("beginAt", time.time() + START_MARGIN_SEC)
+    shards = split_job(job, procs)
+    logging.info(f"running {len(shards)} shards locally")
+    with ProcessPoolExecutor(len(shards)) as executor:
+        parts = list(executor.map(run_shard, shards))
+    return merge_parts(parts)
+
+
+def _send_shard(node: str, shard: dict) -> (dict, dict, dict):
+    host, port = node.rsplit(":", 1)
+    with socket.create_connection((host, int(port))) as conn:
+        conn.sendall(json.dumps(shard).encode() + b"\n")
+        with conn.makefile("rb") as f:
+            line = f.readline()
+    assert line != b"", f"worker {node} closed the connection"
+    reply = json.loads(line)
+    assert "error" not in reply, f"worker {node} failed : {reply.get('error')}"
+    return reply["result"], reply["sent"], reply["stats"]
+
+
+def run_remote(job: dict, nodes: list) -> (dict, dict, dict):
+    '''
+    hand one shard of `job` to every `host:port` worker in `nodes`
+    '''
+    job = dict(job)
+    job.setdefault("beginAt", time.time() + START_MARGIN_SEC)
+    shards = split_job(job, len(nodes))
+    logging.info(f"running {len(shards)} shards on {nodes[:len(shards)]}")
+    with ThreadPoolExecutor(len(shards)) as executor:
+        parts = list(executor.map(_send_shard, nodes[:len(shards)], shards))
+    return merge_parts(parts)
+
+
+class _ShardHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if line == b"":
+            return
+        job = json.loads(line)
+        logging.info(f"got a shard of {len(job['codes'])} submissions from {self.client_address}")
+        try:
+            result, sent, stats = run_local(job, self.server.procs)
+            reply = {"result": result, "sent": sent, "stats": stats}
+        except Exception as e:
+            logging.exception("shard failed")
+            reply = {"error": repr(e)}
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+
+@submission.command()
+@click.option("--host", "host", type=str, default="127.0.0.1", help="the address to listen on(default is 127.0.0.1)")
+@click.option("--port", "port", type=int, default=8787, help="the port to listen on(default is 8787)")
+@click.option("--procs", "procs", type=int, default=1, help="split every shard over so many local processes(default is 1)")
+def pressure_worker(host: str, port: int, procs: int):
+    '''
+    serve shards of a distributed pressure test ,
+    the source files must be at the same paths as on the coordinator
+    '''
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    with socketserver.ThreadingTCPServer((host, port), _ShardHandler) as server:
+        server.procs = procs
+        logging.info(f"pressure worker listening on {host}:{port}")
+        server.serve_forever()
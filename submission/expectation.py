@@ -0,0 +1,196 @@
+from collections import namedtuple
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SUBMISSION_DOMAIN = ("MaxMemoryUsage", "MaxRunTime", "score", "status")
+CASE_DOMAIN = ("stdout", "stderr", "exitCode", "MaxExecTime", "MaxMemoryUsage", "status")
+# below it a plain loop beats building arrays
+VECTOR_MIN_ROWS = 64
+
+# one compiled comparison , `field` is the key looked up in a result and
+# `lo`/`hi` are the bounds of a Max/Min pair (None for exact checks)
+Check = namedtuple("Check", ["key", "field", "expect", "lo", "hi"])
+CasePlan = namedtuple("CasePlan", ["task", "case", "prefix", "checks"])
+
+
+def print_fails(fails: list) -> list:
+    p_f = []
+    for it in fails:
+        if it["type"] == "miss":
+            p_f.append(
+                f"failure on {it['key']} : can not found data with key {it['key']}")
+        elif it["type"] == "abs":
+            p_f.append(
+                f"failure on {it['key']} : expected {it['expect']} but got {it['real']}")
+        elif it["type"] == "seq":
+            p_f.append(
+                f"failure on {it['key']} : expected between {it['expect'][0]} and {it['expect'][1]} but got {it['real']}")
+        else:
+            raise Exception(f"Undefind Property {it['type']}")
+    return p_f
+
+
+def compile_checks(domain: tuple, filters: dict) -> tuple:
+    '''
+    turn the keys of `filters` found in `domain` into `Check`s ,
+    a `MaxXxx` key becomes a range check on `xxx` together with `MinXxx`
+    '''
+    checks = []
+    for k in domain:
+        if k not in filters:
+            continue
+        if k.startswith("Max"):
+            key = k[3:]
+            if "Min" + key not in filters:
+                raise Exception(f"{k} is given without Min{key}")
+            checks.append(Check(k, key[0].lower() + key[1:], filters[k], filters["Min" + key], filters[k]))
+        else:
+            checks.append(Check(k, k, filters[k], None, None))
+    return tuple(checks)
+
+
+def _check_one(chk: Check, target: dict, prefix: str = ""):
+    '''
+    the failure of `chk` on one result , None if it passes
+    '''
+    if chk.key in target:
+        if target[chk.key] != chk.expect:
+            return {"key": prefix + chk.key, "real": target[chk.key], "type": "abs", "expect": chk.expect}
+        return None
+    if chk.lo is None:
+        return {"type": "miss", "key": prefix + chk.key}
+    if chk.field not in target:
+        return {"type": "miss", "key": prefix + chk.field}
+    v = target[chk.field]
+    if chk.lo <= v and v <= chk.hi:
+        return None
+    return {"key": prefix + chk.field, "real": v, "type": "seq", "expect": (chk.lo, chk.hi)}
+
+
+def _numeric_column(targets: list, field: str):
+    '''
+    `field` of every target as a numeric array , None if any is missing or not a number
+    '''
+    if np is None or len(targets) < VECTOR_MIN_ROWS:
+        return None
+    # a missing value , a string or a bool leaves numpy with a non numeric dtype
+    col = np.array([t.get(field) for t in targets])
+    if col.dtype.kind not in "iuf":
+        return None
+    return col
+
+
+def _check_column(chk: Check, targets: list, prefix: str = "") -> list:
+    '''
+    the `(row, failure)` pairs of `chk` over many results ,
+    numeric columns are compared at once
+    '''
+    col = None
+    if chk.lo is None:
+        if isinstance(chk.expect, (int, float)):
+            col = _numeric_column(targets, chk.field)
+    elif not any(chk.key in t for t in targets):
+        col = _numeric_column(targets, chk.field)
+    if col is None:
+        rows = range(len(targets))
+        if chk.lo is None:
+            # strings and the like , only the failing rows build a report
+            rows = [i for i, t in enumerate(targets) if chk.key not in t or t[chk.key] != chk.expect]
+        fails = []
+        for i in rows:
+            fail = _check_one(chk, targets[i], prefix)
+            if fail is not None:
+                fails.append((i, fail))
+        return fails
+    if chk.lo is None:
+        bad = np.nonzero(col != chk.expect)[0]
+        return [(i, {"key": prefix + chk.key, "real": targets[i][chk.key], "type": "abs", "expect": chk.expect})
+                for i in bad.tolist()]
+    bad = np.nonzero((col < chk.lo) | (col > chk.hi))[0]
+    return [(i, {"key": prefix + chk.field, "real": targets[i][chk.field], "type": "seq", "expect": (chk.lo, chk.hi)})
+            for i in bad.tolist()]
+
+
+class ExpectationPlan:
+    '''
+    the compiled filter of one source file in a `--cfg` , check results with
+    `check` one by one or with `run` all at once , both report the same way as `print_fails`
+    '''
+
+    def __init__(self, filters: dict):
+        self.checks = compile_checks(SUBMISSION_DOMAIN, filters)
+        cases = []
+        for k, sub in filters.get("tasks", {}).items():
+            els = str(k).split(":")
+            task = int(els[0])
+            case = int(els[1])
+            cases.append(CasePlan(task, case, f"task {task} case {case} ", compile_checks(CASE_DOMAIN, sub)))
+        self.cases = tuple(cases)
+
+    @staticmethod
+    def _case_of(plan: CasePlan, target: dict):
+        '''
+        the case `plan` checks in `target` , None if it does not exist
+        '''
+        try:
+            return target["tasks"][plan.task]["cases"][plan.case]
+        except (IndexError, KeyError):
+            return None
+
+    def _check_cases(self, target: dict) -> list:
+        failure_list = []
+        for plan in self.cases:
+            subtask = self._case_of(plan, target)
+            if subtask is None:
+                failure_list.append(
+                    f"failure on task {plan.task} case {plan.case}: data does not exist")
+                continue
+            if subtask != {}:
+                sub_fails = []
+                for chk in plan.checks:
+                    fail = _check_one(chk, subtask, plan.prefix)
+                    if fail is not None:
+                        sub_fails.append(fail)
+                failure_list.extend(print_fails(sub_fails))
+        return failure_list
+
+    def check(self, target: dict) -> list:
+        failure_list = []
+        for chk in self.checks:
+            fail = _check_one(chk, target)
+            if fail is not None:
+                failure_list.extend(print_fails([fail]))
+        failure_list.extend(self._check_cases(target))
+        return failure_list
+
+    def run(self, targets: list) -> list:
+        '''
+        the failure list of every result in `targets` , a case is checked as a
+        column over the results that have it
+        '''
+        fails = [[] for _ in targets]
+        for chk in self.checks:
+            for i, fail in _check_column(chk, targets):
+                fails[i].extend(print_fails([fail]))
+        for plan in self.cases:
+            rows, subtasks = [], []
+            for i, target in enumerate(targets):
+                subtask = self._case_of(plan, target)
+                if subtask is None:
+                    fails[i].append(f"failure on task {plan.task} case {plan.case}: data does not exist")
+                elif subtask != {}:
+                    rows.append(i)
+                    subtasks.append(subtask)
+            for chk in plan.checks:
+                for j, fail in _check_column(chk, subtasks, plan.prefix):
+                    fails[rows[j]].extend(print_fails([fail]))
+        return fails
+
+
+def compile_filters(filters: dict) -> dict:
+    '''
+    compile every entry of a `--cfg` once
+    '''
+    return {src: ExpectationPlan(fil) for src, fil in filters.items()}
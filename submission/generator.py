@@ -0,0 +1,80 @@
+import click
+import json
+import logging
+import os
+import random
+from . import submission
+from . import core_utils
+from .arrival import ARRIVAL_MODES, build_schedule
+from .distributed import run_local, run_remote
+from .poller import PollPolicy
+from .pressure_tester import finish_run, make_job
+from .synthetic import DEFAULT_MIX, PROFILES, generate, register
+from cores.session_pool import pool_users
+
+
+@submission.command()
+@click.option("-u", "--user", "user", type=str, default="first_admin", help="the user to login as")
+@click.option("--langs", "langs", type=str, default="0,1,2", help="comma separated language ids to generate for(default is 0,1,2 , c , cpp and python)")
+@click.option("-n", "--perLang", "per_lang", type=int, default=20, help="the distinct archives of every language(default is 20)")
+@click.option("--mix", "mix", type=str, default=DEFAULT_MIX, help=f"the weights of the profiles {PROFILES}(default is {DEFAULT_MIX})")
+@click.option("--seed", "seed", type=int, default=0, help="the random seed of the sources , the same seed builds the same archives(default is 0)")
+@click.option("-p", "--pid", "problem_id", type=int, default=1, help="the problem to submit to , it should answer like the bundled sources")
+@click.option("--okStatus", "ok_status", type=int, default=0, help="the status expected for the cpu , mem and io profiles(default is 0 , AC)")
+@click.option("--expireTime", "expire_time", type=float, default=0, help="add this expireTime to every filter(default is 0 , none)")
+@click.option("--saveDir", "save_dir", type=str, default="", help="also write the archives here so --cfgOut works with pressure-tester --cfg(default is none , memory only)")
+@click.option("--cfgOut", "cfg_out", type=str, default="synthetic.json", help="write the expected results as --cfg filters to this file(default is synthetic.json)")
+@click.option("--dryRun", "dry_run", type=bool, default=False, help="only write --cfgOut (and --saveDir) without submitting")
+@click.option("--arrival", "arrival", type=click.Choice(ARRIVAL_MODES), default="burst", help="the arrival schedule of submissions(default is burst)")
+@click.option("--rate", "rate", type=float, default=1.0, help="the (initial) arrival rate in submissions/sec for non-burst schedules")
+@click.option("-d", "--delay", "delay", type=float, default=1.0, help="set the delay of checking up function(which will affect the accurrency of testing)")
+@click.option("--maxTime", "max_time", type=float, default=3600, help="the maxium waiting time for waiting all the result(default is 3600 sec)")
+@click.option("-w", "--workers", "workers", type=int, default=64, help="the status polling workers(default is 64)")
+@click.option("--poolSize", "pool_size", type=int, default=0, help="spread the submissions over so many logged in users(default is 0 , only --user)")
+@click.option("--userPattern", "user_pattern", type=str, default="", help="the username pattern of the pool , e.g. student{} , default is the users of cores/config.json")
+@click.option("--passwdPattern", "passwd_pattern", type=str, default="", help="the password pattern of the pool(default is --userPattern)")
+@click.option("--loginParallel", "login_parallel", type=int, default=16, help="the max concurrent logins of the pool(default is 16)")
+@click.option("--procs", "procs", type=int, default=1, help="split the submissions over so many local processes(default is 1)")
+@click.option("--nodes", "nodes", type=str, default="", help="comma separated host:port of pressure-worker agents to split the submissions over")
+@click.option("--fname", "fname", type=str, default="result.json", help="the filename of result(default is result.json)")
+@click.option("--logLevel", "log_level", type=click.Choice(["DEBUG", "INFO", "WARNING"]), default="INFO", help="the logging level while the load runs(default is INFO)")
+def synthetic(user: str, langs: str, per_lang: int, mix: str, seed: int, problem_id: int, ok_status: int, expire_time: float,
+              save_dir: str, cfg_out: str, dry_run: bool, arrival: str, rate: float, delay: float, max_time: float, workers: int,
+              pool_size: int, user_pattern: str, passwd_pattern: str, login_parallel: int, procs: int, nodes: str,
+              fname: str, log_level: str):
+    '''
+    submit distinct generated sources with cpu , memory and io profiles and deliberate TLE , MLE and RE cases
+    '''
+    logging.getLogger().setLevel(log_level)
+    core_utils.DELAY_SEC = delay
+    spec = {"langs": [int(l) for l in langs.split(",")], "per_lang": per_lang, "mix": mix, "seed": seed,
+            "problem_id": problem_id, "ok_status": ok_status, "expire_time": expire_time, "prefix": save_dir or "gen"}
+    codes, filters, archives = generate(**spec)
+    logging.info(f"generated {len(archives)} archives , {sum(len(a) for a in archives.values()) / 1024:.1f} KB")
+    if save_dir != "":
+        os.makedirs(save_dir, exist_ok=True)
+        for src, data in archives.items():
+            with open(src, "wb") as f:
+                f.write(data)
+    with open(cfg_out, "w") as f:
+        f.write(json.dumps(filters, indent=4))
+    if dry_run:
+        return
+    register(archives)
+    random.Random(seed).shuffle(codes)
+    offsets = build_schedule(arrival, len(codes), rate, 0, 5, seed)
+    users = [(user, "")]
+    if pool_size > 0:
+        users = pool_users(pool_size, user_pattern, passwd_pattern)
+    job = make_job(users, login_parallel, "", codes, offsets, filters, max_time, workers, PollPolicy(delay), None, log_level)
+    # every shard builds the same archives again instead of shipping them
+    job["generate"] = spec
+    if nodes != "":
+        result, sent, stats = run_remote(job, nodes.split(","))
+    else:
+        result, sent, stats = run_local(job, procs)
+    result = finish_run(result, sent, stats, filters, {"arrival": arrival, "rate": rate, "synthetic": spec}, True, pool_size > 0)
+    with open(fname, "w") as f:
+        f.write(json.dumps(result, indent=4))
+    if not result["passTest"]:
+        raise click.ClickException(f"some verdicts are not the expected ones , see {fname}")
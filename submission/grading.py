@@ -0,0 +1,77 @@
+import aiohttp
+import asyncio
+import csv
+import json
+import logging
+import random
+import time
+from .core_utils import async_grade
+from cores.resilience import ApiError
+
+
+def load_sheet(fname: str) -> list:
+    '''
+    the `(sid, score)` rows of a score sheet , either a csv of `sid,score`
+    (a header row is skipped) or a json list of `{"sid": .., "score": ..}` or
+    a json object of sid to score
+    '''
+    rows = []
+    if fname.endswith(".json"):
+        with open(fname, "r") as f:
+            data = json.loads(f.read())
+        if isinstance(data, dict):
+            data = [{"sid": k, "score": v} for k, v in data.items()]
+        for it in data:
+            rows.append((str(it["sid"]), int(it["score"])))
+        return rows
+    with open(fname, "r", newline="") as f:
+        for no, line in enumerate(csv.reader(f), 1):
+            if len(line) == 0 or line[0].strip() == "":
+                continue
+            try:
+                rows.append((line[0].strip(), int(line[1])))
+            except (ValueError, IndexError):
+                if no == 1:
+                    continue
+                raise ValueError(f"{fname}:{no} is not a sid,score row")
+    return rows
+
+
+async def bulk_grade(sess: aiohttp.ClientSession, rows: list, parallel: int = 16, retries: int = 3, backoff: float = 0.5) -> list:
+    '''
+    push every `(sid, score)` of `rows` with at most `parallel` requests at once ,
+    transient failures (network errors , timeouts , 429 and 5xx) are retried up
+    to `retries` times with exponential backoff , other failures are final
+
+    Returns:
+        one report per row in the order of `rows`
+    '''
+    sem = asyncio.Semaphore(max(1, parallel))
+
+    async def grade(sid: str, score: int) -> dict:
+        rep = {"sid": sid, "score": score, "ok": False, "attempts": 0}
+        async with sem:
+            begin = time.monotonic()
+            for attempt in range(retries + 1):
+                rep["attempts"] = attempt + 1
+                try:
+                    message = await async_grade(sess, sid, score)
+                    rep.update({"status": 200, "message": message, "ok": True})
+                    rep.pop("error", None)
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except ApiError as e:
+                    rep.update({"status": e.status, "message": e.message, "error": str(e)})
+                    if not e.transient:
+                        break
+                except Exception as e:
+                    rep["error"] = repr(e)
+                if attempt < retries:
+                    await asyncio.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+            rep["time"] = time.monotonic() - begin
+        if not rep["ok"]:
+            logging.warning(f"grading {sid} failed : {rep.get('error') or rep.get('message')}")
+        return rep
+
+    return list(await asyncio.gather(*[grade(sid, score) for sid, score in rows]))
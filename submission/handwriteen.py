@@ -1,9 +1,15 @@
 from . import submission
 from .core_utils import seq_handwritten_grade , seq_handwritten_download , seq_submit
+from .pdf_download import bulk_download
+from .grading import bulk_grade , load_sheet
 from cores import login
+from cores.session_pool import SessionPool
+import asyncio
+import json
 import logging
 import click
 import os
+import time
 @submission.command()
 @click.option("-u" , "--user" , "user" , type=str , default="first_admin" , help="the user to login as")
 @click.argument("sid" , type=str)
@@ -12,7 +18,7 @@ def handwritten_score(user:str , sid:str , score:int):
     '''
     try to modify someone's score
     '''
-    sess = login.get_session("student1")
+    sess = login.get_session(user)
     if seq_handwritten_grade(sess , sid , score):
         logging.info("success update the handwritten grade")
 
@@ -39,3 +45,75 @@ def handwritten_download(comment:bool , sid:str , user:str , filename:str):
             logging.info(f"successfully download as {filename}")
         else:
             logging.warning(f"failed to download file : {filename}")
+
+
+@submission.command()
+@click.argument("sids" , type=str , nargs=-1)
+@click.option("-u" , "--user" , "user" , type=str, default="first_admin" , help="the user to login as")
+@click.option("--sidFile" , "sid_file" , type=click.File("r") , default=None , help="a file of submission ids , one per line")
+@click.option("-o" , "--outDir" , "out_dir" , type=str , default="pdfs" , help="the directory to download into(default is pdfs)")
+@click.option("-c" , "--comment" , "comment" , type=bool , default=False , help="also download the comments(default False)")
+@click.option("--uploads" , "uploads" , type=bool , default=True , help="download the uploaded pdfs(default True)")
+@click.option("--parallel" , "parallel" , type=int , default=8 , help="the downloads at once(default is 8)")
+@click.option("--retries" , "retries" , type=int , default=2 , help="retry a failed download so many times(default is 2)")
+@click.option("--chunkSize" , "chunk_size" , type=int , default=64 , help="the KB written at a time(default is 64)")
+@click.option("--fname" , "fname" , type=str , default="download.json" , help="the filename of the report(default is download.json)")
+def handwritten_bulk_download(sids:tuple , user:str , sid_file , out_dir:str , comment:bool , uploads:bool , parallel:int , retries:int , chunk_size:int , fname:str):
+    '''
+    download the handwritten pdfs of many submissions at once , unchanged files are skipped and broken ones resumed
+    '''
+    sids = list(sids)
+    if sid_file is not None:
+        sids.extend(line.strip() for line in sid_file if line.strip() != "")
+    sids = list(dict.fromkeys(sids))
+    items = ([0] if uploads else []) + ([1] if comment else [])
+    if len(sids) == 0 or len(items) == 0:
+        raise click.UsageError("nothing to download")
+
+    async def main():
+        async with SessionPool([(user , "")] , 1) as pool:
+            return await bulk_download(pool.session(0) , sids , out_dir , items , parallel , retries , chunk_size * 1024)
+
+    begin = time.monotonic()
+    files = asyncio.run(main())
+    elapsed = time.monotonic() - begin
+    total = sum(r["bytes"] for r in files.values())
+    counts = {}
+    for r in files.values():
+        counts[r["status"]] = counts.get(r["status"] , 0) + 1
+    logging.info(f"{counts} , {total / 1024 / 1024:.2f} MB in {elapsed:.2f} sec")
+    with open(fname , "w") as f:
+        f.write(json.dumps({"files": files , "counts": counts , "bytes": total , "elapsed": elapsed ,
+                            "MBPerSec": total / 1024 / 1024 / elapsed if elapsed > 0 else 0} , indent=4))
+    if "failed" in counts:
+        raise click.ClickException(f"{counts['failed']} downloads failed , rerun to resume them")
+
+
+@submission.command()
+@click.argument("sheet" , type=click.Path(exists=True , dir_okay=False))
+@click.option("-u" , "--user" , "user" , type=str, default="first_admin" , help="the user to login as")
+@click.option("--parallel" , "parallel" , type=int , default=16 , help="the grading requests at once(default is 16)")
+@click.option("--retries" , "retries" , type=int , default=3 , help="retry a network error , 429 or 5xx so many times(default is 3)")
+@click.option("--backoff" , "backoff" , type=float , default=0.5 , help="the first retry waits about so many sec , doubled every time(default is 0.5)")
+@click.option("--fname" , "fname" , type=str , default="grade.json" , help="the filename of the report(default is grade.json)")
+def handwritten_bulk_score(sheet:str , user:str , parallel:int , retries:int , backoff:float , fname:str):
+    '''
+    grade the handwritten submissions of a score sheet (csv of sid,score or json) at once
+    '''
+    rows = load_sheet(sheet)
+    if len(rows) == 0:
+        raise click.UsageError(f"{sheet} has no rows")
+
+    async def main():
+        async with SessionPool([(user , "")] , 1) as pool:
+            return await bulk_grade(pool.session(0) , rows , parallel , retries , backoff)
+
+    begin = time.monotonic()
+    report = asyncio.run(main())
+    elapsed = time.monotonic() - begin
+    ok = sum(1 for r in report if r["ok"])
+    logging.info(f"{ok}/{len(report)} graded in {elapsed:.2f} sec")
+    with open(fname , "w") as f:
+        f.write(json.dumps({"rows": report , "graded": ok , "failed": len(report) - ok , "elapsed": elapsed} , indent=4))
+    if ok != len(report):
+        raise click.ClickException(f"{len(report) - ok} rows failed , see {fname}")
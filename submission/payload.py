@@ -0,0 +1,71 @@
+import logging
+import mmap
+import os
+from zipfile import is_zipfile
+
+LANGS = ['c', 'cpp', 'py', 'hw']
+
+
+def default_source(lang: int) -> str:
+    '''
+    the bundled source of language `lang`
+    '''
+    return f'{LANGS[lang]}-code.zip'
+
+
+class PayloadCache:
+    '''
+    read and check every distinct source archive once , then hand out the
+    same immutable buffer to every upload of it
+
+    Args:
+        mmap_threshold: map archives at least this many bytes instead of
+            reading them , 0 disables mapping
+    '''
+
+    def __init__(self, mmap_threshold: int = 64 * 1024 * 1024):
+        self.mmap_threshold = mmap_threshold
+        self._payloads = {}
+        self._maps = []
+
+    def get(self, code: str):
+        '''
+        the content of `code` as `bytes` , or a read-only `memoryview` of a mapped archive
+        '''
+        payload = self._payloads.get(code)
+        if payload is None:
+            payload = self._load(code)
+            self._payloads[code] = payload
+        return payload
+
+    def put(self, code: str, payload: bytes):
+        '''
+        hand out `payload` , an archive built in memory , as the content of `code`
+        '''
+        self._payloads[code] = payload
+
+    def preload(self, codes):
+        for code in codes:
+            self.get(code)
+
+    def _load(self, code: str):
+        if not is_zipfile(code):
+            logging.warning(f'you are submitting a non-zip file : {code}')
+        size = os.path.getsize(code)
+        with open(code, 'rb') as f:
+            if self.mmap_threshold > 0 and size >= self.mmap_threshold:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                view = memoryview(m)
+                self._maps.append((view, m))
+                return view
+            return f.read()
+
+    def clear(self):
+        self._payloads = {}
+        for view, m in self._maps:
+            view.release()
+            m.close()
+        self._maps = []
+
+
+PAYLOADS = PayloadCache()
@@ -0,0 +1,157 @@
+import aiohttp
+import asyncio
+import json
+import logging
+import os
+import time
+from cores.login import get_api_base
+from cores.metrics import METRICS
+from cores.resilience import RESILIENCE, check_reply
+
+PDF_ITEMS = ["upload", "comment"]
+MANIFEST = ".manifest.json"
+
+
+def pdf_name(out_dir: str, sid: str, item_type: int) -> str:
+    '''
+    `<sid>.pdf` for the upload and `<sid>_comment.pdf` for the comment , like `handwritten-download`
+    '''
+    return os.path.join(out_dir, f"{sid}_comment.pdf" if item_type == 1 else f"{sid}.pdf")
+
+
+class Manifest:
+    '''
+    the validators (ETag , Last-Modified) and size of every downloaded pdf of a
+    directory , kept in `MANIFEST` next to them and rewritten atomically
+    '''
+
+    def __init__(self, out_dir: str):
+        self.fname = os.path.join(out_dir, MANIFEST)
+        self.entries = {}
+        if os.path.exists(self.fname):
+            with open(self.fname, "r") as f:
+                self.entries = dict(json.loads(f.read()))
+
+    def get(self, name: str) -> dict:
+        return self.entries.get(os.path.basename(name), {})
+
+    def put(self, name: str, entry: dict):
+        self.entries[os.path.basename(name)] = entry
+
+    def save(self):
+        tmp = self.fname + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(json.dumps(self.entries, indent=4))
+        os.replace(tmp, self.fname)
+
+
+def _validators(resp: aiohttp.ClientResponse) -> dict:
+    return {"etag": resp.headers.get("ETag"), "lastModified": resp.headers.get("Last-Modified")}
+
+
+async def download_pdf(sess: aiohttp.ClientSession, sid: str, item_type: int, dest: str, manifest: Manifest,
+                       chunk_size: int = 64 * 1024) -> dict:
+    '''
+    stream one handwritten pdf to `dest` chunk by chunk
+
+    a complete file known to `manifest` is revalidated with a conditional
+    request and skipped when unchanged , a `dest.part` left by an interrupted
+    download is continued with a range request while the file is still the
+    same (an ETag or Last-Modified has to tell) , otherwise it starts over , `manifest` is saved whenever a transfer
+    starts or ends so a killed run can resume
+
+    Returns:
+        `status` (downloaded , resumed , skipped) , `bytes` received and `size` of the file
+    '''
+    part = dest + ".part"
+    known = manifest.get(dest)
+    url = f"{get_api_base()}/submission/{sid}/pdf/{PDF_ITEMS[item_type]}"
+
+    async def attempt() -> dict:
+        headers = {}
+        if os.path.exists(dest) and known.get("size") == os.path.getsize(dest):
+            if known.get("etag"):
+                headers["If-None-Match"] = known["etag"]
+            if known.get("lastModified"):
+                headers["If-Modified-Since"] = known["lastModified"]
+        offset = 0
+        if os.path.exists(part):
+            partial = known.get("partial") or {}
+            validator = partial.get("etag") or partial.get("lastModified")
+            if validator:
+                offset = os.path.getsize(part)
+                headers["Range"] = f"bytes={offset}-"
+                headers["If-Range"] = validator
+            else:
+                # nothing tells whether the file changed since , a tail of a newer one would corrupt it
+                os.remove(part)
+        received = 0
+        with METRICS.timed("pdf"):
+            async with sess.get(url, headers=headers) as resp:
+                if resp.status == 304:
+                    return {"status": "skipped", "bytes": 0, "size": known["size"]}
+                if resp.status == 416 and offset != 0:
+                    # the part is already whole
+                    os.replace(part, dest)
+                    manifest.put(dest, dict(known["partial"], size=offset))
+                    return {"status": "resumed", "bytes": 0, "size": offset}
+                if resp.status not in (200, 206):
+                    check_reply("pdf", resp.status, await resp.text())
+                validators = _validators(resp)
+                if resp.status == 200 and "If-None-Match" not in headers and "If-Modified-Since" not in headers \
+                        and os.path.exists(dest) and resp.content_length == os.path.getsize(dest) \
+                        and validators["etag"] is None and validators["lastModified"] is None:
+                    # nothing to revalidate with , the same size has to do
+                    return {"status": "skipped", "bytes": 0, "size": resp.content_length}
+                resumed = resp.status == 206
+                manifest.put(dest, dict(known, partial=validators))
+                manifest.save()
+                with open(part, "ab" if resumed else "wb") as fp:
+                    async for chunk in resp.content.iter_chunked(chunk_size):
+                        fp.write(chunk)
+                        received += len(chunk)
+        size = (offset if resumed else 0) + received
+        os.replace(part, dest)
+        manifest.put(dest, dict(validators, size=size))
+        manifest.save()
+        return {"status": "resumed" if resumed else "downloaded", "bytes": received, "size": size}
+    # counted and gated like every endpoint , `bulk_download` does the retries
+    return await RESILIENCE.call("pdf", attempt)
+
+
+async def bulk_download(sess: aiohttp.ClientSession, sids: list, out_dir: str, items: list, parallel: int = 8,
+                        retries: int = 2, chunk_size: int = 64 * 1024) -> dict:
+    '''
+    download the `items` (0 upload , 1 comment) of every submission in `sids`
+    with at most `parallel` transfers at once , a failed transfer is retried
+    `retries` times and continues from what it already got
+
+    Returns:
+        the outcome of every file keyed by its name
+    '''
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = Manifest(out_dir)
+    sem = asyncio.Semaphore(max(1, parallel))
+    report = {}
+
+    async def fetch(sid: str, item_type: int):
+        dest = pdf_name(out_dir, sid, item_type)
+        async with sem:
+            begin = time.monotonic()
+            for attempt in range(retries + 1):
+                try:
+                    res = await download_pdf(sess, sid, item_type, dest, manifest, chunk_size)
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.warning(f"download {os.path.basename(dest)} failed ({attempt + 1}/{retries + 1}) : {e!r}")
+                    res = {"status": "failed", "error": repr(e), "bytes": 0}
+            res["time"] = time.monotonic() - begin
+            report[os.path.basename(dest)] = res
+
+    try:
+        await asyncio.gather(*[fetch(sid, it) for sid in sids for it in items])
+    finally:
+        manifest.save()
+    return report
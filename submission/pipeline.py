@@ -0,0 +1,208 @@
+import asyncio
+import aiohttp
+import logging
+import time
+from .core_utils import async_submit
+from .payload import PAYLOADS, default_source
+from .result_sink import ResultSink, prune_cases, referenced_cases
+from .checkpoint import Checkpoint, load_checkpoint
+from .synthetic import generate, register
+from .poller import BulkPolicy, PollPolicy, StatusPoller
+from . import core_utils
+from cores.metrics import METRICS
+from cores.resilience import RESILIENCE, ApiError
+from cores.trace import TRACER, SendStamp
+from cores.session_pool import SessionPool
+
+
+async def scheduled_submit(sess: aiohttp.ClientSession, start: float, offset: float, lang, problem_id, code) -> dict:
+    '''
+    wait until `offset` sec after `start` (monotonic clock) and then submit,
+    the lag between the planned time and the time the create request really
+    went out (after waiting for a free connection) is recorded
+    '''
+    delay = start + offset - time.monotonic()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    stamp = SendStamp()
+    woke = time.monotonic()
+    submissionId = await async_submit(sess, lang, problem_id, code, stamp)
+    # a session built without `TRACER.trace_configs` never stamps
+    sent = stamp.sent if stamp.sent is not None else woke
+    return {"id": submissionId, "scheduledAt": offset, "lag": sent - start - offset}
+
+
+async def pressure_pipeline(pool: SessionPool, codes: list, offsets: list, filters: dict, max_time: float, workers: int, policy: PollPolicy = None, bulk: BulkPolicy = None, begin_at: float = None,
+                            sink: ResultSink = None, drop_cases: bool = False, checkpoint: Checkpoint = None, resumed: dict = None) -> (dict, dict, dict):
+    '''
+    submit `codes` on the planned `offsets` while a pool of status workers
+    polls every created submission right away , the submissions are spread
+    over the users of `pool` round robin
+
+    Args:
+        begin_at: the wall clock time the schedule starts , lets several
+            processes share one schedule , default is right after login
+        sink: append every verdict to it as soon as it arrives
+        drop_cases: drop the case payloads no filter of the source checks
+        checkpoint: log the plan , the created submissions and the verdicts to it
+        resumed: the state of an interrupted run (see `load_checkpoint`) ,
+            its verdicts are kept , its pending submissions are polled again
+            and only the unsent part of its plan is submitted
+
+    Returns:
+        the verdicts keyed by submission id , the sending record of each submission
+        and the stats of the run: the polling summary , the dumped latency histograms ,
+        the dumped error counters , the circuit breaker summary , the failed submissions
+        and the elapsed sec
+    '''
+    METRICS.reset()
+    RESILIENCE.reset()
+    # read every archive before the clock starts
+    PAYLOADS.preload({src if src != "" else default_source(lang) for lang, _, src in codes})
+    try:
+        await pool.open()
+        sent = {}
+        done = {}
+        failed = []
+        todo = list(range(len(offsets)))
+        keep = {src: referenced_cases(f) for src, f in filters.items()}
+        if resumed is not None:
+            for i, info in resumed["sent"].items():
+                submissionId = info.pop("id")
+                sent[submissionId] = info
+            done = {k: v for k, v in resumed["done"].items() if k in sent}
+            todo = [i for i in todo if i not in resumed["sent"]]
+            logging.info(f"resume: {len(done)} verdicts kept , {len(sent) - len(done)} to poll , {len(todo)} to submit")
+        elif checkpoint is not None:
+            checkpoint.plan(codes, offsets, filters)
+
+        def on_result(submissionId: str, res: dict):
+            info = sent.get(submissionId, {})
+            if drop_cases:
+                prune_cases(res, keep.get(info.get("src"), set()))
+            if sink is not None:
+                sink.write(dict(res, id=submissionId, **info))
+            if checkpoint is not None and "status" in res:
+                checkpoint.done(submissionId, res)
+
+        poller = StatusPoller(pool.session(0), workers, policy, bulk, on_result)
+        poller.start()
+        start = time.monotonic()
+        if begin_at is not None:
+            start += begin_at - time.time()
+        # the unsent part of a resumed plan starts right away
+        shift = min((offsets[i] for i in todo), default=0) if resumed is not None else 0
+        users = {pool.username(i): i for i in range(len(pool))}
+        for submissionId, info in sent.items():
+            if submissionId in done:
+                continue
+            lang, problem_id, src = codes[info["index"]]
+            expire_time = None
+            if src in filters and "expireTime" in filters[src]:
+                expire_time = filters[src]["expireTime"]
+            ses = pool.session(users.get(info["user"], 0))
+            # keep measuring the verdict latency from the original upload
+            uploaded = time.monotonic() - (time.time() - info["uploadedWall"])
+            poller.track(submissionId, expire_time, uploaded, problem_id=problem_id, sess=ses, username=info["user"], src=src or None)
+
+        async def submit_one(i: int):
+            lang, problem_id, src = codes[i]
+            username, ses = pool.username(i), pool.session(i)
+            try:
+                rec = await scheduled_submit(ses, start, offsets[i] - shift, lang, problem_id, src)
+            except ApiError as e:
+                # one lost submission must not stop the others or the polling
+                logging.warning(f"submission {i} of {src or 'the default source'} failed : {e}")
+                failed.append({"index": i, "src": src, "user": username, "kind": e.kind, "status": e.status, "error": str(e)})
+                return
+            sent[rec["id"]] = {"src": src, "user": username, "scheduledAt": rec["scheduledAt"], "lag": rec["lag"],
+                               "uploadedAt": time.monotonic() - start}
+            if checkpoint is not None:
+                checkpoint.sent(i, rec["id"], dict(sent[rec["id"]], index=i, uploadedWall=time.time()))
+            expire_time = None
+            if src in filters and "expireTime" in filters[src]:
+                expire_time = filters[src]["expireTime"]
+            poller.track(rec["id"], expire_time, problem_id=problem_id, sess=ses, username=username, src=src or None)
+
+        submitters = [asyncio.ensure_future(submit_one(i)) for i in todo]
+
+        async def drain():
+            await asyncio.gather(*submitters)
+            await poller.wait()
+
+        timeout = False
+        try:
+            await asyncio.wait_for(drain(), max_time)
+        except asyncio.TimeoutError:
+            logging.info("time's up")
+            poller.expire_all()
+            timeout = True
+        finally:
+            for t in submitters:
+                t.cancel()
+            await asyncio.gather(*submitters, return_exceptions=True)
+            await poller.stop()
+    finally:
+        # also when a login or the setup failed
+        await pool.close()
+
+    result = {}
+    for submissionId in sent.keys():
+        result[submissionId] = done[submissionId] if submissionId in done else poller.results[submissionId]
+    if timeout:
+        result.update({"wait_status": "timeout expire max waiting time"})
+    return result, sent, {"polling": poller.summary(), "latency": METRICS.dump(), "errors": RESILIENCE.counters.dump(),
+                          "breaker": RESILIENCE.breaker.summary(), "failed": failed, "elapsed": time.monotonic() - start}
+
+
+def run_shard(job: dict) -> (dict, dict, dict):
+    '''
+    run `pressure_pipeline` on a plain dict job , see `pressure_tester.make_job` ,
+    this is the unit handed to worker processes and remote workers
+    '''
+    logging.getLogger().setLevel(job.get("logLevel", "INFO"))
+    core_utils.DELAY_SEC = job["policy"]["delay"]
+    RESILIENCE.configure(job.get("retry"), job.get("breaker"))
+    PAYLOADS.mmap_threshold = job.get("mmapThreshold", PAYLOADS.mmap_threshold)
+    if job.get("generate") is not None:
+        register(generate(**job["generate"])[2])
+    bulk = None
+    if job["bulk"] is not None:
+        bulk = BulkPolicy(**job["bulk"])
+    pool = SessionPool([tuple(u) for u in job["users"]], job["loginParallel"], job["cookieDir"])
+    if job.get("trace", "") != "":
+        TRACER.enable(job.get("traceSize", 100000))
+    codes, offsets, filters = job["codes"], job["offsets"], job["filters"]
+    checkpoint = None
+    resumed = None
+    if job.get("checkpoint", "") != "":
+        if job.get("resume", False):
+            resumed = load_checkpoint(job["checkpoint"])
+            codes, offsets, filters = resumed["plan"]["codes"], resumed["plan"]["offsets"], resumed["plan"]["filters"]
+        checkpoint = Checkpoint(job["checkpoint"], resumed is not None)
+    sink = None
+    if job.get("stream", "") != "":
+        # a resumed run keeps the verdicts it streamed before
+        sink = ResultSink(job["stream"], job.get("flushEvery", 100), resume=resumed is not None)
+    try:
+        result, sent, stats = asyncio.run(pressure_pipeline(pool, [tuple(c) for c in codes], offsets, filters,
+                                                              job["maxTime"], job["workers"], PollPolicy(**job["policy"]), bulk, job.get("beginAt"),
+                                                              sink, job.get("dropCases", False), checkpoint, resumed))
+    except BaseException:
+        if sink is not None:
+            sink.close()
+        if checkpoint is not None:
+            checkpoint.close()
+        raise
+    finally:
+        if TRACER.enabled:
+            TRACER.dump(job["trace"])
+            TRACER.disable()
+    end = {"polling": stats["polling"]}
+    if "wait_status" in result:
+        end["wait_status"] = result["wait_status"]
+    if sink is not None:
+        sink.close(end)
+    if checkpoint is not None:
+        checkpoint.close(end)
+    return result, sent, stats
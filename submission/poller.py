@@ -0,0 +1,300 @@
+import asyncio
+import aiohttp
+import logging
+import random
+import time
+from .core_utils import async_get_status, async_list_submissions
+from cores.metrics import METRICS
+from cores.rate_limit import TokenBucket
+
+
+class PollPolicy:
+    '''
+    when to poll a pending submission again
+
+    Args:
+        delay: the wait before the first poll and the initial interval in sec
+        backoff: the interval is multiplied by it after every pending poll
+        max_delay: the upper bound of the interval
+        jitter: spread each interval uniformly by +-`jitter` of itself
+        budget: the max status requests/sec of the whole poller , 0 is unlimited
+    '''
+
+    def __init__(self, delay: float = 1.0, backoff: float = 1.5, max_delay: float = 10.0, jitter: float = 0.1, budget: float = 0):
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max(delay, max_delay)
+        self.jitter = jitter
+        self.budget = budget
+
+    def next_delay(self, polls: int) -> float:
+        '''
+        the wait before the next poll of a submission already polled `polls` times
+        '''
+        interval = min(self.max_delay, self.delay * self.backoff ** polls)
+        if self.jitter > 0:
+            interval *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(0.0, interval)
+
+
+class BulkPolicy:
+    '''
+    resolve pending submissions through the paginated submission list
+
+    Args:
+        username: only list the submissions of this user
+        interval: sec between two sweeps of the list
+        page_size: submissions per list request
+        straggler_after: fall back to polling a submission by its id once it
+            was pending for so many sec
+        need_tasks: list entries have no `tasks` , fetch each finished one by id once
+    '''
+
+    def __init__(self, username: str = None, interval: float = 2.0, page_size: int = 100, straggler_after: float = 30.0, need_tasks: bool = False):
+        self.username = username
+        self.interval = interval
+        self.page_size = max(1, page_size)
+        self.straggler_after = straggler_after
+        self.need_tasks = need_tasks
+
+
+class StatusPoller:
+    '''
+    a bounded pool of status workers sharing one queue of pending submissions,
+    submissions can be tracked at any time while the workers are running and
+    the verdict latency is measured from the moment each one was tracked
+
+    `on_result(submissionId, res)` is called as soon as a submission is done ,
+    every submission keeps its own poll schedule given by `policy` ,
+    with `bulk` most of them are resolved by sweeping the submission list and
+    only the stragglers are polled one by one
+    '''
+
+    def __init__(self, sess: aiohttp.ClientSession, workers: int = 64, policy: PollPolicy = None, bulk: BulkPolicy = None, on_result=None):
+        self.sess = sess
+        self.on_result = on_result
+        self.worker_count = max(1, workers)
+        self.policy = policy or PollPolicy()
+        self.bulk = bulk
+        self.bucket = TokenBucket(self.policy.budget)
+        self.queue = asyncio.Queue()
+        self.pending = {}
+        self.results = {}
+        self.requests = 0
+        self.list_requests = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._workers = []
+        self._timers = {}
+
+    def start(self):
+        for _ in range(self.worker_count):
+            self._workers.append(asyncio.ensure_future(self._worker()))
+        if self.bulk is not None:
+            self._workers.append(asyncio.ensure_future(self._sweeper()))
+
+    async def stop(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers = {}
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def track(self, submissionId: str, expire_time: float = None, uploaded: float = None, problem_id: int = None,
+              sess: aiohttp.ClientSession = None, username: str = None, src: str = None):
+        '''
+        start polling `submissionId`
+
+        Args:
+            expire_time: give up on this submission after so many sec
+            uploaded: the monotonic time the source was uploaded , default is now
+            problem_id: narrows the list queries of bulk mode
+            sess: poll with this session instead of the poller's one (e.g. the owner of the submission)
+            username: the owner listed in bulk mode , default is the one of `BulkPolicy`
+            src: the source file the status requests are timed under
+        '''
+        self.pending[submissionId] = {
+            "uploaded": time.monotonic() if uploaded is None else uploaded,
+            "expireTime": expire_time,
+            "problemId": problem_id,
+            "sess": sess or self.sess,
+            "username": username,
+            "src": src,
+            "polls": 0,
+        }
+        self._idle.clear()
+        delay = self.policy.delay
+        if self.bulk is not None:
+            delay = self.bulk.straggler_after
+            if expire_time is not None:
+                delay = min(delay, expire_time)
+        self._schedule(submissionId, delay)
+
+    def _schedule(self, submissionId: str, delay: float):
+        def fire():
+            self._timers.pop(submissionId, None)
+            self.queue.put_nowait(submissionId)
+        if delay <= 0:
+            self.queue.put_nowait(submissionId)
+            return
+        self._timers[submissionId] = asyncio.get_event_loop().call_later(delay, fire)
+
+    def _finish(self, submissionId: str, res: dict):
+        rec = self.pending.pop(submissionId)
+        timer = self._timers.pop(submissionId, None)
+        if timer is not None:
+            timer.cancel()
+        res["polls"] = rec["polls"]
+        if "status" in res:
+            METRICS.record("verdict", res["time"], rec["src"])
+        self.results[submissionId] = res
+        if self.on_result is not None:
+            self.on_result(submissionId, res)
+        if len(self.pending) == 0:
+            self._idle.set()
+
+    async def wait(self):
+        '''
+        block until every tracked submission got a verdict or expired
+        '''
+        while len(self.pending) != 0:
+            await self._idle.wait()
+
+    def expire_all(self):
+        '''
+        mark everything still pending as unfinished
+        '''
+        for submissionId in list(self.pending.keys()):
+            self._finish(submissionId, {})
+
+    async def _worker(self):
+        while True:
+            submissionId = await self.queue.get()
+            try:
+                await self._poll(submissionId)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"polling {submissionId} failed : {e!r} , retry later")
+                if submissionId in self.pending:
+                    rec = self.pending[submissionId]
+                    self._schedule(submissionId, self.policy.next_delay(rec["polls"]))
+            finally:
+                self.queue.task_done()
+
+    async def _poll(self, submissionId: str):
+        if submissionId not in self.pending:
+            return
+        rec = self.pending[submissionId]
+        await self.bucket.acquire()
+        rec["polls"] += 1
+        self.requests += 1
+        res = await async_get_status(rec["sess"], submissionId, delay=0, src=rec["src"])
+        elapsed = time.monotonic() - rec["uploaded"]
+        if submissionId not in self.pending:
+            return
+        if res["status"] != -1:
+            res.pop("id")
+            res["time"] = elapsed
+            self._finish(submissionId, res)
+        elif rec["expireTime"] is not None and elapsed >= rec["expireTime"]:
+            self._finish(submissionId, {
+                "wait_status": f"timeout expire {rec['expireTime']} sec...QQ"})
+        else:
+            delay = self.policy.next_delay(rec["polls"])
+            if rec["expireTime"] is not None:
+                delay = min(delay, rec["expireTime"] - elapsed)
+            self._schedule(submissionId, delay)
+
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(self.bulk.interval)
+            groups = {}
+            for submissionId, rec in self.pending.items():
+                if rec.get("listed"):
+                    continue
+                username = rec["username"] or self.bulk.username
+                key = (username, rec["problemId"])
+                if key not in groups:
+                    groups[key] = (rec["sess"], set())
+                groups[key][1].add(submissionId)
+            for (username, problem_id), (sess, ids) in groups.items():
+                try:
+                    await self._sweep(sess, username, problem_id, ids)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.warning(f"sweeping submissions of {username} on problem {problem_id} failed : {e!r}")
+
+    async def _sweep(self, sess: aiohttp.ClientSession, username: str, problem_id: int, ids: set):
+        '''
+        page through the newest submissions until every id in `ids` was seen ,
+        the ones not found are left to the per-id polling
+        '''
+        max_pages = len(ids) // self.bulk.page_size + 2
+        offset = 0
+        for _ in range(max_pages):
+            await self.bucket.acquire()
+            self.list_requests += 1
+            subs, total = await async_list_submissions(
+                sess, offset, self.bulk.page_size, problem_id, username)
+            for res in subs:
+                submissionId = res["id"]
+                if submissionId not in ids:
+                    continue
+                ids.discard(submissionId)
+                if submissionId not in self.pending or res["status"] == -1:
+                    continue
+                if self.bulk.need_tasks and "tasks" not in res:
+                    self.pending[submissionId]["listed"] = True
+                    timer = self._timers.pop(submissionId, None)
+                    if timer is not None:
+                        timer.cancel()
+                    self._schedule(submissionId, 0)
+                    continue
+                res.pop("id")
+                res["time"] = time.monotonic() - self.pending[submissionId]["uploaded"]
+                self._finish(submissionId, res)
+            offset += self.bulk.page_size
+            if len(ids) == 0 or len(subs) < self.bulk.page_size or offset >= total:
+                break
+
+    def summary(self) -> dict:
+        '''
+        how many status requests the verdicts cost
+        '''
+        polls = [r["polls"] for r in self.results.values() if "status" in r]
+        return {
+            "requests": self.requests,
+            "listRequests": self.list_requests,
+            "verdicts": len(polls),
+            "meanPolls": sum(polls) / len(polls) if len(polls) != 0 else 0,
+            "maxPolls": max(polls) if len(polls) != 0 else 0,
+        }
+
+
+async def get_result(sess: aiohttp.ClientSession, submissionIds: list, submission_time_limit={}, MAX_TIMEOUT=3600, workers: int = 64, policy: PollPolicy = None, bulk: BulkPolicy = None) -> dict:
+    '''
+    poll the verdicts of already created submissions
+    '''
+    poller = StatusPoller(sess, workers, policy, bulk)
+    for submissionId in submissionIds:
+        poller.track(submissionId, submission_time_limit.get(submissionId))
+    poller.start()
+    timeout = False
+    try:
+        await asyncio.wait_for(poller.wait(), MAX_TIMEOUT)
+    except asyncio.TimeoutError:
+        logging.info("time's up")
+        poller.expire_all()
+        timeout = True
+    finally:
+        await poller.stop()
+    result = {}
+    for submissionId in submissionIds:
+        result[submissionId] = poller.results[submissionId]
+    if timeout:
+        result.update({"wait_status": "timeout expire max waiting time"})
+    return result
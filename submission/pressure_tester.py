@@ -1,183 +1,29 @@
 import click
-import asyncio
 import logging
-import aiohttp
 import random
-import time
 import json
 from . import submission
-from .core_utils import async_get_status, async_submit
-from cores.login import get_async_session, get_api_base, kill_async_session
+from .arrival import ARRIVAL_MODES, build_schedule, summarize_lag
+from .poller import BulkPolicy, PollPolicy
+from .distributed import run_local, run_remote
+from .expectation import ExpectationPlan, compile_filters, print_fails
+from . import core_utils
+from cores.metrics import PhaseMetrics
+from cores.resilience import ErrorCounters
+from cores.session_pool import pool_users
 import os.path as path
 from os import listdir
 
 
-def get_result(session: aiohttp.ClientSession, submissionIds: list, submission_time_limit={}, MAX_TIMEOUT=3600) -> dict:
-    loop = asyncio.get_event_loop()
-    result = {}
-    for submissionId in submissionIds:
-        result.update({submissionId: None})
-    begin_time = time.time()
-
-    while (True):
-        tasks = []
-        for submissionId in submissionIds:
-            if result[submissionId] == None:
-                if submissionId in submission_time_limit and time.time() - begin_time >= submission_time_limit[submissionId]:
-                    result[submissionId] = {
-                        "wait_status": f"timeout expire {submission_time_limit[submissionId]} sec...QQ"}
-                    continue
-                tasks.append(
-                    asyncio.ensure_future(async_get_status(session, submissionId)))
-
-        loop.run_until_complete(asyncio.wait(tasks))
-
-        for task in tasks:
-            res = dict(task.result())
-            if res["status"] == -1:
-                continue
-            submissionId = res["id"]
-            res.pop("id")
-            res["time"] = time.time() - res["time"]
-            result[submissionId] = res
-
-        if time.time() - MAX_TIMEOUT >= begin_time:
-            logging.info("time's up")
-            for k in list(result.keys()):
-                if result[k] == None:
-                    result[k] = {}
-            result.update({"wait_status": "timeout expire max waiting time"})
-
-            return result
-
-        fn_flag = True
-        for k in submissionIds:
-            if result[k] == None:
-                fn_flag = False
-                break
-
-        if fn_flag == True:
-            break
-    return result
-
-
-def __fuzz_compare_unit(domain: list, target: dict, filters: dict) -> list:
-    logging.debug(f"target:{target}")
-    logging.debug(f"filters:{filters}")
-    target_keys = list(set(domain))
-    target_keys = list(set(target_keys).intersection(
-        set(list(filters.keys()))))
-    failure_list = []
-    for k in target_keys:
-        if k in target:
-            if target[k] != filters[k]:
-                failure_list.append(
-                    {"key": k, "real": target[k], "type": "abs", "expect": filters[k]})
-        elif str(k).find("Max") != -1:
-            key = str(k).replace("Max", "", 1)
-            fit_ks = ["Max"+key, "Min"+key]
-            tar_k = key[0].lower() + key[1:]
-            if tar_k not in target:
-                failure_list.append(
-                    {"type": "miss", "key": tar_k})
-                continue
-
-            if filters[fit_ks[1]] <= target[tar_k] and target[tar_k] <= filters[fit_ks[0]]:
-                pass
-            else:
-                failure_list.append(
-                    {"key": tar_k, "real": target[tar_k], "type": "seq", "expect": (filters[fit_ks[1]], filters[fit_ks[0]])})
-
-        else:
-            failure_list.append(
-                {"type": "miss", "key": k})
-    return failure_list
-
-
-def print_fails(fails: list) -> list:
-    p_f = []
-    for it in fails:
-        if it["type"] == "miss":
-            p_f.append(
-                f"failure on {it['key']} : can not found data with key {it['key']}")
-        elif it["type"] == "abs":
-            p_f.append(
-                f"failure on {it['key']} : expected {it['expect']} but got {it['real']}")
-        elif it["type"] == "seq":
-            p_f.append(
-                f"failure on {it['key']} : expected between {it['expect'][0]} and {it['expect'][1]} but got {it['real']}")
-        else:
-            raise Exception(f"Undefind Property {it['type']}")
-    return p_f
-
-
 def filter_unit(target: dict, filters: dict) -> list:
-    failure_list = []
-    f_items = __fuzz_compare_unit(
-        ["MaxMemoryUsage", "MaxRunTime", "score", "status"], target, filters)
-
-    failure_list.extend(print_fails(f_items))
-    if "tasks" in filters:
-        for i in list(filters["tasks"].keys()):
-            els = str(i).split(":")
-            task = int(els[0])
-            case = int(els[1])
-            subtask = {}
-            logging.debug(f"target:{target}")
-            try:
-                subtask = target["tasks"][task]["cases"][case]
-            except (IndexError, KeyError):
-                failure_list.append(
-                    f"failure on task {task} case {case}: data does not exist")
-                continue
-
-            if subtask != {}:
-                sub_fails = __fuzz_compare_unit(
-                    ["stdout", "stderr", "exitCode", "MaxExecTime", "MaxMemoryUsage", "status"], subtask, filters["tasks"][i])
-                for i in range(len(sub_fails)):
-                    sub_fails[i]["key"] = f"task {task} case {case} {sub_fails[i]['key']}"
-
-                failure_list.extend(print_fails(sub_fails))
-    return failure_list
-
-
-def full_filter(raw_data: dict, filters: dict) -> (dict, bool):
-    overall_sucess = True
-    for sid in list(raw_data.keys()):
-        if type(raw_data[sid]) == str:
-            continue
-        logging.debug(f"raw_data[sid]:{raw_data[sid]}")
-        src_file = raw_data[sid]["src"]
-        if src_file in filters:
-            fil = filters[src_file]
-            fails = filter_unit(raw_data[sid], fil)
-            if len(fails) != 0:
-                overall_sucess = False
-                raw_data[sid].update({"success": False})
-                raw_data[sid].update({"fails": fails})
-            else:
-                raw_data[sid].update({"success": True})
-    return raw_data, overall_sucess
+    return ExpectationPlan(filters).check(target)
 
 
-@submission.command()
-@click.option("-u" ,"--user" ,"user" , type=str , default="first_admin" , help="the user to login as")
-@click.option("-c", "--count", "count", type=int, default=0, help="the request count to send")
-@click.option("-l", "--lang", "lang", type=int, default=0, help="the language of submission(non-checked)")
-@click.option("-f", "--file", "code", type=click.Path(file_okay=True), default="", help="the submission source file")
-@click.option("-r", "--random", "rand", type=bool, default=False, help="send the submission in random order")
-@click.option("-d", "--delay", "delay", type=float, default=1.0, help="set the delay of checking up function(which will affect the accurrency of testing)")
-@click.option("--maxTime", "max_time", type=float, default=3600, help="the maxium waiting time for waiting all the result(default is 3600 sec)")
-@click.option("-p", "--pid", "problem_id", type=int, default=1, help="the problem id you want to submit")
-@click.option("--cfg", "config", type=click.Path(file_okay=True), default="", help="the config file of this test , which will may overwrite some other options , see wiki for more detailed")
-@click.option("--fname", "fname", type=str, default="result.json", help="the filename of result(default is result.json)")
-def pressure_tester(user:str, count: int, lang: int, code: str, rand: bool, delay: float, config: str, max_time: float, problem_id: int, fname: str):
+def build_codes(count: int, lang: int, code: str, problem_id: int, config: str, rand: bool) -> (list, dict, int):
     '''
-    mount a submission pressure test on given condiction
+    build the `(lang, problem_id, src)` work list from the command line options
+    or the `--cfg` file , return it with the loaded filters and the count to send
     '''
-    ses = get_async_session(user)
-    assert ses != None
-    DELAY_SEC = delay
     codes = []
 
     if code != "" and path.isdir(code):
@@ -214,40 +60,194 @@ def pressure_tester(user:str, count: int, lang: int, code: str, rand: bool, dela
 
     if rand:
         random.shuffle(codes)
+    return codes, filters, count
 
-    tasks = []
-    logging.debug(f"total count to send : {count}")
-    for i in range(count):
-        tasks.append(
-            asyncio.ensure_future(async_submit(ses, codes[i][0], codes[i][1], codes[i][2])))
-
-    # purify codes to store only src of codes
-    for i in range(len(codes)):
-        codes[i] = codes[i][2]
-
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(asyncio.wait(tasks))
-    submissionIds = []
-    for task in tasks:
-        submissionIds.append(task.result())
-
-    get_result_filiter = {}
-    if filters != {}:
-        for i in range(len(submissionIds)):
-            if codes[i] in filters and "expireTime" in filters[codes[i]]:
-                get_result_filiter.update(
-                    {submissionIds[i]: filters[codes[i]]["expireTime"]})
-
-    result = get_result(
-        ses, submissionIds, submission_time_limit=get_result_filiter, MAX_TIMEOUT=max_time)
-    kill_async_session(ses)
-
-    if code != "" or config != "":
-        for i in range(len(submissionIds)):
-            result[submissionIds[i]].update({"src": codes[i]})
-    if config != "":
+
+def make_job(users: list, login_parallel: int, cookie_dir: str, codes: list, offsets: list, filters: dict,
+             max_time: float, workers: int, policy: PollPolicy, bulk: BulkPolicy, log_level: str) -> dict:
+    '''
+    pack everything a pipeline needs into a json-able dict , see `pipeline.run_shard`
+    '''
+    return {
+        "users": users,
+        "loginParallel": login_parallel,
+        "cookieDir": cookie_dir,
+        "codes": codes,
+        "offsets": offsets,
+        "filters": filters,
+        "maxTime": max_time,
+        "workers": workers,
+        "policy": vars(policy),
+        "bulk": vars(bulk) if bulk is not None else None,
+        "logLevel": log_level,
+    }
+
+
+def full_filter(raw_data: dict, filters: dict) -> (dict, bool):
+    '''
+    check every result against the compiled filter of its source , all
+    results of the same source are checked in one batch
+    '''
+    overall_sucess = True
+    plans = compile_filters(filters)
+    batches = {}
+    for sid in list(raw_data.keys()):
+        if type(raw_data[sid]) != dict or "src" not in raw_data[sid]:
+            continue
+        src_file = raw_data[sid]["src"]
+        if src_file in plans:
+            batches.setdefault(src_file, []).append(sid)
+    for src_file, sids in batches.items():
+        all_fails = plans[src_file].run([raw_data[sid] for sid in sids])
+        for sid, fails in zip(sids, all_fails):
+            if len(fails) != 0:
+                overall_sucess = False
+                raw_data[sid].update({"success": False})
+                raw_data[sid].update({"fails": fails})
+            else:
+                raw_data[sid].update({"success": True})
+    return raw_data, overall_sucess
+
+
+def finish_run(result: dict, sent: dict, stats: dict, filters: dict, schedule: dict, with_src: bool, with_user: bool) -> dict:
+    '''
+    attach the sending record to every verdict , check them with `filters`
+    (None skips it) and add the summaries of schedule lag , polling , latency ,
+    the errors of every endpoint and the throughput next to the error rate
+    '''
+    for submissionId in sent.keys():
+        result[submissionId].update({
+            "scheduledAt": sent[submissionId]["scheduledAt"],
+            "lag": sent[submissionId]["lag"],
+            "uploadedAt": sent[submissionId]["uploadedAt"]})
+        if with_src:
+            result[submissionId].update({"src": sent[submissionId]["src"]})
+        if with_user:
+            result[submissionId].update({"user": sent[submissionId]["user"]})
+    if filters is not None:
         result, all_pass = full_filter(result, filters)
-        result.update({"passTest": all_pass and "wait_status" not in result})
-        assert result["passTest"]
+    lag = summarize_lag([v["lag"] for v in sent.values()])
+    logging.info(f"schedule lag:{lag}")
+    result.update({"schedule": dict(schedule, lag=lag)})
+    logging.info(f"polling:{stats['polling']}")
+    result.update({"polling": stats["polling"]})
+    latency = PhaseMetrics.load(stats["latency"]).summary()
+    logging.info(f"latency:{latency['phases']}")
+    result.update({"latency": latency})
+    errors = ErrorCounters.load(stats.get("errors", {})).summary()
+    failed = stats.get("failed", [])
+    elapsed = stats.get("elapsed", 0.0)
+    verdicts = sum(1 for sid in sent.keys() if result[sid].get("status") is not None)
+    throughput = {
+        "submitted": len(sent),
+        "failedSubmissions": len(failed),
+        "verdicts": verdicts,
+        "elapsed": elapsed,
+        "submissionsPerSec": len(sent) / elapsed if elapsed > 0 else 0.0,
+        "verdictsPerSec": verdicts / elapsed if elapsed > 0 else 0.0,
+        "errorRate": errors["total"]["errorRate"],
+        "breaker": stats.get("breaker", {}),
+    }
+    logging.info(f"throughput:{throughput}")
+    if errors["total"]["errors"] != 0:
+        logging.warning(f"errors:{ {k: v['errors'] for k, v in errors.items() if v['errors'] != 0} }")
+    result.update({"errors": errors, "throughput": throughput})
+    if len(failed) != 0:
+        result.update({"failedSubmissions": failed})
+    if filters is not None:
+        result.update({"passTest": all_pass and "wait_status" not in result and len(failed) == 0})
+    return result
+
+
+@submission.command()
+@click.option("-u" ,"--user" ,"user" , type=str , default="first_admin" , help="the user to login as")
+@click.option("-c", "--count", "count", type=int, default=0, help="the request count to send")
+@click.option("-l", "--lang", "lang", type=int, default=0, help="the language of submission(non-checked)")
+@click.option("-f", "--file", "code", type=click.Path(file_okay=True), default="", help="the submission source file")
+@click.option("-r", "--random", "rand", type=bool, default=False, help="send the submission in random order")
+@click.option("-d", "--delay", "delay", type=float, default=1.0, help="set the delay of checking up function , which is also the initial polling interval of each submission(which will affect the accurrency of testing)")
+@click.option("--maxTime", "max_time", type=float, default=3600, help="the maxium waiting time for waiting all the result(default is 3600 sec)")
+@click.option("-p", "--pid", "problem_id", type=int, default=1, help="the problem id you want to submit")
+@click.option("--cfg", "config", type=click.Path(file_okay=True), default="", help="the config file of this test , which will may overwrite some other options , see wiki for more detailed")
+@click.option("--fname", "fname", type=str, default="result.json", help="the filename of result(default is result.json)")
+@click.option("--arrival", "arrival", type=click.Choice(ARRIVAL_MODES), default="burst", help="the arrival schedule of submissions(default is burst , which sends all at once)")
+@click.option("--rate", "rate", type=float, default=1.0, help="the (initial) arrival rate in submissions/sec for non-burst schedules")
+@click.option("--rateEnd", "rate_end", type=float, default=0, help="the final arrival rate of ramp and step schedules(default is the same as --rate)")
+@click.option("--steps", "steps", type=int, default=5, help="the number of stages of step schedule")
+@click.option("--seed", "seed", type=int, default=None, help="the random seed of poisson schedule")
+@click.option("-w", "--workers", "workers", type=int, default=64, help="the number of concurrent status workers(default is 64)")
+@click.option("--backoff", "backoff", type=float, default=1.5, help="multiply the polling interval of a pending submission by it after every poll(default is 1.5)")
+@click.option("--maxDelay", "max_delay", type=float, default=10.0, help="the maxium polling interval of a submission(default is 10 sec)")
+@click.option("--jitter", "jitter", type=float, default=0.1, help="spread every polling interval randomly by this ratio(default is 0.1)")
+@click.option("--pollBudget", "poll_budget", type=float, default=0, help="the maxium status requests per sec of the whole run(default is 0 , unlimited)")
+@click.option("--bulk", "bulk", type=bool, default=False, help="resolve the verdicts through the submission list of the user , polling by id only for the stragglers")
+@click.option("--bulkInterval", "bulk_interval", type=float, default=2.0, help="the sec between two sweeps of the submission list in bulk mode(default is 2 sec)")
+@click.option("--pageSize", "page_size", type=int, default=100, help="the submissions per list request in bulk mode(default is 100)")
+@click.option("--stragglerAfter", "straggler_after", type=float, default=30.0, help="poll a submission by its id after it was pending for so many sec in bulk mode(default is 30 sec)")
+@click.option("--poolSize", "pool_size", type=int, default=0, help="spread the submissions over so many users(default is 0 , only --user)")
+@click.option("--userPattern", "user_pattern", type=str, default="", help="the username pattern of the pool like test{} , default is the users in cores/config.json")
+@click.option("--passwdPattern", "passwd_pattern", type=str, default="", help="the password pattern of the pool(default is the same as --userPattern)")
+@click.option("--loginParallel", "login_parallel", type=int, default=16, help="the maxium concurrent logins of the pool(default is 16)")
+@click.option("--cookieDir", "cookie_dir", type=str, default="", help="keep and reuse the login cookies in this directory across runs")
+@click.option("--procs", "procs", type=int, default=1, help="split the work list over so many local processes(default is 1)")
+@click.option("--nodes", "nodes", type=str, default="", help="comma separated host:port of pressure-worker agents to split the work list over")
+@click.option("--mmapThreshold", "mmap_threshold", type=int, default=64, help="memory-map source archives of at least so many MB instead of reading them(default is 64 , 0 disables it)")
+@click.option("--stream", "stream", type=str, default="", help="write every verdict to this NDJSON file as it arrives(one file per shard with --procs/--nodes , kept on --resume)")
+@click.option("--flushEvery", "flush_every", type=int, default=100, help="flush the stream after so many verdicts(default is 100 , and at least every sec)")
+@click.option("--dropCases", "drop_cases", type=bool, default=False, help="drop the case payloads no filter of --cfg checks to bound the memory")
+@click.option("--checkpoint", "checkpoint", type=str, default="", help="log the plan , the created submissions and the verdicts to this file(one file per shard with --procs/--nodes)")
+@click.option("--resume", "resume", type=bool, default=False, help="continue the run logged in --checkpoint , rerun with the same options and the same --procs/--nodes")
+@click.option("--trace", "trace", type=str, default="", help="dump the latest request events to this chrome trace-event json(one file per shard with --procs/--nodes)")
+@click.option("--traceSize", "trace_size", type=int, default=100000, help="the trace events kept in memory(default is 100000)")
+@click.option("--retries", "retries", type=int, default=3, help="retry a timeout , network error , 429 or 5xx of a safe request(status , list , login) so many times(default is 3)")
+@click.option("--retryBackoff", "retry_backoff", type=float, default=0.5, help="the first retry waits about so many sec , doubled every time(default is 0.5)")
+@click.option("--breakerThreshold", "breaker_threshold", type=int, default=20, help="pause the load after so many failures in a row(default is 20 , 0 disables it)")
+@click.option("--breakerCooldown", "breaker_cooldown", type=float, default=5.0, help="the sec the load pauses before probing the api again(default is 5)")
+@click.option("--logLevel", "log_level", type=click.Choice(["DEBUG", "INFO", "WARNING"]), default="INFO", help="the logging level while the load runs(default is INFO , DEBUG slows the client down)")
+def pressure_tester(user:str, count: int, lang: int, code: str, rand: bool, delay: float, config: str, max_time: float, problem_id: int, fname: str,
+                    arrival: str, rate: float, rate_end: float, steps: int, seed: int, workers: int,
+                    backoff: float, max_delay: float, jitter: float, poll_budget: float,
+                    bulk: bool, bulk_interval: float, page_size: int, straggler_after: float,
+                    pool_size: int, user_pattern: str, passwd_pattern: str, login_parallel: int, cookie_dir: str,
+                    procs: int, nodes: str, mmap_threshold: int, stream: str, flush_every: int, drop_cases: bool,
+                    checkpoint: str, resume: bool, trace: str, trace_size: int,
+                    retries: int, retry_backoff: float, breaker_threshold: int, breaker_cooldown: float, log_level: str):
+    '''
+    mount a submission pressure test on given condiction
+    '''
+    logging.getLogger().setLevel(log_level)
+    core_utils.DELAY_SEC = delay
+    policy = PollPolicy(delay, backoff, max_delay, jitter, poll_budget)
+    codes, filters, count = build_codes(count, lang, code, problem_id, config, rand)
+    logging.debug(f"total count to send : {count}")
+    offsets = build_schedule(arrival, count, rate, rate_end, steps, seed)
+    bulk_policy = None
+    if bulk:
+        need_tasks = any("tasks" in f for f in filters.values())
+        bulk_policy = BulkPolicy(user, bulk_interval, page_size, straggler_after, need_tasks)
+
+    users = [(user, "")]
+    if pool_size > 0:
+        users = pool_users(pool_size, user_pattern, passwd_pattern)
+    job = make_job(users, login_parallel, cookie_dir, codes[:count], offsets, filters,
+                   max_time, workers, policy, bulk_policy, log_level)
+    job["mmapThreshold"] = mmap_threshold * 1024 * 1024
+    job.update({"stream": stream, "flushEvery": flush_every, "dropCases": drop_cases})
+    if resume and checkpoint == "":
+        raise click.UsageError("--resume needs the --checkpoint of the interrupted run")
+    job.update({"checkpoint": checkpoint, "resume": resume, "trace": trace, "traceSize": trace_size})
+    job.update({"retry": {"retries": retries, "backoff": retry_backoff},
+                "breaker": {"threshold": breaker_threshold, "cooldown": breaker_cooldown}})
+
+    if nodes != "":
+        result, sent, stats = run_remote(job, nodes.split(","))
+    else:
+        result, sent, stats = run_local(job, procs)
+
+    result = finish_run(result, sent, stats, filters if config != "" else None,
+                        {"arrival": arrival, "rate": rate, "rateEnd": rate_end},
+                        code != "" or config != "", pool_size > 0)
     with open(fname, "w") as f:
         f.write(json.dumps(result, indent=4))
+    if config != "":
+        assert result["passTest"]
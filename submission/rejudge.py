@@ -1,71 +1,204 @@
 import click
 import logging
 import asyncio
+import json
 import time
 from cores import login
+from cores.metrics import METRICS
+from cores.rate_limit import TokenBucket
+from cores.trace import TRACER
+from cores.session_pool import SessionPool
 from . import submission
 from .pressure_tester import submission
-from .core_utils import seq_rejudge , async_rejudge , seq_get_status , async_get_status
+from .core_utils import seq_rejudge , async_rejudge , seq_get_status , async_list_submissions
+from .poller import PollPolicy, StatusPoller
+
+
+async def problem_submissions(sess, problem_id: int, page_size: int = 100) -> list:
+    '''
+    the ids of every judged submission of `problem_id` , pending ones can not be rejudged
+    '''
+    sids = []
+    pending = 0
+    offset = 0
+    while True:
+        subs, total = await async_list_submissions(sess, offset, page_size, problem_id)
+        for s in subs:
+            if s["status"] == -1:
+                pending += 1
+            else:
+                sids.append(s["id"])
+        offset += page_size
+        if len(subs) < page_size or offset >= total:
+            break
+    if pending != 0:
+        logging.info(f"skip {pending} pending submissions of problem {problem_id}")
+    return sids
+
+
+async def bulk_rejudge(sess, submission_ids: list, window: int = 16, rate: float = 0, workers: int = 64,
+                       policy: PollPolicy = None, max_time: float = 3600) -> dict:
+    '''
+    rejudge `submission_ids` with at most `window` of them waiting for a verdict
+    and at most `rate` rejudge requests per sec (0 is unlimited) , every one is
+    polled until its new verdict , whose `time` is the turnaround since the
+    rejudge request was sent
+
+    NOJ resets the status to pending before answering a rejudge , so the first
+    finished status seen afterwards is the new verdict
+    '''
+    slots = asyncio.Semaphore(max(1, window))
+    bucket = TokenBucket(rate)
+    result = {}
+
+    def on_result(submissionId: str, res: dict):
+        slots.release()
+
+    poller = StatusPoller(sess, workers, policy, on_result=on_result)
+    poller.start()
+
+    async def fire(submissionId: str):
+        await slots.acquire()
+        await bucket.acquire()
+        sent_at = time.monotonic()
+        try:
+            await async_rejudge(sess, submissionId, delay=0)
+        except Exception as e:
+            logging.warning(f"rejudge {submissionId} failed : {e!r}")
+            result[submissionId] = {"error": repr(e)}
+            slots.release()
+            return
+        poller.track(submissionId, uploaded=sent_at)
+
+    async def drain():
+        for submissionId in submission_ids:
+            await fire(submissionId)
+        await poller.wait()
+
+    begin = time.monotonic()
+    try:
+        await asyncio.wait_for(drain(), max_time)
+    except asyncio.TimeoutError:
+        logging.info("time's up")
+        poller.expire_all()
+        result["wait_status"] = "timeout expire max waiting time"
+    finally:
+        await poller.stop()
+    elapsed = time.monotonic() - begin
+    result.update(poller.results)
+    done = [r for r in poller.results.values() if "status" in r]
+    result["throughput"] = {
+        "rejudges": len(submission_ids),
+        "verdicts": len(done),
+        "elapsed": elapsed,
+        "verdictsPerSec": len(done) / elapsed if elapsed > 0 else 0,
+    }
+    return result
+
+
+def seq_bulk_rejudge(sess, submission_ids: list, delay: float, max_time: float) -> dict:
+    '''
+    rejudge `submission_ids` one after another , each waits for its new verdict ,
+    a failed one is recorded and the next goes on , none is sent after `max_time`
+    '''
+    result = {}
+    begin = time.monotonic()
+    for submissionId in submission_ids:
+        if time.monotonic() - begin >= max_time:
+            logging.info("time's up")
+            result["wait_status"] = "timeout expire max waiting time"
+            break
+        sent_at = time.monotonic()
+        try:
+            seq_rejudge(sess, submissionId, delay=0)
+            METRICS.record("rejudge", time.monotonic() - sent_at)
+            while True:
+                time.sleep(delay)
+                status = seq_get_status(sess, submissionId)
+                if status["status"] != -1:
+                    status.pop("id")
+                    status["time"] = time.monotonic() - sent_at
+                    METRICS.record("verdict", status["time"])
+                    result[submissionId] = status
+                    break
+                if time.monotonic() - begin >= max_time:
+                    result[submissionId] = {"wait_status": "timeout expire max waiting time"}
+                    break
+        except Exception as e:
+            logging.warning(f"rejudge {submissionId} failed : {e!r}")
+            result[submissionId] = {"error": repr(e)}
+    elapsed = time.monotonic() - begin
+    done = [r for r in result.values() if isinstance(r, dict) and "status" in r]
+    result["throughput"] = {
+        "rejudges": len(submission_ids),
+        "verdicts": len(done),
+        "elapsed": elapsed,
+        "verdictsPerSec": len(done) / elapsed if elapsed > 0 else 0,
+    }
+    return result
+
+
 @submission.command()
-@click.option("-s", "--sid", "submission_id", type=str, default="", help="the submission id you want to submit , will generate one on runtime if not given")
-@click.option("-c", "--count", "count", type=int, default=1, help="the time of testing rejudge")
-@click.option("--seq", "sequential", type=bool, default=True, help="wheather to test it in specify order")
-@click.option("--cfg", "config", type=click.File("r"), help="see github wiki for more detail")
+@click.option("-u", "--user", "user", type=str, default="first_admin", help="the user to login as , who needs the right to rejudge")
+@click.option("-s", "--sid", "submission_ids", type=str, multiple=True, help="the submission id to rejudge , can be given many times")
+@click.option("--sidFile", "sid_file", type=click.File("r"), default=None, help="a file of submission ids to rejudge , one per line")
+@click.option("-p", "--problemId", "problem_id", type=int, default=None, help="rejudge every judged submission of this problem")
+@click.option("-c", "--count", "count", type=int, default=1, help="how many rounds to rejudge them")
+@click.option("--seq", "sequential", type=bool, default=False, help="rejudge one by one , each waits for its verdict")
+@click.option("--window", "window", type=int, default=16, help="the rejudges allowed to wait for a verdict at once(default is 16)")
+@click.option("--rate", "rate", type=float, default=0, help="the rejudge requests sent per sec , 0 is unlimited(default is 0)")
+@click.option("-w", "--workers", "workers", type=int, default=64, help="the status polling workers(default is 64)")
 @click.option("-d", "--delay", "delay", type=float, default=1.0, help="set the delay of checking up function(which will affect the accurrency of testing)")
 @click.option("--maxTime", "max_time", type=float, default=3600, help="the maxium waiting time for waiting all the result(default is 3600 sec)")
 @click.option("--fname", "fname", type=str, default="result.json", help="the filename of result(default is result.json)")
-def rejudge(submission_id:str, count:int , sequential:bool, config , delay:float , max_time:float , fname:str):
+@click.option("--trace", "trace", type=str, default="", help="dump the latest request events to this chrome trace-event json")
+@click.option("--traceSize", "trace_size", type=int, default=100000, help="the trace events kept in memory(default is 100000)")
+def rejudge(user: str, submission_ids: tuple, sid_file, problem_id: int, count: int, sequential: bool, window: int, rate: float,
+            workers: int, delay: float, max_time: float, fname: str, trace: str, trace_size: int):
     '''
-    try to rejudge a specify submission
+    rejudge many submissions (or a whole problem) and report the turnaround of their new verdicts
     '''
-    assert submission_id ==  ""
+    sids = list(submission_ids)
+    if sid_file is not None:
+        sids.extend(line.strip() for line in sid_file if line.strip() != "")
+    if len(sids) == 0 and problem_id is None:
+        raise click.UsageError("give the submissions by --sid , --sidFile or --problemId")
     result = {}
+    METRICS.reset()
     if sequential:
-        sess = login.get_session()
+        if problem_id is not None:
+            raise click.UsageError("--problemId needs the concurrent mode")
+        sess = login.get_session(user)
+        sids = list(dict.fromkeys(sids))
         for i in range(count):
-            send_rejudge([submission_id] , sequential)
-            
-            start_time = time.time()
-            while True:
-                status = seq_get_status(sess , submission_id)
-                
-                if status["status"] != -1:
-                    result.update({f"{i}":status})
-                    break
-                if time.time() - start_time >= max_time:
-                    result.update({"timeOut":True})
-                    break
-        if "timeOut" not in result:
-            result.update({"timeOut":False})
-    else:
-        tars = []
-        for i in range(count):
-            tars.append(submission_id)
-        
-        send_rejudge(tars , sequential)
-        
-        sess = login.get_async_session()
-        loop = asyncio.get_event_loop()
-        while True:
-            tasks = []
-            for i in tars:
-                tasks.append(asyncio.ensure_future(async_get_status(sess , i)))
-            tasks = loop.run_until_complete(tasks)
-            
-            for i in len(tasks):
-                r = tasks[i].result()
-                if r["status"] != -1:
-                    result.update({tars.pop(i):r})
-                
-def send_rejudge(submission_ids:list, sequential:bool):
-    if sequential:
-        sess = login.get_session()
-        for i in submission_ids:
-            seq_rejudge(sess , i)
+            result[f"{i}"] = seq_bulk_rejudge(sess, sids, delay, max_time)
     else:
-        sess = login.get_async_session()
-        loop = asyncio.get_event_loop()
-        tasks = []
-        for i in submission_ids:
-            tasks.append(asyncio.ensure_future(async_rejudge(sess , i)))
-        loop.run_until_complete(tasks)
+        if trace != "":
+            TRACER.enable(trace_size)
+        async def main():
+            pool = SessionPool([(user, "")], 1)
+            await pool.open()
+            try:
+                targets = list(sids)
+                if problem_id is not None:
+                    targets.extend(await problem_submissions(pool.session(0), problem_id))
+                targets = list(dict.fromkeys(targets))
+                logging.info(f"rejudge {len(targets)} submissions")
+                policy = PollPolicy(delay=delay)
+                for i in range(count):
+                    result[f"{i}"] = await bulk_rejudge(pool.session(0), targets, window, rate, workers, policy, max_time)
+            finally:
+                await pool.close()
+        try:
+            asyncio.run(main())
+        finally:
+            if trace != "":
+                TRACER.dump(trace)
+    latency = METRICS.summary()["phases"]
+    result["turnaround"] = latency.get("verdict", {"count": 0})
+    result["latency"] = latency
+    for i in range(count):
+        logging.info(f"round {i}:{result[f'{i}']['throughput']}")
+    logging.info(f"turnaround:{result['turnaround']}")
+    with open(fname, "w") as f:
+        f.write(json.dumps(result, indent=4))
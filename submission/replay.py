@@ -0,0 +1,97 @@
+import click
+import json
+import logging
+from . import submission
+from . import core_utils
+from .distributed import run_local, run_remote
+from .poller import BulkPolicy, PollPolicy
+from .pressure_tester import finish_run, make_job
+from cores.session_pool import pool_users
+
+
+def load_trace(fname: str, speedup: float = 1.0, limit: int = 0) -> (list, list):
+    '''
+    read an arrival trace , one json per line:
+
+        {"offset": 12.5, "language": 0, "problem": 3, "source": "c-code.zip"}
+
+    `offset` is in sec (any origin) , `source` "" is the default source of the language
+
+    Returns:
+        the `(lang, problem_id, src)` work list in arrival order and the
+        offsets since the first arrival divided by `speedup`
+    '''
+    assert speedup > 0, "the speed-up should be positive"
+    arrivals = []
+    with open(fname, "r") as f:
+        for no, line in enumerate(f, 1):
+            if line.strip() == "":
+                continue
+            try:
+                rec = json.loads(line)
+                arrivals.append((float(rec["offset"]), (int(rec["language"]), int(rec["problem"]), rec.get("source", ""))))
+            except (ValueError, KeyError) as e:
+                raise click.ClickException(f"{fname}:{no} is not an arrival : {e!r}")
+    arrivals.sort(key=lambda a: a[0])
+    if limit > 0:
+        arrivals = arrivals[:limit]
+    if len(arrivals) == 0:
+        return [], []
+    first = arrivals[0][0]
+    return [c for _, c in arrivals], [(t - first) / speedup for t, _ in arrivals]
+
+
+@submission.command()
+@click.argument("trace", type=click.Path(exists=True, dir_okay=False))
+@click.option("-u", "--user", "user", type=str, default="first_admin", help="the user to login as")
+@click.option("-s", "--speedup", "speedup", type=float, default=1.0, help="replay so many times faster than recorded(default is 1)")
+@click.option("--limit", "limit", type=int, default=0, help="replay only the first so many arrivals(default is 0 , all)")
+@click.option("--cfg", "config", type=click.Path(file_okay=True), default="", help="the filters of the sources in the trace , same as pressure-tester --cfg")
+@click.option("-d", "--delay", "delay", type=float, default=1.0, help="set the delay of checking up function(which will affect the accurrency of testing)")
+@click.option("--maxTime", "max_time", type=float, default=3600, help="the maxium waiting time for waiting all the result(default is 3600 sec)")
+@click.option("-w", "--workers", "workers", type=int, default=64, help="the status polling workers(default is 64)")
+@click.option("--bulk", "bulk", type=bool, default=False, help="resolve most verdicts by sweeping the submission list")
+@click.option("--poolSize", "pool_size", type=int, default=0, help="spread the submissions over so many logged in users(default is 0 , only --user)")
+@click.option("--userPattern", "user_pattern", type=str, default="", help="the username pattern of the pool , e.g. student{} , default is the users of cores/config.json")
+@click.option("--passwdPattern", "passwd_pattern", type=str, default="", help="the password pattern of the pool(default is --userPattern)")
+@click.option("--loginParallel", "login_parallel", type=int, default=16, help="the max concurrent logins of the pool(default is 16)")
+@click.option("--procs", "procs", type=int, default=1, help="split the trace over so many local processes(default is 1)")
+@click.option("--nodes", "nodes", type=str, default="", help="comma separated host:port of pressure-worker agents to split the trace over")
+@click.option("--stream", "stream", type=str, default="", help="write every verdict to this NDJSON file as it arrives")
+@click.option("--fname", "fname", type=str, default="result.json", help="the filename of result(default is result.json)")
+@click.option("--logLevel", "log_level", type=click.Choice(["DEBUG", "INFO", "WARNING"]), default="INFO", help="the logging level while the load runs(default is INFO)")
+def replay(trace: str, user: str, speedup: float, limit: int, config: str, delay: float, max_time: float, workers: int, bulk: bool,
+           pool_size: int, user_pattern: str, passwd_pattern: str, login_parallel: int, procs: int, nodes: str, stream: str,
+           fname: str, log_level: str):
+    '''
+    replay the submission arrivals of a recorded trace , optionally sped up
+    '''
+    logging.getLogger().setLevel(log_level)
+    core_utils.DELAY_SEC = delay
+    codes, offsets = load_trace(trace, speedup, limit)
+    if len(codes) == 0:
+        raise click.ClickException(f"{trace} has no arrivals")
+    logging.info(f"replay {len(codes)} arrivals over {offsets[-1]:.1f} sec")
+    filters = {}
+    if config != "":
+        with open(config, "r") as f:
+            filters = dict(json.loads(f.read()))
+    users = [(user, "")]
+    if pool_size > 0:
+        users = pool_users(pool_size, user_pattern, passwd_pattern)
+    bulk_policy = None
+    if bulk:
+        bulk_policy = BulkPolicy(user, need_tasks=any("tasks" in f for f in filters.values()))
+    job = make_job(users, login_parallel, "", codes, offsets, filters, max_time, workers,
+                   PollPolicy(delay), bulk_policy, log_level)
+    job["stream"] = stream
+    if nodes != "":
+        result, sent, stats = run_remote(job, nodes.split(","))
+    else:
+        result, sent, stats = run_local(job, procs)
+    result = finish_run(result, sent, stats, filters if config != "" else None,
+                        {"arrival": "replay", "trace": trace, "speedup": speedup}, True, pool_size > 0)
+    with open(fname, "w") as f:
+        f.write(json.dumps(result, indent=4))
+    if config != "":
+        assert result["passTest"]
@@ -0,0 +1,128 @@
+import click
+import csv
+import json
+import logging
+from . import submission
+from .result_sink import read_stream
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+REPORT_PERCENTILES = [("p50", 50), ("p90", 90), ("p99", 99)]
+
+
+def load_records(fnames: list) -> dict:
+    '''
+    the per-submission records of a `result.json` or of NDJSON streams
+    '''
+    if len(fnames) == 1:
+        try:
+            with open(fnames[0], "r") as f:
+                data = json.loads(f.read())
+            if isinstance(data, dict):
+                return {k: v for k, v in data.items() if isinstance(v, dict) and "scheduledAt" in v}
+        except ValueError:
+            pass
+    records, _ = read_stream(fnames)
+    return records
+
+
+def distribution(values) -> dict:
+    arr = np.asarray(values, dtype=float)
+    if arr.size == 0:
+        return {"count": 0}
+    res = {
+        "count": int(arr.size),
+        "mean": float(arr.mean()),
+        "std": float(arr.std()),
+        "min": float(arr.min()),
+    }
+    for name, q in REPORT_PERCENTILES:
+        res[name] = float(np.percentile(arr, q))
+    res["max"] = float(arr.max())
+    return res
+
+
+def build_timeline(records: dict, bucket: float = 1.0) -> list:
+    '''
+    per time bucket since the run started: submissions accepted/sec , verdicts
+    completed/sec and the submissions accepted but not judged yet at its end
+    (the estimated judge queue depth)
+    '''
+    accepted = np.asarray([r["uploadedAt"] for r in records.values() if "uploadedAt" in r], dtype=float)
+    judged = np.asarray([r["uploadedAt"] + r["time"] for r in records.values()
+                         if "uploadedAt" in r and "status" in r], dtype=float)
+    if accepted.size == 0:
+        return []
+    end = max(accepted.max(), judged.max() if judged.size != 0 else 0)
+    edges = np.arange(0, end + bucket, bucket)
+    if edges.size < 2:
+        edges = np.asarray([0, bucket])
+    acc_count, _ = np.histogram(accepted, edges)
+    jud_count, _ = np.histogram(judged, edges)
+    depth = np.cumsum(acc_count) - np.cumsum(jud_count)
+    rows = []
+    for i in range(acc_count.size):
+        rows.append({
+            "start": float(edges[i]),
+            "acceptedPerSec": float(acc_count[i] / bucket),
+            "verdictsPerSec": float(jud_count[i] / bucket),
+            "queueDepth": int(depth[i]),
+        })
+    return rows
+
+
+def build_report(records: dict, bucket: float = 1.0) -> dict:
+    '''
+    the timeline of the run and the distributions of verdict latency ,
+    judge reported `runTime` and `memoryUsage` per source file
+    '''
+    sources = {}
+    for r in records.values():
+        sources.setdefault(r.get("src", ""), []).append(r)
+    per_source = {}
+    for src, rs in sources.items():
+        done = [r for r in rs if "status" in r]
+        per_source[src] = {
+            "submissions": len(rs),
+            "verdicts": len(done),
+            "latency": distribution([r["time"] for r in done]),
+            "runTime": distribution([r["runTime"] for r in done if r.get("runTime") is not None]),
+            "memoryUsage": distribution([r["memoryUsage"] for r in done if r.get("memoryUsage") is not None]),
+        }
+    timeline = build_timeline(records, bucket)
+    done = [r for r in records.values() if "status" in r]
+    return {
+        "bucket": bucket,
+        "submissions": len(records),
+        "verdicts": len(done),
+        "peakAcceptedPerSec": max([row["acceptedPerSec"] for row in timeline], default=0),
+        "peakVerdictsPerSec": max([row["verdictsPerSec"] for row in timeline], default=0),
+        "peakQueueDepth": max([row["queueDepth"] for row in timeline], default=0),
+        "latency": distribution([r["time"] for r in done]),
+        "sources": per_source,
+        "timeline": timeline,
+    }
+
+
+@submission.command()
+@click.argument("results", type=click.Path(exists=True, dir_okay=False), nargs=-1, required=True)
+@click.option("-b", "--bucket", "bucket", type=float, default=1.0, help="the width in sec of a timeline bucket(default is 1 sec)")
+@click.option("--fname", "fname", type=str, default="report.json", help="the filename of the report(default is report.json)")
+@click.option("--csv", "csv_name", type=str, default="timeline.csv", help="the filename of the timeline csv(default is timeline.csv)")
+def report(results: tuple, bucket: float, fname: str, csv_name: str):
+    '''
+    analyse the judge throughput and verdict latency of a pressure-tester result (or its streams)
+    '''
+    if np is None:
+        raise click.ClickException("report needs numpy")
+    records = load_records(list(results))
+    rep = build_report(records, bucket)
+    logging.info(f"peak verdicts/sec:{rep['peakVerdictsPerSec']} , peak queue depth:{rep['peakQueueDepth']}")
+    with open(fname, "w") as f:
+        f.write(json.dumps(rep, indent=4))
+    with open(csv_name, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["start", "acceptedPerSec", "verdictsPerSec", "queueDepth"])
+        writer.writeheader()
+        writer.writerows(rep["timeline"])
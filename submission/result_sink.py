@@ -0,0 +1,103 @@
+import json
+import os
+import time
+
+
+def referenced_cases(filters: dict) -> set:
+    '''
+    the `(task, case)` pairs a filter of one source checks
+    '''
+    cases = set()
+    for k in (filters or {}).get("tasks", {}).keys():
+        els = str(k).split(":")
+        cases.add((int(els[0]), int(els[1])))
+    return cases
+
+
+def prune_cases(res: dict, keep: set) -> dict:
+    '''
+    empty every case of `res["tasks"]` not in `keep` in place ,
+    the indices stay the same so filters still find their cases
+    '''
+    if "tasks" not in res:
+        return res
+    if len(keep) == 0:
+        res.pop("tasks")
+        return res
+    tasks = []
+    for t, task in enumerate(res["tasks"]):
+        cases = task.get("cases", []) if isinstance(task, dict) else []
+        tasks.append({"cases": [c if (t, i) in keep else {} for i, c in enumerate(cases)]})
+    res["tasks"] = tasks
+    return res
+
+
+class ResultSink:
+    '''
+    write one compact json line per verdict to `fname`
+
+    Args:
+        flush_every: flush after so many records
+        flush_interval: flush at least every so many sec while records arrive
+        resume: keep appending to an existing `fname` instead of starting over
+    '''
+
+    def __init__(self, fname: str, flush_every: int = 100, flush_interval: float = 1.0, resume: bool = False):
+        self.fname = fname
+        self.flush_every = max(1, flush_every)
+        self.flush_interval = flush_interval
+        self.count = 0
+        self._unflushed = 0
+        self._flushed_at = time.monotonic()
+        self._fp = open(fname, "a" if resume else "w")
+
+    def write(self, record: dict):
+        self._fp.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.count += 1
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every or time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._fp.flush()
+        self._unflushed = 0
+        self._flushed_at = time.monotonic()
+
+    def close(self, end: dict = None):
+        '''
+        write the trailer record `end` (marks a run that finished) and close
+        '''
+        if self._fp is None:
+            return
+        if end is not None:
+            self._fp.write(json.dumps(dict(end, end=True), separators=(",", ":")) + "\n")
+        self._fp.flush()
+        os.fsync(self._fp.fileno())
+        self._fp.close()
+        self._fp = None
+
+
+def read_stream(fnames: list) -> (dict, list):
+    '''
+    load the verdicts of one or more streams , a broken last line is skipped
+
+    Returns:
+        the records keyed by submission id and the trailer of every stream (None if missing)
+    '''
+    records = {}
+    ends = []
+    for fname in fnames:
+        end = None
+        with open(fname, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("end"):
+                    end = record
+                    continue
+                submissionId = record.pop("id")
+                records[submissionId] = record
+        ends.append(end)
+    return records, ends
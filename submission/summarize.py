@@ -0,0 +1,55 @@
+import click
+import json
+import logging
+from . import submission
+from .pressure_tester import full_filter
+from .result_sink import read_stream
+
+
+def summarize_stream(records: dict, ends: list, filters: dict = {}) -> dict:
+    '''
+    rebuild the `pressure_tester` result from streamed verdicts ,
+    a stream without trailer means the run died before it finished
+    '''
+    result = dict(records)
+    timeouts = [k for k, v in records.items() if "status" not in v]
+    if any(end is None for end in ends):
+        result.update({"wait_status": "the run ended before all verdicts were streamed"})
+    elif any("wait_status" in end for end in ends):
+        result.update({"wait_status": "timeout expire max waiting time"})
+    all_pass = True
+    if filters != {}:
+        result, all_pass = full_filter(result, filters)
+    status_count = {}
+    for v in records.values():
+        if "status" in v:
+            status_count[str(v["status"])] = status_count.get(str(v["status"]), 0) + 1
+    result.update({"summary": {
+        "verdicts": len(records) - len(timeouts),
+        "timeouts": len(timeouts),
+        "statusCount": status_count,
+    }})
+    if filters != {}:
+        result.update({"passTest": all_pass and len(timeouts) == 0 and "wait_status" not in result})
+    return result
+
+
+@submission.command()
+@click.argument("streams", type=click.Path(exists=True, dir_okay=False), nargs=-1, required=True)
+@click.option("--cfg", "config", type=click.Path(file_okay=True), default="", help="the config file used by the run , to check the verdicts again")
+@click.option("--fname", "fname", type=str, default="result.json", help="the filename of result(default is result.json)")
+def summarize(streams: tuple, config: str, fname: str):
+    '''
+    build the result (passTest , timeouts) from the NDJSON streams of pressure-tester
+    '''
+    filters = {}
+    if config != "":
+        with open(config, "r") as f:
+            filters = dict(json.loads(f.read()))
+    records, ends = read_stream(list(streams))
+    result = summarize_stream(records, ends, filters)
+    logging.info(f"summary:{result['summary']}")
+    if "passTest" in result:
+        logging.info(f"passTest:{result['passTest']}")
+    with open(fname, "w") as f:
+        f.write(json.dumps(result, indent=4))
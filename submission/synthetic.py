@@ -0,0 +1,149 @@
+import io
+import random
+import zipfile
+from string import Template
+from .payload import PAYLOADS
+
+PROFILES = ("cpu", "mem", "io", "tle", "mle", "re")
+# the verdicts the deliberate cases should get , the others expect `ok_status`
+PROFILE_STATUS = {"tle": 3, "mle": 4, "re": 5}
+DEFAULT_MIX = "cpu=0.3,mem=0.2,io=0.2,tle=0.1,mle=0.1,re=0.1"
+# fixed so the same seed builds byte identical archives in every shard
+ZIP_DATE = (2020, 1, 1, 0, 0, 0)
+
+# every source reads the input and answers like the bundled sources ,
+# `$work` is the profile and `$salt` keeps every archive distinct
+C_MAIN = Template('''/* $salt */
+#include <$stdio>
+#include <$stdlib>
+#include <$string>
+
+int main()
+{
+	int a;
+	scanf("%d", &a);
+$work
+	printf("Hello, %d\\n", a);
+	return 0;
+}
+''')
+PY_MAIN = Template('''# $salt
+import sys
+a = input()
+$work
+print('Hello,', a)
+''')
+C_WORK = {
+    "cpu": "\tvolatile unsigned long long s = 0;\n\tfor (long long i = 0; i < ${n}LL; i++) s = s * 31 + i;\n\tfprintf(stderr, \"%llu\\n\", s);",
+    "mem": "\tsize_t n = (size_t)${mb} << 20;\n\tchar *p = (char *)malloc(n);\n\tfor (size_t i = 0; i < n; i += 4096) p[i] = (char)i;\n\tfprintf(stderr, \"%d\\n\", p[n / 2]);\n\tfree(p);",
+    "io": "\tfor (int i = 0; i < ${lines}; i++) fprintf(stderr, \"%d ${pad}\\n\", i);",
+    "tle": "\tvolatile unsigned long long s = 0;\n\tfor (;;) s++;",
+    "mle": "\tfor (;;) {\n\t\tchar *p = (char *)malloc(1 << 20);\n\t\tmemset(p, ${n} & 0xff, 1 << 20);\n\t}",
+    "re": "\tfprintf(stderr, \"%d\\n\", ${n});\n\tabort();",
+}
+PY_WORK = {
+    "cpu": "s = 0\nfor i in range(${n}):\n    s = (s * 31 + i) & 0xffffffff\nprint(s, file=sys.stderr)",
+    "mem": "b = bytearray(${mb} << 20)\nfor i in range(0, len(b), 4096):\n    b[i] = 1\nprint(len(b), file=sys.stderr)",
+    "io": "sys.stderr.write(''.join(f'{i} ${pad}\\n' for i in range(${lines})))",
+    "tle": "while True:\n    pass",
+    "mle": "h = []\nwhile True:\n    h.append(bytearray(1 << 20))",
+    "re": "raise RuntimeError(${n})",
+}
+# (file name in the archive , source template , work templates , cpu loop range)
+LANG_SOURCES = {
+    0: ("main.c", C_MAIN, C_WORK, (10 ** 6, 5 * 10 ** 7), {"stdio": "stdio.h", "stdlib": "stdlib.h", "string": "string.h"}),
+    1: ("main.cpp", C_MAIN, C_WORK, (10 ** 6, 5 * 10 ** 7), {"stdio": "cstdio", "stdlib": "cstdlib", "string": "cstring"}),
+    2: ("main.py", PY_MAIN, PY_WORK, (10 ** 4, 5 * 10 ** 5), {}),
+}
+
+
+def parse_profile_mix(spec: str) -> dict:
+    '''
+    `cpu=0.5,tle=0.5` to `{"cpu": 0.5, "tle": 0.5}`
+    '''
+    mix = {}
+    for it in spec.split(","):
+        k, v = it.split("=")
+        assert k in PROFILES, f"unknown profile {k} , use {PROFILES}"
+        mix[k] = float(v)
+    assert sum(mix.values()) > 0, "the profile weights should not all be 0"
+    return mix
+
+
+def allocate(count: int, mix: dict) -> list:
+    '''
+    `count` profiles in the proportions of `mix` (largest remainder) , so a
+    small count still gets every profile with a fair share
+    '''
+    total = sum(mix.values())
+    shares = {k: count * w / total for k, w in mix.items()}
+    counts = {k: int(v) for k, v in shares.items()}
+    rest = sorted(shares, key=lambda k: shares[k] - counts[k], reverse=True)
+    for k in rest[:count - sum(counts.values())]:
+        counts[k] += 1
+    return [k for k in mix for _ in range(counts[k])]
+
+
+def render_source(lang: int, profile: str, rng: random.Random, salt: str) -> (str, str):
+    '''
+    the file name and the source of one `profile` variant in language `lang`
+    '''
+    fname, main, work, (lo, hi), headers = LANG_SOURCES[lang]
+    params = {
+        "n": rng.randint(lo, hi),
+        "mb": rng.randint(1, 32),
+        "lines": rng.randint(100, 5000),
+        "pad": "%032x" % rng.getrandbits(128),
+    }
+    body = Template(work[profile]).substitute(params)
+    return fname, main.substitute(headers, salt=salt, work=body)
+
+
+def build_archive(fname: str, source: str) -> bytes:
+    '''
+    a zip holding `source` as `fname` , built in memory
+    '''
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(zipfile.ZipInfo(fname, ZIP_DATE), source)
+    return buf.getvalue()
+
+
+def generate(langs: list, per_lang: int, mix: str = DEFAULT_MIX, seed: int = 0, problem_id: int = 1,
+             ok_status: int = 0, expire_time: float = 0, prefix: str = "gen") -> (list, dict, dict):
+    '''
+    build `per_lang` distinct archives for every language of `langs` with the
+    profiles spread by `mix` , the same arguments always build the same archives
+
+    Returns:
+        the `(lang, problem_id, src)` work list , the `--cfg` filters expecting
+        `ok_status` for cpu , mem and io and TLE , MLE , RE for the deliberate
+        cases , and the archives keyed by their `src` name under `prefix`
+    '''
+    weights = parse_profile_mix(mix)
+    rng = random.Random(seed)
+    codes, filters, archives = [], {}, {}
+    for lang in langs:
+        assert lang in LANG_SOURCES, f"no templates for language {lang} , use {sorted(LANG_SOURCES)}"
+        profiles = allocate(per_lang, weights)
+        rng.shuffle(profiles)
+        for i, profile in enumerate(profiles):
+            src = f"{prefix}/{lang}-{profile}-{i}.zip"
+            salt = f"{src} {rng.getrandbits(64):016x}"
+            archives[src] = build_archive(*render_source(lang, profile, rng, salt))
+            expect = {"languageType": lang, "problem_id": problem_id, "status": PROFILE_STATUS.get(profile, ok_status)}
+            if profile in PROFILE_STATUS:
+                expect["score"] = 0
+            if expire_time > 0:
+                expect["expireTime"] = expire_time
+            filters[src] = expect
+            codes.append((lang, problem_id, src))
+    return codes, filters, archives
+
+
+def register(archives: dict):
+    '''
+    serve the generated archives from memory to `async_submit`
+    '''
+    for src, data in archives.items():
+        PAYLOADS.put(src, data)
@@ -0,0 +1,57 @@
+import math
+import pytest
+from submission.arrival import ARRIVAL_MODES, build_schedule, summarize_lag
+
+
+@pytest.mark.parametrize("mode", ARRIVAL_MODES)
+@pytest.mark.parametrize("count", [0, 1, 37])
+def test_counts_and_monotonic(mode, count):
+    offsets = build_schedule(mode, count, rate=5, rate_end=20, steps=4, seed=1)
+    assert len(offsets) == count
+    assert all(b >= a for a, b in zip(offsets, offsets[1:]))
+    assert count == 0 or offsets[0] == 0
+
+
+def test_burst_and_constant():
+    assert build_schedule("burst", 3) == [0.0, 0.0, 0.0]
+    assert build_schedule("constant", 4, rate=2) == [0, 0.5, 1.0, 1.5]
+
+
+def test_ramp_closed_form():
+    # rate 1 -> 3 over D = 2 * 20 / (1 + 3) = 10 sec , so n(t) = t + t^2 / 10
+    offsets = build_schedule("ramp", 20, rate=1, rate_end=3)
+    for k, t in enumerate(offsets):
+        assert t + t * t / 10 == pytest.approx(k)
+    assert offsets[2] == pytest.approx((-10 + math.sqrt(180)) / 2)
+    # a flat ramp is the constant schedule , a falling one works too
+    assert build_schedule("ramp", 5, rate=2, rate_end=2) == build_schedule("constant", 5, rate=2)
+    falling = build_schedule("ramp", 20, rate=3, rate_end=1)
+    for k, t in enumerate(falling):
+        assert 3 * t - t * t / 10 == pytest.approx(k)
+
+
+def test_step_closed_form():
+    offsets = build_schedule("step", 30, rate=1, rate_end=3, steps=3)
+    expect = [i for i in range(10)] + [10 + i / 2 for i in range(10)] + [15 + i / 3 for i in range(10)]
+    assert offsets == pytest.approx(expect)
+    assert build_schedule("step", 6, rate=2, steps=1) == build_schedule("constant", 6, rate=2)
+
+
+def test_poisson_seeded():
+    offsets = build_schedule("poisson", 20001, rate=10, seed=7)
+    assert offsets == build_schedule("poisson", 20001, rate=10, seed=7)
+    assert offsets[-1] / 20000 == pytest.approx(0.1, rel=0.03)
+    assert offsets != build_schedule("poisson", 20001, rate=10, seed=8)
+
+
+def test_bad_input():
+    with pytest.raises(AssertionError):
+        build_schedule("constant", 3, rate=0)
+    with pytest.raises(Exception):
+        build_schedule("zigzag", 3, rate=1)
+
+
+def test_summarize_lag():
+    assert summarize_lag([]) == {"count": 0}
+    s = summarize_lag([0.3, 0.1, 0.2])
+    assert s["count"] == 3 and s["p50"] == 0.2 and s["max"] == 0.3 and s["mean"] == pytest.approx(0.2)
@@ -0,0 +1,69 @@
+import asyncio
+from aiohttp import web
+from cores import login
+from cores.session_pool import SessionPool
+from mock.server import MockConfig, MockNOJ
+from submission.checkpoint import Checkpoint, load_checkpoint
+from submission.pipeline import pressure_pipeline
+from submission.poller import PollPolicy
+from submission.result_sink import ResultSink, read_stream
+
+COUNT = 20
+
+
+def test_resume_submits_every_planned_submission_once(tmp_path, monkeypatch):
+    src = str(tmp_path / "a.zip")
+    with open(src, "wb") as f:
+        f.write(b"PK\x05\x06" + bytes(18))
+    codes = [(0, 1, src)] * COUNT
+    # half of the plan is due before the first run is killed
+    offsets = [0.05 * i if i < COUNT // 2 else 5 + 0.01 * i for i in range(COUNT)]
+    ckpt = str(tmp_path / "run.ckpt")
+    stream = str(tmp_path / "run.ndjson")
+    noj = MockNOJ(MockConfig(judges=2, latency="const:0.3", seed=0))
+
+    async def run(resumed: dict, kill_after: float = None):
+        pool = SessionPool([("u", "x")], 1)
+        checkpoint = Checkpoint(ckpt, resumed is not None)
+        sink = ResultSink(stream, 1, resume=resumed is not None)
+        plan = resumed["plan"] if resumed is not None else {"codes": codes, "offsets": offsets, "filters": {}}
+        run = pressure_pipeline(pool, [tuple(c) for c in plan["codes"]], plan["offsets"], plan["filters"], 30, 8,
+                                PollPolicy(delay=0.02, jitter=0), sink=sink, checkpoint=checkpoint, resumed=resumed)
+        try:
+            if kill_after is None:
+                return await run
+            await asyncio.wait_for(run, kill_after)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # a killed run leaves its files without the trailer
+            checkpoint.close(None if kill_after is not None else {})
+            sink.close(None if kill_after is not None else {})
+
+    async def main():
+        runner = web.AppRunner(noj.make_app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        monkeypatch.setattr(login, "cfg", {"API_BASE": f"http://127.0.0.1:{runner.addresses[0][1]}/api"})
+        try:
+            await run(None, kill_after=1.0)
+            first = load_checkpoint(ckpt)
+            assert 0 < len(first["sent"]) < COUNT and not first["ended"]
+            # some were still judging , they are polled again instead of sent again
+            assert len(first["done"]) < len(first["sent"])
+            # the unsent half is due right away on resume
+            return first, await run(first)
+        finally:
+            await runner.cleanup()
+    first, (result, sent, stats) = asyncio.run(main())
+    state = load_checkpoint(ckpt)
+    assert state["ended"]
+    assert sorted(state["sent"]) == list(range(COUNT))
+    ids = [info["id"] for info in state["sent"].values()]
+    assert len(set(ids)) == COUNT
+    # the server saw each planned submission once
+    assert len(noj.subs) == COUNT and set(noj.subs) == set(ids)
+    assert set(result) == set(ids) and all(r["status"] == 0 for r in result.values())
+    records, ends = read_stream([stream])
+    assert set(records) == set(ids) and ends[0] is not None
@@ -0,0 +1,66 @@
+import math
+import pytest
+np = pytest.importorskip("numpy")
+from submission.compare import bootstrap_change, compare_metric, compare_runs, mann_whitney
+
+
+def test_mann_whitney_separated():
+    mw = mann_whitney(np.array([1.0, 2.0, 3.0]), np.array([4.0, 5.0, 6.0]))
+    assert mw["u"] == 9 and mw["superiority"] == 1
+    # z = (9 - 4.5 - 0.5) / sqrt(5.25)
+    assert mw["pValue"] == pytest.approx(0.5 * math.erfc(4 / math.sqrt(5.25) / math.sqrt(2)))
+    assert mw["pValue"] == pytest.approx(0.0404, abs=1e-4)
+
+
+def test_mann_whitney_ties():
+    # ranks of 1,1,2,2,2,3 are 1.5,1.5,4,4,4,6
+    mw = mann_whitney(np.array([1.0, 2.0, 2.0]), np.array([1.0, 2.0, 3.0]))
+    assert mw["u"] == 1.5 + 4 + 6 - 6
+    var = 9 / 12 * (7 - (6 + 24) / 30)
+    assert mw["pValue"] == pytest.approx(0.5 * math.erfc((5.5 - 4.5 - 0.5) / math.sqrt(var) / math.sqrt(2)))
+
+
+def test_mann_whitney_identical():
+    same = np.full(5, 2.0)
+    mw = mann_whitney(same, same)
+    assert mw["superiority"] == 0.5 and mw["pValue"] == 1.0
+
+
+def test_bootstrap_constant():
+    res = bootstrap_change(np.full(20, 2.0), np.full(30, 3.0), "p50", 200, 0.05, np.random.default_rng(0))
+    assert res["baseline"] == 2 and res["candidate"] == 3
+    assert res["change"] == pytest.approx(0.5)
+    assert res["low"] == pytest.approx(0.5) and res["high"] == pytest.approx(0.5)
+
+
+def test_bootstrap_zero_baseline():
+    res = bootstrap_change(np.zeros(10), np.ones(10), "mean", 50, 0.05, np.random.default_rng(0))
+    assert res["change"] is None and res["low"] is None
+
+
+def test_compare_metric_gates():
+    rng = np.random.default_rng(1)
+    base = rng.normal(1.0, 0.05, 200)
+    slow = rng.normal(1.3, 0.05, 200)
+    same = rng.normal(1.0, 0.05, 200)
+    for method in ("bootstrap", "mannwhitney", "both"):
+        assert compare_metric(base, slow, 0.1, "p50", method, 0.05, 500, np.random.default_rng(0))["regressed"]
+        assert not compare_metric(base, same, 0.1, "p50", method, 0.05, 500, np.random.default_rng(0))["regressed"]
+    # a negative threshold only reports
+    assert not compare_metric(base, slow, -1, "p50", "both", 0.05, 500, np.random.default_rng(0))["regressed"]
+
+
+def test_compare_runs_matches_sources():
+    def run(scale: float, extra: str) -> dict:
+        records = {}
+        for i in range(40):
+            records[f"a{i}"] = {"src": "a.zip", "status": 0, "time": scale * (1 + i / 100), "runTime": 10, "memoryUsage": 100}
+        records["x"] = {"src": extra, "status": 0, "time": 1}
+        records["pending"] = {"src": "a.zip"}
+        return records
+    thresholds = {"latency": 0.1, "runTime": 0.1, "memoryUsage": 0.1}
+    res = compare_runs(run(1, "b.zip"), run(2, "c.zip"), thresholds, resamples=300)
+    assert res["unmatched"] == {"baseline": ["b.zip"], "candidate": ["c.zip"]}
+    assert res["overall"]["baseline"] == 40
+    assert len(res["regressions"]) == 1 and res["regressions"][0].startswith("overall.latency")
+    assert compare_runs(run(1, "b.zip"), run(1, "b.zip"), thresholds, resamples=300)["regressions"] == []
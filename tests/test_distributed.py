@@ -0,0 +1,61 @@
+from cores.metrics import PhaseMetrics
+from cores.resilience import ErrorCounters
+from submission.distributed import merge_parts, split_job
+
+
+def make_job(n: int) -> dict:
+    return {"codes": [[0, 1, f"s{i}.zip"] for i in range(n)], "offsets": [i * 0.1 for i in range(n)],
+            "stream": "out.ndjson", "checkpoint": "", "trace": "t.json"}
+
+
+def test_split_keeps_every_submission_once():
+    job = make_job(10)
+    shards = split_job(job, 3)
+    assert len(shards) == 3
+    pairs = sorted((tuple(c), o) for s in shards for c, o in zip(s["codes"], s["offsets"]))
+    assert pairs == sorted((tuple(c), o) for c, o in zip(job["codes"], job["offsets"]))
+    assert [s["stream"] for s in shards] == ["out.ndjson.0", "out.ndjson.1", "out.ndjson.2"]
+    assert [s["trace"] for s in shards] == ["t.json.0", "t.json.1", "t.json.2"]
+    assert all(s["checkpoint"] == "" for s in shards)
+    assert job["stream"] == "out.ndjson"
+
+
+def test_split_never_makes_empty_shards():
+    assert len(split_job(make_job(2), 8)) == 2
+    one = split_job(make_job(0), 4)
+    assert len(one) == 1 and one[0]["stream"] == "out.ndjson"
+    assert split_job(make_job(5), 1)[0]["stream"] == "out.ndjson"
+
+
+def make_part(ids: list, polls: int, timeout: bool = False) -> tuple:
+    metrics = PhaseMetrics()
+    errors = ErrorCounters()
+    for _ in ids:
+        metrics.record("create", 0.01)
+        errors.request("create")
+    errors.error("create", "server")
+    result = {i: {"status": 0} for i in ids}
+    if timeout:
+        result["wait_status"] = "timeout expire max waiting time"
+    stats = {"polling": {"requests": polls * len(ids), "listRequests": 1, "verdicts": len(ids), "meanPolls": polls, "maxPolls": polls},
+             "latency": metrics.dump(), "errors": errors.dump(), "breaker": {"opens": 1, "openTime": 2.0},
+             "failed": [{"index": 0}], "elapsed": 3.0 + polls}
+    return result, {i: {"src": ""} for i in ids}, stats
+
+
+def test_merge_parts():
+    result, sent, stats = merge_parts([make_part(["a", "b"], 2), make_part(["c"], 5, timeout=True)])
+    assert set(sent) == {"a", "b", "c"}
+    assert result["wait_status"] == "timeout expire max waiting time"
+    assert stats["polling"]["requests"] == 9 and stats["polling"]["verdicts"] == 3
+    assert stats["polling"]["meanPolls"] == 3 and stats["polling"]["maxPolls"] == 5
+    assert stats["polling"]["shards"] == 2
+    assert PhaseMetrics.load(stats["latency"]).summary()["phases"]["create"]["count"] == 3
+    assert ErrorCounters.load(stats["errors"]).summary()["create"]["errors"] == 2
+    assert stats["breaker"] == {"opens": 2, "openTime": 2.0}
+    assert len(stats["failed"]) == 2 and stats["elapsed"] == 8.0
+
+
+def test_merge_without_timeout():
+    result, _, _ = merge_parts([make_part(["a"], 1)])
+    assert "wait_status" not in result
@@ -0,0 +1,61 @@
+import random
+import pytest
+from submission import expectation
+from submission.expectation import ExpectationPlan
+
+FILTERS = {
+    "status": 0,
+    "score": 100,
+    "MaxRunTime": 500, "MinRunTime": 0,
+    "tasks": {
+        "0:0": {"status": 0, "exitCode": 0, "stdout": "ok\n", "MaxExecTime": 200, "MinExecTime": 10},
+        "1:1": {"MaxMemoryUsage": 4096, "MinMemoryUsage": 0, "status": 0},
+    },
+}
+
+
+def make_result(rng: random.Random) -> dict:
+    def case() -> dict:
+        if rng.random() < 0.05:
+            return {}
+        return {"status": rng.choice([0, 0, 0, 1]), "exitCode": rng.choice([0, 0, 139]),
+                "stdout": rng.choice(["ok\n", "ok\n", "no\n"]), "stderr": "",
+                "execTime": rng.randint(0, 300), "memoryUsage": rng.randint(0, 5000)}
+    tasks = [{"cases": [case()]}]
+    if rng.random() < 0.9:
+        tasks.append({"cases": [case(), case()] if rng.random() < 0.9 else [case()]})
+    res = {"status": rng.choice([0, 0, 1]), "score": rng.choice([100, 100, 0]), "runTime": rng.randint(0, 600),
+           "memoryUsage": rng.randint(0, 5000), "tasks": tasks}
+    if rng.random() < 0.02:
+        del res["runTime"]
+    return res
+
+
+@pytest.mark.parametrize("rows", [10, 500])
+def test_run_matches_check(rows):
+    rng = random.Random(rows)
+    targets = [make_result(rng) for _ in range(rows)]
+    plan = ExpectationPlan(FILTERS)
+    assert plan.run(targets) == [plan.check(t) for t in targets]
+
+
+def test_run_without_numpy(monkeypatch):
+    rng = random.Random(1)
+    targets = [make_result(rng) for _ in range(200)]
+    plan = ExpectationPlan(FILTERS)
+    vectorized = plan.run(targets)
+    monkeypatch.setattr(expectation, "np", None)
+    assert plan.run(targets) == vectorized
+
+
+def test_failure_messages():
+    plan = ExpectationPlan({"status": 0, "tasks": {"0:1": {"MaxExecTime": 10, "MinExecTime": 0}}})
+    fails = plan.check({"status": 1, "tasks": [{"cases": [{"execTime": 20}]}]})
+    assert fails == ["failure on status : expected 0 but got 1", "failure on task 0 case 1: data does not exist"]
+    fails = plan.check({"status": 0, "tasks": [{"cases": [{}, {"execTime": 20}]}]})
+    assert fails == ["failure on task 0 case 1 execTime : expected between 0 and 10 but got 20"]
+
+
+def test_max_without_min():
+    with pytest.raises(Exception):
+        ExpectationPlan({"MaxRunTime": 10})
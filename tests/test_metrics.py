@@ -0,0 +1,60 @@
+import json
+import random
+from cores.metrics import LatencyHistogram, PhaseMetrics, _bucket, _bucket_top
+
+
+def test_bucket_bounds():
+    prev = -1
+    for v in list(range(2000)) + [random.Random(0).randint(0, 10 ** 9) for _ in range(2000)]:
+        idx = _bucket(v)
+        top = _bucket_top(idx)
+        assert v <= top
+        # log-linear: a bucket is narrower than 1/128 of its values
+        assert top - v <= max(0, v) / 128
+        if v < 2000:
+            assert idx >= prev
+            prev = idx
+
+
+def test_percentiles_are_close():
+    rng = random.Random(1)
+    values = sorted(rng.expovariate(10) for _ in range(10000))
+    h = LatencyHistogram()
+    for v in values:
+        h.record(v)
+    for q in (50, 90, 99):
+        exact = values[int(q / 100 * len(values)) - 1]
+        assert abs(h.percentile(q) - exact) <= exact / 100 + 1e-6
+    assert h.summary()["max"] == int(values[-1] * 1e6) / 1e6
+
+
+def test_dump_load_round_trip():
+    h = LatencyHistogram()
+    for v in (0.001, 0.002, 0.5, 3.0):
+        h.record(v)
+    back = LatencyHistogram.load(json.loads(json.dumps(h.dump())))
+    assert back.summary() == h.summary()
+    assert back.counts == h.counts
+    assert LatencyHistogram.load(LatencyHistogram().dump()).summary() == {"count": 0}
+
+
+def test_merge_equals_recording_together():
+    rng = random.Random(2)
+    values = [rng.uniform(0, 2) for _ in range(3000)]
+    whole, a, b = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for i, v in enumerate(values):
+        whole.record(v)
+        (a if i % 3 else b).record(v)
+    assert a.merge(b).summary() == whole.summary()
+    assert LatencyHistogram().merge(whole).summary() == whole.summary()
+
+
+def test_phase_metrics_by_source():
+    m = PhaseMetrics()
+    m.record("create", 0.01, "a.zip")
+    m.record("create", 0.03)
+    other = PhaseMetrics.load(json.loads(json.dumps(m.dump())))
+    merged = PhaseMetrics().merge(m).merge(other)
+    summary = merged.summary()
+    assert summary["phases"]["create"]["count"] == 4
+    assert summary["sources"]["a.zip"]["create"]["count"] == 2
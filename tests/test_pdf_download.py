@@ -0,0 +1,61 @@
+import asyncio
+import aiohttp
+from aiohttp import web
+from cores import login
+from cores.resilience import RESILIENCE
+from submission import pdf_download
+from submission.pdf_download import Manifest, download_pdf
+
+BODY = b"%PDF-" + bytes(range(256)) * 40
+
+
+def run(tmp_path, monkeypatch, etag: str, known: dict, part: bytes) -> tuple:
+    seen = []
+
+    async def handler(request: web.Request) -> web.Response:
+        seen.append(dict(request.headers))
+        headers = {"ETag": etag} if etag else {}
+        rng = request.headers.get("Range", "")
+        if rng.startswith("bytes=") and request.headers.get("If-Range", etag) == etag:
+            begin = int(rng[6:].rstrip("-"))
+            return web.Response(status=206, body=BODY[begin:], headers=headers)
+        return web.Response(body=BODY, headers=headers)
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/api/submission/{sid}/pdf/{item}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        monkeypatch.setattr(pdf_download, "get_api_base", lambda: f"http://127.0.0.1:{runner.addresses[0][1]}/api")
+        dest = str(tmp_path / "s.pdf")
+        with open(dest + ".part", "wb") as f:
+            f.write(part)
+        manifest = Manifest(str(tmp_path))
+        manifest.put(dest, known)
+        RESILIENCE.reset()
+        try:
+            async with aiohttp.ClientSession() as sess:
+                res = await download_pdf(sess, "s", 0, dest, manifest)
+        finally:
+            await runner.cleanup()
+        with open(dest, "rb") as f:
+            return res, f.read()
+    res, data = asyncio.run(main())
+    return res, data, seen
+
+
+def test_resume_with_validator(tmp_path, monkeypatch):
+    res, data, seen = run(tmp_path, monkeypatch, '"v1"', {"partial": {"etag": '"v1"', "lastModified": None}}, BODY[:1000])
+    assert res == {"status": "resumed", "bytes": len(BODY) - 1000, "size": len(BODY)}
+    assert data == BODY
+    assert seen[0]["Range"] == "bytes=1000-" and seen[0]["If-Range"] == '"v1"'
+    assert RESILIENCE.counters.summary()["pdf"]["requests"] == 1
+
+
+def test_no_validator_starts_over(tmp_path, monkeypatch):
+    # the part is of an older file , its tail must not be glued to it
+    res, data, seen = run(tmp_path, monkeypatch, "", {"partial": {"etag": None, "lastModified": None}}, b"OLD!" * 250)
+    assert res["status"] == "downloaded" and data == BODY
+    assert "Range" not in seen[0]
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from submission import poller
+from submission.poller import BulkPolicy, PollPolicy, StatusPoller
+from cores.rate_limit import TokenBucket
+
+
+class StubNOJ:
+    '''
+    a submission is pending until it was polled `polls_needed` times (or is
+    in `judged`) , the list shows the `listed` ones
+    '''
+
+    def __init__(self, monkeypatch, polls_needed: dict = None, listed: set = (), judged: set = ()):
+        self.polls_needed = polls_needed or {}
+        self.listed = set(listed)
+        self.judged = set(judged)
+        self.polls = {}
+        self.list_calls = 0
+        self.stamps = []
+        monkeypatch.setattr(poller, "async_get_status", self.get_status)
+        monkeypatch.setattr(poller, "async_list_submissions", self.list_submissions)
+
+    def status(self, sid: str) -> int:
+        if sid in self.judged or self.polls.get(sid, 0) >= self.polls_needed.get(sid, 1):
+            return 0
+        return -1
+
+    async def get_status(self, sess, sid, delay=None, src=None):
+        self.polls[sid] = self.polls.get(sid, 0) + 1
+        self.stamps.append((sid, time.monotonic()))
+        return {"id": sid, "status": self.status(sid), "score": 100}
+
+    async def list_submissions(self, sess, offset=0, count=100, problem_id=None, username=None):
+        self.list_calls += 1
+        self.stamps.append(("list", time.monotonic()))
+        subs = [{"id": sid, "status": 0 if sid in self.judged else -1} for sid in sorted(self.listed)]
+        return subs[offset:offset + count], len(subs)
+
+
+def test_next_delay_grows_and_caps():
+    policy = PollPolicy(delay=0.1, backoff=2, max_delay=0.5, jitter=0)
+    assert [policy.next_delay(n) for n in range(5)] == [0.1, 0.2, 0.4, 0.5, 0.5]
+    jittered = PollPolicy(delay=1, backoff=1, jitter=0.1)
+    assert all(0.9 <= jittered.next_delay(3) <= 1.1 for _ in range(100))
+
+
+def test_backoff_per_submission(monkeypatch):
+    noj = StubNOJ(monkeypatch, {"slow": 4, "late": 1})
+
+    async def main():
+        p = StatusPoller(None, 4, PollPolicy(delay=0.02, backoff=2, max_delay=1, jitter=0))
+        p.start()
+        begin = time.monotonic()
+        p.track("slow")
+        await asyncio.sleep(0.1)
+        # a later submission starts from the initial delay , not from the backoff of the others
+        late_at = time.monotonic()
+        p.track("late")
+        await asyncio.wait_for(p.wait(), 5)
+        await p.stop()
+        return p, begin, late_at
+    p, begin, late_at = asyncio.run(main())
+    slow = [t - begin for sid, t in noj.stamps if sid == "slow"]
+    gaps = [b - a for a, b in zip(slow, slow[1:])]
+    assert len(slow) == 4
+    # 0.02 , then 0.04 , 0.08 , 0.16
+    assert all(b > a * 1.5 for a, b in zip(gaps, gaps[1:]))
+    late = [t for sid, t in noj.stamps if sid == "late"]
+    assert late[0] - late_at < 0.04
+    assert p.results["slow"]["polls"] == 4 and p.results["late"]["polls"] == 1
+    assert p.summary()["requests"] == 5
+
+
+def test_budget_caps_requests_per_second(monkeypatch):
+    noj = StubNOJ(monkeypatch, {f"s{i}": 1000 for i in range(50)})
+
+    async def main():
+        p = StatusPoller(None, 16, PollPolicy(delay=0.001, backoff=1, jitter=0, budget=50))
+        p.start()
+        for i in range(50):
+            p.track(f"s{i}")
+        await asyncio.sleep(0.5)
+        p.expire_all()
+        await p.stop()
+        return p
+    p = asyncio.run(main())
+    # one full bucket (burst of 50) plus 50/sec for 0.5 sec
+    assert 50 <= p.requests <= 50 + 25 + 3
+    assert all(r == {"polls": r["polls"]} for r in p.results.values())
+    assert len(p.pending) == 0
+
+
+def test_token_bucket_rate():
+    async def main():
+        bucket = TokenBucket(100, burst=1)
+        begin = time.monotonic()
+        for _ in range(21):
+            await bucket.acquire()
+        return time.monotonic() - begin
+    assert 0.18 <= asyncio.run(main()) < 0.5
+
+
+def test_expire_all_reports_pending(monkeypatch):
+    StubNOJ(monkeypatch, {"x": 1000})
+    seen = []
+
+    async def main():
+        p = StatusPoller(None, 2, PollPolicy(delay=10), on_result=lambda sid, res: seen.append(sid))
+        p.start()
+        p.track("x")
+        p.track("y")
+        p.expire_all()
+        await asyncio.wait_for(p.wait(), 1)
+        await p.stop()
+        return p
+    p = asyncio.run(main())
+    assert p.results == {"x": {"polls": 0}, "y": {"polls": 0}}
+    assert sorted(seen) == ["x", "y"] and p.summary()["verdicts"] == 0
+
+
+def test_bulk_sweep_and_straggler(monkeypatch):
+    # "a" and "b" are judged and listed , "gone" never shows up in the pages
+    noj = StubNOJ(monkeypatch, {"gone": 1}, listed={"a", "b", "other"}, judged={"a", "b"})
+
+    async def main():
+        bulk = BulkPolicy(interval=0.02, page_size=2, straggler_after=0.3)
+        p = StatusPoller(None, 4, PollPolicy(delay=0.01, jitter=0), bulk)
+        p.start()
+        begin = time.monotonic()
+        for sid in ("a", "b", "gone"):
+            p.track(sid)
+        await asyncio.wait_for(p.wait(), 5)
+        await p.stop()
+        return p, begin
+    p, begin = asyncio.run(main())
+    assert "a" not in noj.polls and "b" not in noj.polls
+    assert p.results["a"]["status"] == 0 and p.results["a"]["polls"] == 0
+    # only the missing one is polled by id , once it turned a straggler
+    assert noj.polls == {"gone": 1}
+    gone_at = [t for sid, t in noj.stamps if sid == "gone"][0]
+    assert gone_at - begin >= 0.3
+    assert p.list_requests == noj.list_calls >= 2
@@ -0,0 +1,42 @@
+from cores.resilience import ApiError
+from submission import rejudge
+from submission.rejudge import seq_bulk_rejudge
+
+
+def stub(monkeypatch, fail: set, clock: list = None):
+    sent = []
+
+    def seq_rejudge(sess, submissionId, delay=None):
+        sent.append(submissionId)
+        if submissionId in fail:
+            raise ApiError("rejudge", "client", 403, "no right")
+
+    def seq_get_status(sess, submissionId):
+        if clock is not None:
+            clock[0] += 1
+        return {"id": submissionId, "status": 0, "score": 100}
+
+    monkeypatch.setattr(rejudge, "seq_rejudge", seq_rejudge)
+    monkeypatch.setattr(rejudge, "seq_get_status", seq_get_status)
+    return sent
+
+
+def test_failed_rejudge_is_recorded(monkeypatch):
+    sent = stub(monkeypatch, {"b"})
+    result = seq_bulk_rejudge(None, ["a", "b", "c"], 0, 60)
+    assert sent == ["a", "b", "c"]
+    assert result["a"]["status"] == 0 and result["c"]["status"] == 0
+    assert "403" in result["b"]["error"]
+    assert result["throughput"]["verdicts"] == 2
+
+
+def test_no_rejudge_after_max_time(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(rejudge.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(rejudge.time, "sleep", lambda sec: None)
+    sent = stub(monkeypatch, set(), clock)
+    # every status poll takes 1 sec
+    result = seq_bulk_rejudge(None, ["a", "b", "c", "d"], 0, 2)
+    assert sent == ["a", "b"]
+    assert result["wait_status"] == "timeout expire max waiting time"
+    assert "c" not in result and result["throughput"]["verdicts"] == 2
@@ -0,0 +1,133 @@
+import asyncio
+import pytest
+from cores.resilience import ApiError, CircuitBreaker, Resilience, RetryPolicy
+
+
+def make(threshold: int = 2, cooldown: float = 0.0) -> Resilience:
+    r = Resilience()
+    r.policy = RetryPolicy(retries=0)
+    r.breaker = CircuitBreaker(threshold=threshold, cooldown=cooldown, max_wait=5.0)
+    return r
+
+
+def fail(kind: str):
+    async def attempt():
+        raise ApiError("x", kind)
+    return attempt
+
+
+async def ok():
+    return "ok"
+
+
+def test_opens_after_threshold():
+    b = CircuitBreaker(threshold=2)
+    b.failure()
+    assert b.state == "closed"
+    b.failure()
+    assert b.state == "open" and b.opens == 1
+
+
+def test_success_while_open():
+    # a request sent before the circuit opened may still succeed
+    b = CircuitBreaker(threshold=2)
+    b.failure()
+    b.failure()
+    b.success()
+    assert b.state == "closed" and b.failures == 0
+
+
+def test_non_transient_while_open():
+    r = make(cooldown=60.0)
+
+    async def main():
+        async def answered_late():
+            # admitted before the circuit opened , answered after
+            r.breaker.failure()
+            r.breaker.failure()
+            raise ApiError("x", "client", 404)
+        with pytest.raises(ApiError):
+            await r.call("x", answered_late)
+    asyncio.run(main())
+    assert r.breaker.state == "closed"
+
+
+def test_probe_closes_and_wakes_waiters():
+    r = make()
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(ApiError):
+                await r.call("x", fail("server"))
+        assert r.breaker.state == "open"
+        return await asyncio.gather(*[r.call("x", ok) for _ in range(5)])
+    assert asyncio.run(main()) == ["ok"] * 5
+    assert r.breaker.state == "closed"
+
+
+def test_failed_probe_opens_again():
+    r = make()
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(ApiError):
+                await r.call("x", fail("server"))
+        with pytest.raises(ApiError):
+            await r.call("x", fail("timeout"))
+        assert r.breaker.state == "open"
+        assert await r.call("x", ok) == "ok"
+    asyncio.run(main())
+    assert r.breaker.state == "closed"
+
+
+def test_unexpected_probe_error_releases():
+    r = make()
+
+    async def broken():
+        raise ValueError("not an api failure")
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(ApiError):
+                await r.call("x", fail("server"))
+        with pytest.raises(ValueError):
+            await r.call("x", broken)
+        assert r.breaker.state == "open"
+        assert await asyncio.wait_for(r.call("x", ok), 1) == "ok"
+    asyncio.run(main())
+
+
+def test_cancelled_probe_releases():
+    r = make()
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def hang():
+            gate.set()
+            await asyncio.sleep(60)
+
+        for _ in range(2):
+            with pytest.raises(ApiError):
+                await r.call("x", fail("server"))
+        probe = asyncio.ensure_future(r.call("x", hang))
+        await gate.wait()
+        waiter = asyncio.ensure_future(r.call("x", ok))
+        await asyncio.sleep(0)
+        probe.cancel()
+        assert await asyncio.wait_for(waiter, 1) == "ok"
+    asyncio.run(main())
+    assert r.breaker.state == "closed"
+
+
+def test_counters():
+    r = make(threshold=0)
+
+    async def main():
+        with pytest.raises(ApiError):
+            await r.call("x", fail("throttled"))
+        await r.call("x", ok)
+    asyncio.run(main())
+    s = r.counters.summary()
+    assert s["x"]["requests"] == 2 and s["x"]["kinds"] == {"throttled": 1}
+    assert s["total"]["errorRate"] == 0.5
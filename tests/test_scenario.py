@@ -0,0 +1,48 @@
+import asyncio
+import time
+from scenario import engine
+from scenario.engine import ACTIONS, run_scenario
+
+
+class StubPool:
+    async def open(self):
+        return self
+
+    async def close(self):
+        pass
+
+    def username(self, i: int) -> str:
+        return f"u{i}"
+
+    def session(self, i: int):
+        return None
+
+
+def test_skipping_users_do_not_starve_the_others(monkeypatch):
+    async def nothing(vu, step):
+        return False
+
+    async def broken(vu, step):
+        raise ValueError("fails without awaiting")
+
+    async def tick(vu, step):
+        await asyncio.sleep(0.01)
+
+    monkeypatch.setitem(ACTIONS, "nothing", nothing)
+    monkeypatch.setitem(ACTIONS, "broken", broken)
+    monkeypatch.setitem(ACTIONS, "tick", tick)
+    monkeypatch.setattr(engine, "IDLE_SEC", 0.05)
+    spec = {"virtualUsers": 3, "duration": 0.5, "grace": 1,
+            "behaviours": [{"name": "idle", "steps": [{"action": "nothing"}, {"action": "broken"}]},
+                           {"name": "busy", "steps": [{"action": "tick"}, {"think": "const:0"}]}]}
+    begin = time.monotonic()
+    # users 0 and 2 idle , user 1 is busy with seed 3
+    report = asyncio.run(run_scenario(spec, StubPool(), seed=3))
+    assert time.monotonic() - begin < 1.0
+    assert report["behaviours"]["busy"] >= 1 and report["behaviours"]["idle"] >= 1
+    actions = report["actions"]
+    assert actions["tick"]["count"] >= 10
+    assert actions["nothing"]["skipped"] >= 1 and actions["broken"]["errors"] >= 1
+    # every idle user pauses after each skipped or failed step
+    idle = report["behaviours"]["idle"]
+    assert actions["nothing"]["skipped"] + actions["broken"]["errors"] <= idle * (0.5 / 0.05 + 2)
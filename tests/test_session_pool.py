@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from aiohttp import web
+from cores import login
+from cores.resilience import ApiError, RESILIENCE
+from cores.session_pool import SessionPool
+
+
+async def serve(handler):
+    app = web.Application()
+    app.router.add_post("/api/auth/session", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}/api"
+
+
+def test_failed_login_closes_the_pool(monkeypatch):
+    async def handler(request: web.Request) -> web.Response:
+        body = await request.json()
+        if body["username"] == "bad":
+            return web.json_response({"message": "wrong password"}, status=401)
+        await asyncio.sleep(0.05)
+        return web.json_response({"message": "ok"})
+
+    async def main():
+        runner, base = await serve(handler)
+        monkeypatch.setattr(login, "cfg", {"API_BASE": base})
+        RESILIENCE.reset()
+        pool = SessionPool([("a", "x"), ("bad", "x"), ("b", "x")], parallel=3)
+        try:
+            with pytest.raises(ApiError):
+                await pool.open()
+            assert pool.sessions == [] and pool.connector is None
+        finally:
+            await runner.cleanup()
+    asyncio.run(main())
+
+
+def test_open_and_close(monkeypatch):
+    async def handler(request: web.Request) -> web.Response:
+        return web.json_response({"message": "ok"})
+
+    async def main():
+        runner, base = await serve(handler)
+        monkeypatch.setattr(login, "cfg", {"API_BASE": base})
+        try:
+            async with SessionPool([(f"u{i}", "x") for i in range(4)], parallel=2) as pool:
+                assert len(pool) == 4
+                assert [pool.next()[0] for _ in range(5)] == ["u0", "u1", "u2", "u3", "u0"]
+            assert pool.connector is None
+        finally:
+            await runner.cleanup()
+    asyncio.run(main())
+
+
+def test_explicit_passwords_need_no_config(monkeypatch, tmp_path):
+    async def handler(request: web.Request) -> web.Response:
+        return web.json_response({"message": "ok"})
+
+    def no_config():
+        raise FileNotFoundError(login.CFG_FILE)
+
+    async def main():
+        runner, base = await serve(handler)
+        monkeypatch.setattr(login, "cfg", {})
+        monkeypatch.setattr(login, "CFG_FILE", str(tmp_path / "config.json"))
+        monkeypatch.setattr(login, "read_cfg", no_config)
+        monkeypatch.setattr(login, "get_api_base", lambda: base)
+        try:
+            async with SessionPool([("u0", "x"), ("u1", "y")]) as pool:
+                assert len(pool) == 2
+        finally:
+            await runner.cleanup()
+    asyncio.run(main())
+
+
+def test_empty_or_closed_pool():
+    with pytest.raises(AssertionError):
+        SessionPool([])
+    with pytest.raises(AssertionError):
+        SessionPool([("u0", "x")]).next()
@@ -0,0 +1,37 @@
+import asyncio
+import time
+import aiohttp
+from aiohttp import web
+from cores.trace import TRACER, SendStamp
+
+
+def test_send_stamp_counts_the_connection_wait():
+    async def handler(request: web.Request) -> web.Response:
+        await asyncio.sleep(0.2)
+        return web.json_response({})
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        url = f"http://127.0.0.1:{runner.addresses[0][1]}/"
+        try:
+            # one connection , the second request queues behind the first
+            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=1),
+                                             trace_configs=TRACER.trace_configs()) as sess:
+                stamps = [SendStamp(), SendStamp()]
+                begin = time.monotonic()
+
+                async def get(stamp: SendStamp):
+                    async with sess.get(url, trace_request_ctx=stamp) as resp:
+                        await resp.read()
+                await asyncio.gather(*[get(s) for s in stamps])
+        finally:
+            await runner.cleanup()
+        return begin, stamps
+    begin, stamps = asyncio.run(main())
+    waits = sorted(s.sent - begin for s in stamps)
+    assert waits[0] < 0.1 and waits[1] >= 0.2